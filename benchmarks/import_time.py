@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the API entry point.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter and
+fails if importing the app takes longer than the budget or pulls in any of
+the heavy modules that are meant to load on first use.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 800] [--module main]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must not be imported just by importing the app
+LAZY_MODULES = ["cv2", "pdf2image", "openai", "google.genai", "pandas", "openpyxl"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str):
+    """Return (cumulative import time in µs, per-module timings, imported set)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line.partition(":")[2].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # header line
+        timings[parts[2].strip()] = cumulative
+
+    return timings.get(module, 0), timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=800)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    total_us, timings = measure(args.module)
+    total_ms = total_us / 1000
+
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print("\nSlowest top-level imports:")
+    top_level = {n: t for n, t in timings.items() if "." not in n and n != args.module}
+    for name, t in sorted(top_level.items(), key=lambda x: -x[1])[: args.top]:
+        print(f"  {name:<30} {t / 1000:8.1f} ms")
+
+    eager = [m for m in LAZY_MODULES if m in timings]
+    failed = False
+    if eager:
+        print(f"\n❌ Heavy modules imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\n❌ Import time over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("\n✅ Import time within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Bytes and tokens saved by layout cropping, and its effect on accuracy.
+
+For each page, the full image and its layout crop (LAYOUT_CROP mode) are
+compared by PNG size, pixel count and estimated Gemini image tokens. With
+--accuracy (requires GEMINI_API_KEY) both images are also extracted and the
+fields of the cropped result are compared with those of the full page.
+
+Inputs can be page images or PDFs. Without inputs, synthetic invoice pages
+are generated so the size figures can be checked anywhere.
+
+Usage:
+    python benchmarks/layout_crop.py invoices/*.pdf [--mode composite] [--accuracy]
+    python benchmarks/layout_crop.py --synthetic 5
+"""
+
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.core.layout_analyzer import LayoutAnalyzer  # noqa: E402
+
+# Gemini bills images by 768x768 tile, 258 tokens each
+TILE_SIZE = 768
+TOKENS_PER_TILE = 258
+
+
+def estimate_tokens(width: int, height: int) -> int:
+    if width <= 384 and height <= 384:
+        return TOKENS_PER_TILE
+    return (
+        math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE) * TOKENS_PER_TILE
+    )
+
+
+def image_stats(path: str):
+    import cv2
+
+    img = cv2.imread(path)
+    height, width = img.shape[:2]
+    size = len(cv2.imencode(".png", img)[1])
+    return {
+        "pixels": width * height,
+        "bytes": size,
+        "tokens": estimate_tokens(width, height),
+    }
+
+
+def synthetic_pages(count: int, folder: str):
+    """Invoice-like pages: header block, ruled item table, totals, wide margins."""
+    from PIL import Image, ImageDraw
+
+    pages = []
+    for n in range(count):
+        img = Image.new("RGB", (1654, 2339), "white")  # A4 at 200 dpi
+        draw = ImageDraw.Draw(img)
+        for i in range(6):
+            draw.text(
+                (150, 150 + i * 40),
+                f"Seller line {i} VAT 30000000000000{n}",
+                fill="black",
+            )
+        top = 600
+        rows = 4 + n % 8
+        for r in range(rows + 1):
+            draw.line((150, top + r * 60, 1500, top + r * 60), fill="black", width=3)
+            if r < rows:
+                draw.text(
+                    (170, top + r * 60 + 20),
+                    f"Item {r}   2   10.00   20.00",
+                    fill="black",
+                )
+        for x in (150, 800, 1000, 1250, 1500):
+            draw.line((x, top, x, top + rows * 60), fill="black", width=3)
+        bottom = top + rows * 60 + 120
+        for i in range(3):
+            draw.text((1100, bottom + i * 40), f"Total {i}: {100 + i}.00", fill="black")
+        path = os.path.join(folder, f"synthetic_{n + 1}.png")
+        img.save(path)
+        pages.append(path)
+    return pages
+
+
+def load_pages(paths, folder: str):
+    from src.core.pdf_converter import PDFConverter
+
+    pages = []
+    for path in paths:
+        if path.lower().endswith(".pdf"):
+            pages.extend(PDFConverter(folder).convert(path))
+        else:
+            copy = os.path.join(folder, os.path.basename(path))
+            shutil.copy(path, copy)
+            pages.append(copy)
+    return pages
+
+
+def field_agreement(full, cropped) -> float:
+    """Share of scalar fields (plus the line count) that match."""
+    if full is None or cropped is None:
+        return 0.0
+    full, cropped = full.dict(), cropped.dict()
+    keys = [k for k, v in full.items() if not isinstance(v, list)]
+    matches = sum(1 for k in keys if str(full[k]).strip() == str(cropped[k]).strip())
+    matches += len(full["invoice_lines"]) == len(cropped["invoice_lines"])
+    return matches / (len(keys) + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("paths", nargs="*", help="Page images or PDFs")
+    parser.add_argument("--mode", choices=["margins", "composite"], default="composite")
+    parser.add_argument("--synthetic", type=int, default=3)
+    parser.add_argument("--accuracy", action="store_true")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        pages = (
+            load_pages(args.paths, folder)
+            if args.paths
+            else synthetic_pages(args.synthetic, folder)
+        )
+
+        extractor = None
+        if args.accuracy:
+            if not os.getenv("GEMINI_API_KEY"):
+                sys.exit("--accuracy needs GEMINI_API_KEY")
+            from src.core.invoice_extractorgemini import InvoiceExtractorGEMINI
+
+            extractor = InvoiceExtractorGEMINI()
+
+        analyzer = LayoutAnalyzer()
+        totals = {"bytes": [0, 0], "pixels": [0, 0], "tokens": [0, 0]}
+        agreements = []
+
+        print(f"{'page':<28} {'bytes':>18} {'tokens':>12} {'pixels saved':>13}")
+        for page in pages:
+            cropped = analyzer.apply(page, args.mode)
+            before, after = image_stats(page), image_stats(cropped)
+            for key in totals:
+                totals[key][0] += before[key]
+                totals[key][1] += after[key]
+            print(
+                f"{os.path.basename(page):<28} "
+                f"{before['bytes']:>8} -> {after['bytes']:<7} "
+                f"{before['tokens']:>5} -> {after['tokens']:<4} "
+                f"{1 - after['pixels'] / before['pixels']:>12.1%}"
+            )
+            if extractor:
+                agreements.append(
+                    field_agreement(extractor.extract(page), extractor.extract(cropped))
+                )
+
+        print()
+        for key, (before, after) in totals.items():
+            saved = 1 - after / before if before else 0.0
+            print(f"{key:<7} {before:>12} -> {after:<12} saved {saved:.1%}")
+        if agreements:
+            mean = sum(agreements) / len(agreements)
+            print(f"field agreement (cropped vs full page): {mean:.1%}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Post-processing time of invoice lines: string fields vs parsed amounts.
+
+The string path is how post-processing worked before lines carried parsed
+amounts: each consumer (line VAT, subtotal, total VAT) cleaned and parsed
+the strings again, summed in floats, and VAT used Decimal(0.15) built from
+a float. The parsed path is the current InvoicePostProcessor: each line is
+parsed once, the line VAT step hands its amounts on to the new lines, and
+totals reuse them.
+
+Usage:
+    python benchmarks/line_postprocessing.py [--invoices 200] [--lines 50]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.core.invoice_postprocessor import InvoicePostProcessor  # noqa: E402
+from src.models import extraction_models  # noqa: E402
+from src.models.models import InvoiceData, InvoiceLine  # noqa: E402
+from src.utils.vat_calculator import VATCalculator  # noqa: E402
+
+FLOAT_VAT_RATE = Decimal(0.15)
+
+
+def make_invoices(invoices: int, lines: int):
+    rng = random.Random(0)
+    # Mostly plain numbers, as the prompt asks for, with some stray symbols
+    prices = ["{:.2f}"] * 4 + ["SAR {:.2f}", "{:,.2f}"]
+    return [
+        extraction_models.InvoiceDataExtracted(
+            partner="ACME",
+            vat_number="300000000000003",
+            cr_number="1010101010",
+            street="",
+            street2="",
+            country="",
+            email="",
+            city="",
+            mobile="",
+            invoice_type="Tax Invoice",
+            invoice_bill_date="2024-03-01",
+            reference=f"INV-{n}",
+            invoice_lines=[
+                extraction_models.InvoiceLineExtracted(
+                    product=f"Item {i}",
+                    quantity=str(rng.randint(1, 20)),
+                    unit_price=rng.choice(prices).format(rng.uniform(0.5, 5000)),
+                    taxes="15%",
+                )
+                for i in range(lines)
+            ],
+            detected_language="English",
+        )
+        for n in range(invoices)
+    ]
+
+
+def string_line_vat(quantity: str, unit_price: str) -> str:
+    """VATCalculator.calculate_vat_amount with the float-based VAT rate."""
+    qty = VATCalculator.clean_numeric_value(quantity)
+    price = VATCalculator.clean_numeric_value(unit_price)
+    if qty is None or price is None:
+        return ""
+    return str(round(qty * price * FLOAT_VAT_RATE, 2))
+
+
+def string_vat(extracted):
+    """Line VAT on string fields, as before lines carried parsed amounts."""
+    invoices = []
+    for data in extracted:
+        lines = [
+            InvoiceLine(
+                product=line.product,
+                quantity=line.quantity,
+                unit_price=line.unit_price,
+                taxes=line.taxes,
+                vat_amount=string_line_vat(line.quantity, line.unit_price),
+            )
+            for line in data.invoice_lines
+        ]
+        invoices.append(
+            InvoiceData(
+                partner=data.partner,
+                vat_number=data.vat_number,
+                cr_number=data.cr_number,
+                street=data.street,
+                street2=data.street2,
+                country=data.country,
+                email=data.email,
+                city=data.city,
+                mobile=data.mobile,
+                invoice_type=data.invoice_type,
+                invoice_bill_date=data.invoice_bill_date,
+                reference=data.reference,
+                invoice_lines=lines,
+                detected_language=data.detected_language,
+                discount=data.discount,
+                currency=data.currency,
+                filename=data.filename,
+            )
+        )
+    return invoices
+
+
+def string_totals(invoices):
+    """Invoice totals on string fields, re-parsing every line."""
+    clean = VATCalculator.clean_numeric_value
+    totals = []
+    for invoice in invoices:
+        subtotal = 0.0
+        for line in invoice.invoice_lines:
+            qty, price = clean(line.quantity), clean(line.unit_price)
+            if qty and price:
+                subtotal += float(qty) * float(price)
+        total_vat = 0.0
+        for line in invoice.invoice_lines:
+            vat = clean(line.vat_amount)
+            if vat:
+                total_vat += float(vat)
+        totals.append(str(round(round(subtotal, 2) + round(total_vat, 2), 2)))
+    return totals
+
+
+def parsed_vat(extracted):
+    return [InvoicePostProcessor.add_vat_calculations(data) for data in extracted]
+
+
+def parsed_totals(invoices):
+    return [InvoicePostProcessor.calculate_total_amount(i) for i in invoices]
+
+
+def timed(name: str, vat, totals, invoices: int, lines: int, repeat: int = 5):
+    best_vat = best_totals = float("inf")
+    for _ in range(repeat):
+        extracted = make_invoices(invoices, lines)  # fresh, nothing cached
+        gc.collect()
+        start = time.perf_counter()
+        processed = vat(extracted)
+        middle = time.perf_counter()
+        totals(processed)
+        end = time.perf_counter()
+        best_vat = min(best_vat, middle - start)
+        best_totals = min(best_totals, end - middle)
+    print(
+        f"{name:<10} line VAT {best_vat * 1000:7.1f} ms   "
+        f"totals {best_totals * 1000:7.1f} ms"
+    )
+    return best_vat, best_totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.invoices} invoices x {args.lines} lines\n")
+    before = timed("strings", string_vat, string_totals, args.invoices, args.lines)
+    after = timed("parsed", parsed_vat, parsed_totals, args.invoices, args.lines)
+    print(
+        f"{'speedup':<10} line VAT {before[0] / after[0]:7.1f}x      "
+        f"totals {before[1] / after[1]:7.1f}x      "
+        f"overall {sum(before) / sum(after):.1f}x"
+    )
+
+    # Totals differ only where float sums or the float VAT rate were off
+    old = string_totals(string_vat(make_invoices(args.invoices, args.lines)))
+    new = parsed_totals(parsed_vat(make_invoices(args.invoices, args.lines)))
+    differing = sum(Decimal(a) != Decimal(b) for a, b in zip(old, new))
+    print(f"\n{differing} of {len(new)} invoice totals changed by exact arithmetic")
+
+
+if __name__ == "__main__":
+    main()
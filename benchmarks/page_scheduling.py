@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Per-document completion times of a mixed batch under each scheduling policy.
+
+Simulates one long document followed by many one-page documents, with a
+fixed latency per page standing in for the model call, and compares
+processing the documents one after another with PageScheduler's policies.
+
+Usage:
+    python benchmarks/page_scheduling.py [--long-pages 80] [--short-docs 50]
+        [--workers 4] [--page-seconds 0.02]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.core import page_scheduler  # noqa: E402
+
+
+def sequential(documents, workers: int, page_seconds: float):
+    """Documents in order, each document's pages spread over the pool."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    completed = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for pages in documents:
+            list(pool.map(lambda _: time.sleep(page_seconds), range(pages)))
+            completed.append(time.perf_counter() - start)
+    return completed
+
+
+def scheduled(documents, workers: int, page_seconds: float, policy: str):
+    completed = []
+    start = time.perf_counter()
+    page_scheduler.PageScheduler(workers, policy).run(
+        [(i, lambda n=pages: range(n)) for i, pages in enumerate(documents)],
+        lambda _: time.sleep(page_seconds),
+        lambda key, results: completed.append(time.perf_counter() - start),
+    )
+    return completed
+
+
+def report(name: str, completed):
+    print(
+        f"{name:<12} median {statistics.median(completed):7.2f}s   "
+        f"p90 {sorted(completed)[int(len(completed) * 0.9) - 1]:7.2f}s   "
+        f"last {max(completed):7.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--long-pages", type=int, default=80)
+    parser.add_argument("--short-docs", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--page-seconds", type=float, default=0.02)
+    args = parser.parse_args()
+
+    documents = [args.long_pages] + [1] * args.short_docs
+    workers, seconds = args.workers, args.page_seconds
+    report("sequential", sequential(documents, workers, seconds))
+    for policy in page_scheduler.SCHEDULING_POLICIES:
+        report(policy, scheduled(documents, workers, seconds, policy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Time to serialize a large /extract-multiple response.
+
+Compares FastAPI's default path for a response_model (validate the returned
+model again, jsonable_encoder, json.dumps) with FastJSONResponse, and the
+stdlib json.dumps of .dict() used for streamed results with fast_json.dumps.
+
+Usage:
+    python benchmarks/serialization.py [--invoices 200] [--lines 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from src.models import models  # noqa: E402
+from src.utils.fast_json import FastJSONResponse, dumps, orjson  # noqa: E402
+
+
+def make_response(invoices: int, lines: int):
+    invoice_lines = [
+        models.InvoiceLine(
+            product=f"Item {i}",
+            quantity=str(i % 7 + 1),
+            unit_price=f"{i * 3.25:.2f}",
+            gross_price="",
+            taxes="15%",
+            vat_amount="",
+        )
+        for i in range(lines)
+    ]
+    data = [
+        models.InvoiceData(
+            partner="ACME Trading Co.",
+            vat_number="300000000000003",
+            cr_number="1010101010",
+            street="King Fahd Road",
+            street2="",
+            country="Saudi Arabia",
+            email="billing@acme.example",
+            city="Riyadh",
+            mobile="+966500000000",
+            invoice_type="Tax Invoice",
+            invoice_bill_date="2024-03-01",
+            reference=f"INV-{n}",
+            invoice_lines=invoice_lines,
+            detected_language="English",
+            filename=f"invoice_{n}.pdf",
+        )
+        for n in range(invoices)
+    ]
+    return models.MultipleInvoicesResponse(
+        invoices=data,
+        total_processed=invoices,
+        successful_extractions=invoices,
+        failed_extractions=0,
+    )
+
+
+def timed(name: str, fn, repeat: int = 5) -> float:
+    best = min(_run(fn) for _ in range(repeat))
+    print(f"{name:<36} {best * 1000:9.1f} ms")
+    return best
+
+
+def _run(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=50)
+    args = parser.parse_args()
+
+    response = make_response(args.invoices, args.lines)
+    encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+    print(
+        f"{args.invoices} invoices x {args.lines} lines, "
+        f"{len(dumps(response)) / 1e6:.1f} MB, fast_json encoder: {encoder}\n"
+    )
+
+    def fastapi_default():
+        validated = models.MultipleInvoicesResponse.model_validate(response.dict())
+        json.dumps(jsonable_encoder(validated)).encode()
+
+    before = timed("response_model + jsonable_encoder", fastapi_default)
+    after = timed("FastJSONResponse", lambda: FastJSONResponse(response).body)
+    print(f"{'speedup':<36} {before / after:9.1f}x\n")
+
+    results = [
+        {"status": "success", "filename": i.filename, "data": i}
+        for i in response.invoices
+    ]
+    before = timed(
+        "json.dumps of .dict() per result",
+        lambda: [json.dumps({**r, "data": r["data"].dict()}) for r in results],
+    )
+    after = timed("fast_json.dumps per result", lambda: [dumps(r) for r in results])
+    print(f"{'speedup':<36} {before / after:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
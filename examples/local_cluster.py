@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Run a coordinator and several workers as local processes, for trying out
+coordinator/worker mode on one machine.
+
+    python examples/local_cluster.py --workers 3
+
+The API is served on --port as usual; pages of every extraction are
+rendered and extracted by the worker processes. Ctrl+C stops everything.
+"""
+
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--capacity", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    env = dict(os.environ, CLUSTER_MODE="coordinator")
+    # The coordinator refuses to start without a token; workers send it
+    env.setdefault("CLUSTER_TOKEN", secrets.token_urlsafe(32))
+    coordinator = f"http://127.0.0.1:{args.port}"
+    port = str(args.port)
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", port],
+            cwd=ROOT,
+            env=env,
+        )
+    ]
+    # Workers must not act as coordinators themselves
+    env.pop("CLUSTER_MODE")
+    for i in range(args.workers):
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "src.core.cluster_worker",
+                    "--coordinator",
+                    coordinator,
+                    "--name",
+                    f"worker-{i + 1}",
+                    "--capacity",
+                    str(args.capacity),
+                ],
+                cwd=ROOT,
+                env=env,
+            )
+        )
+
+    print(f"🚀 Coordinator at {coordinator} with {args.workers} workers")
+    print(f"📊 Workers: {coordinator}/cluster-stats")
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in reversed(processes):
+            p.terminate()
+        for p in processes:
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a webhook receiver, for trying out callback_url.
+
+Verifies the signature of each delivery, drops events it has already seen
+(delivery is at least once) and prints the rest. --fail-rate makes it
+answer some deliveries with 503 to exercise retries.
+
+Usage (start the API with WEBHOOK_ALLOWED_HOSTS=localhost, since callbacks
+to private addresses are refused otherwise):
+    WEBHOOK_SECRET=changeme python examples/webhook_receiver.py [--port 9000]
+
+    curl -F "pdfs=@a.pdf" -F "pdfs=@b.pdf" \\
+        "http://localhost:8000/extract-multiple?callback_url=http://localhost:9000/"
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.webhook_outbox import SIGNATURE_HEADER, verify  # noqa: E402
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    secret = ""
+    fail_rate = 0.0
+    seen = set()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not verify(self.secret, body, self.headers.get(SIGNATURE_HEADER, "")):
+            print("❌ Rejected delivery with a bad signature")
+            self.send_response(401)
+            self.end_headers()
+            return
+        if random.random() < self.fail_rate:
+            print("⚠️  Failing delivery on purpose")
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        delivery = json.loads(body)
+        for event in delivery["events"]:
+            if event["event_id"] in self.seen:
+                continue
+            self.seen.add(event["event_id"])
+            print(format_event(event))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # events are printed instead
+
+
+def format_event(event: dict) -> str:
+    kind = event["type"]
+    if kind == "invoice.completed":
+        data = event["data"]
+        return f"✅ {event['filename']}: {data.get('partner')} {data.get('reference')}"
+    if kind == "invoice.failed":
+        return f"❌ {event['filename']}: {event['error']}"
+    if kind == "batch.completed":
+        return (
+            f"📦 Batch {event['batch_id']}: {event['successful_extractions']}/"
+            f"{event['total_processed']} extracted"
+        )
+    return f"{kind}: {json.dumps(event)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print signed webhook deliveries")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument(
+        "--secret",
+        default=os.getenv("WEBHOOK_SECRET"),
+        help="Shared secret (default: WEBHOOK_SECRET)",
+    )
+    parser.add_argument(
+        "--fail-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of deliveries to answer with 503",
+    )
+    args = parser.parse_args()
+
+    if not args.secret:
+        print("❌ Error: set WEBHOOK_SECRET or pass --secret")
+        sys.exit(1)
+    WebhookHandler.secret = args.secret
+    WebhookHandler.fail_rate = args.fail_rate
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), WebhookHandler)
+    print(f"Listening on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
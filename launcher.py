@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Invoice Extraction API.
+
+Pre-forks N uvicorn workers that share one listening socket. The app (and,
+by default, the heavy imaging/provider modules) is imported once in the
+master before forking, so workers start instantly and share those pages
+copy-on-write. Each worker sizes its own thread pool from --threads, and all
+workers share the SQLite cache at SHARED_CACHE_PATH for rendered pages and
+extraction results.
+
+Signals sent to the master:
+    SIGHUP           rolling restart: workers are replaced one at a time and
+                     an old worker is only stopped once its replacement is
+                     serving, so capacity never drops to zero
+    SIGTERM, SIGINT  graceful shutdown of all workers
+
+Workers that die unexpectedly are respawned. A rolling restart recycles
+worker processes (e.g. to release memory) but keeps the code preloaded in
+the master; restart the launcher itself to deploy new code.
+
+Usage:
+    python launcher.py --workers 4 --threads 8 --port 8000
+"""
+
+import argparse
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+
+PRELOAD_MODULES = ["cv2", "pdf2image", "google.genai", "openai"]
+
+logging.basicConfig(level=logging.INFO, format="[launcher %(process)d] %(message)s")
+
+
+class Launcher:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.app = None
+        self.sock = None
+        self.workers: Dict[int, int] = {}  # pid -> readiness pipe (read end)
+        self.stopping = False
+        self.restart_requested = False
+
+    def preload(self):
+        """Import the app (and heavy modules) once, before forking."""
+        os.environ["EXECUTOR_WORKERS"] = str(self.args.threads)
+        os.environ.setdefault(
+            "SHARED_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "invoice_extraction_cache.db"),
+        )
+
+        if self.args.preload_modules:
+            for module in PRELOAD_MODULES:
+                try:
+                    __import__(module)
+                except ImportError as e:
+                    logging.warning(f"Could not preload {module}: {e}")
+
+        import main
+
+        self.app = main.app
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.args.host, self.args.port))
+        self.sock.listen(self.args.backlog)
+        self.sock.set_inheritable(True)
+
+    def spawn(self) -> int:
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            try:
+                self._run_worker(ready_w)
+            finally:
+                os._exit(0)
+
+        os.close(ready_w)
+        self.workers[pid] = ready_r
+        logging.info(f"Started worker {pid}")
+        return pid
+
+    def _run_worker(self, ready_w: int):
+        import uvicorn
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+
+        config = uvicorn.Config(
+            self.app,
+            log_level=self.args.log_level,
+            timeout_graceful_shutdown=self.args.graceful_timeout,
+        )
+        server = uvicorn.Server(config)
+
+        def notify_ready():
+            while not server.started and not server.should_exit:
+                time.sleep(0.05)
+            os.write(ready_w, b"1")
+            os.close(ready_w)
+
+        threading.Thread(target=notify_ready, daemon=True).start()
+        server.run(sockets=[self.sock])
+
+    def wait_ready(self, pid: int, timeout: float) -> bool:
+        ready_r = self.workers.get(pid)
+        if ready_r is None:
+            return False
+        readable, _, _ = select.select([ready_r], [], [], timeout)
+        return bool(readable) and os.read(ready_r, 1) == b"1"
+
+    def stop_worker(self, pid: int):
+        """Ask a worker to finish in-flight requests and exit; kill on timeout."""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        try:
+            while time.monotonic() < deadline:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+                if done:
+                    break
+                time.sleep(0.1)
+            else:
+                logging.warning(f"Worker {pid} did not stop in time, killing it")
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass  # already reaped
+
+        self._forget(pid)
+
+    def _forget(self, pid: int):
+        ready_r = self.workers.pop(pid, None)
+        if ready_r is not None:
+            os.close(ready_r)
+
+    def rolling_restart(self):
+        logging.info("Rolling restart")
+        for old_pid in list(self.workers):
+            if self.stopping:
+                break
+            new_pid = self.spawn()
+            if not self.wait_ready(new_pid, self.args.startup_timeout):
+                logging.error(f"Worker {new_pid} failed to start, aborting restart")
+                break
+            self.stop_worker(old_pid)
+
+    def reap(self):
+        """Respawn workers that exited unexpectedly."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                self._forget(pid)
+                if not self.stopping:
+                    logging.warning(f"Worker {pid} exited ({status}), respawning")
+                    self.spawn()
+
+    def run(self):
+        self.preload()
+        self.bind()
+        logging.info(
+            f"Listening on http://{self.args.host}:{self.args.port} "
+            f"with {self.args.workers} workers x {self.args.threads} threads"
+        )
+
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.5)
+
+        logging.info("Shutting down")
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+
+    def _on_hup(self, signum, frame):
+        self.restart_requested = True
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork launcher for the API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.getenv("EXECUTOR_WORKERS", "4")),
+        help="Thread pool size of each worker",
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--graceful-timeout", type=int, default=30)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument(
+        "--no-preload-modules",
+        dest="preload_modules",
+        action="store_false",
+        help="Do not import OpenCV/pdf2image/provider SDKs in the master",
+    )
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("launcher.py requires a platform with fork(); use main.py instead")
+
+    Launcher(args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,52 @@
 import asyncio
+import contextvars
+import hmac
+import io
 import json
 import os
 import shutil
 import tempfile
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, AsyncGenerator, Dict, List, Optional
+import uuid
+from collections.abc import AsyncGenerator, Callable, Iterator
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
 
+from src.core import archive_ingest
+from src.core.batch_dedup import copy_with_digest
+from src.core.field_repair import repair_enabled, repair_stats
+from src.core.field_schema import PREDEFINED_FIELD_SETS, precompile_field_sets
 from src.core.invoice_pipeline import InvoicePipeline
-from src.models.models import InvoiceData, InvoiceLine, MultipleInvoicesResponse
+from src.core.model_cascade import ModelCascade, cascade_enabled
+from src.models.models import InvoiceData, MultipleInvoicesResponse
+from src.utils.compression import CompressionMiddleware
+from src.utils.context_executor import ContextThreadPoolExecutor
+from src.utils.env import load_env
+from src.utils.fast_json import FastJSONResponse, dumps
+from src.utils.idempotency import IdempotencyMiddleware
+from src.utils.invoice_exporter import EXPORT_FORMATS, InvoiceExporter
+from src.utils.shared_cache import SharedCache
+from src.utils.sqlite_storage import SQLiteInvoiceStorage
+from src.utils.usage import UsageMiddleware, get_meter, record_calls
+from src.utils.webhook_outbox import WebhookOutbox, validate_callback_url
+
+load_env()
+
+EXTRACTION_PATHS = (
+    "/extract",
+    "/extract-stream",
+    "/extract-progress",
+    "/extract-multiple",
+    "/extract-multiple-stream",
+    "/extract-archive",
+    "/custom-extract",
+    "/predefined-extract",
+)
 
 app = FastAPI(
     title="Invoice Extraction API",
@@ -29,40 +63,246 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Thread pool for CPU-intensive tasks
-executor = ThreadPoolExecutor(max_workers=4)
+# Retries carrying the same Idempotency-Key get the first request's response
+# instead of paying for the extraction again
+if os.getenv("IDEMPOTENCY", "1").lower() in ("1", "true", "yes"):
+    app.add_middleware(
+        IdempotencyMiddleware,
+        paths=EXTRACTION_PATHS,
+        path=os.getenv("IDEMPOTENCY_DB_PATH"),
+        ttl=float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600))),
+    )
+
+# Attribute model usage to the calling tenant and enforce its daily budget.
+# Added after the idempotency middleware so it runs first: a refusal over
+# budget is not stored as the response for the key.
+METERING = os.getenv("USAGE_METERING", "1").lower() in ("1", "true", "yes")
+if METERING:
+    app.add_middleware(
+        UsageMiddleware,
+        paths=EXTRACTION_PATHS,
+        path=os.getenv("USAGE_DB_PATH"),
+    )
+
+# Compress large responses (batch results run to megabytes of JSON)
+if os.getenv("RESPONSE_COMPRESSION", "1").lower() in ("1", "true", "yes"):
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")),
+    )
+
+# Thread pool for CPU-intensive tasks, sized per worker process. Tasks run in
+# the request's context so model usage is billed to its tenant.
+executor = ContextThreadPoolExecutor(
+    max_workers=int(os.getenv("EXECUTOR_WORKERS", "4"))
+)
+
+# Rendered pages and extraction results shared by all workers on this host
+cache = (
+    SharedCache(os.getenv("SHARED_CACHE_PATH"))
+    if os.getenv("SHARED_CACHE_PATH")
+    else None
+)
+
+# Extracted invoices are persisted only when a database path is configured
+storage = (
+    SQLiteInvoiceStorage(os.getenv("INVOICE_DB_PATH"))
+    if os.getenv("INVOICE_DB_PATH")
+    else None
+)
+
+
+def store_invoices(invoices: List[InvoiceData]):
+    """Queue extracted invoices for the write-behind store, if enabled."""
+    if storage is None:
+        return
+    for invoice in invoices:
+        storage.enqueue(invoice)
+
+
+@app.on_event("shutdown")
+def close_storage():
+    if storage is not None:
+        storage.close()
+
+
+# Results can be delivered to a callback_url once a signing secret is set
+webhooks = WebhookOutbox() if os.getenv("WEBHOOK_SECRET") else None
+
+
+@app.on_event("startup")
+def resume_webhooks():
+    # Deliver events left pending or awaiting a retry by the last run
+    if webhooks is not None:
+        webhooks.resume()
+
+
+@app.on_event("shutdown")
+def close_webhooks():
+    if webhooks is not None:
+        webhooks.close()
+
+
+async def check_callback_url(callback_url: str):
+    if webhooks is None:
+        raise HTTPException(
+            status_code=503, detail="Webhook delivery is not configured"
+        )
+    try:
+        # Resolves the host, which may block
+        await asyncio.get_event_loop().run_in_executor(
+            None, validate_callback_url, callback_url
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def process_with_callback(
+    batch_id: str,
+    temp_paths: List[str],
+    filenames: List[str],
+    digests: List[str],
+    callback_url: str,
+):
+    """
+    Process an accepted batch in the background, posting an event to
+    callback_url as each invoice completes and a final batch.completed
+    event with the totals. Removes the temporary files when done.
+    """
+
+    def on_invoice(index: int, invoice_data: Optional[InvoiceData]):
+        event = {"batch_id": batch_id, "index": index, "filename": filenames[index]}
+        if invoice_data is None:
+            event.update(
+                type="invoice.failed", error="Failed to extract any data from the PDF."
+            )
+        else:
+            event.update(type="invoice.completed", data=invoice_data)
+        webhooks.enqueue(callback_url, event)
+
+    try:
+        result = pipeline.process_multiple(
+            temp_paths,
+            preprocess=True,
+            filenames=filenames,
+            digests=digests,
+            on_invoice=on_invoice,
+        )
+        store_invoices(
+            [invoice for invoice in result.invoices if not invoice.duplicate_of]
+        )
+        webhooks.enqueue(
+            callback_url,
+            {
+                "type": "batch.completed",
+                "batch_id": batch_id,
+                **result.dict(exclude={"invoices", "invoice_totals"}),
+            },
+        )
+    except Exception as e:
+        webhooks.enqueue(
+            callback_url,
+            {"type": "batch.failed", "batch_id": batch_id, "error": str(e)},
+        )
+    finally:
+        for tmp_path in temp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def accept_batch(
+    temp_paths: List[str],
+    filenames: List[str],
+    digests: List[str],
+    callback_url: str,
+) -> JSONResponse:
+    """Start a callback batch in the background and return 202 Accepted."""
+    batch_id = uuid.uuid4().hex
+    asyncio.get_event_loop().run_in_executor(
+        executor,
+        process_with_callback,
+        batch_id,
+        temp_paths,
+        filenames,
+        digests,
+        callback_url,
+    )
+    return JSONResponse(
+        status_code=202,
+        content={
+            "batch_id": batch_id,
+            "status": "accepted",
+            "total_files": len(temp_paths),
+            "callback_url": callback_url,
+        },
+    )
+
+
+# Shared extraction pipeline; provider clients are created on first use
+pipeline = InvoicePipeline(cache=cache)
+
+# Readiness of this worker, filled in by the background warm-up
+readiness: Dict[str, Any] = {"ready": False, "warmup": {}, "error": None}
+
+
+def warm_up_pipeline():
+    """Import heavy modules and build provider clients ahead of the first request."""
+    try:
+        readiness["warmup"] = pipeline.warm_up()
+        readiness["warmup"]["field_sets"] = len(
+            precompile_field_sets(PREDEFINED_FIELD_SETS.values())
+        )
+        readiness["ready"] = True
+    except Exception as e:
+        readiness["error"] = str(e)
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Runs in the background so the worker accepts connections immediately
+    asyncio.get_event_loop().run_in_executor(executor, warm_up_pipeline)
 
 
 @app.post("/extract", response_model=InvoiceData)
-async def extract_invoice(pdf: UploadFile = File(...)):
+async def extract_invoice(
+    pdf: UploadFile = File(...), callback_url: Optional[str] = Query(None)
+):
     """
     Extract invoice data from an uploaded PDF file.
     Processes all pages and returns a single combined result.
 
     - **pdf**: PDF file to process
+    - **callback_url**: if given, return 202 at once and POST the result there
 
     Returns extracted invoice data with new field structure.
     """
     if not pdf.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    if callback_url:
+        await check_callback_url(callback_url)
 
     # Create a temporary file
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
         # Save the uploaded PDF
-        shutil.copyfileobj(pdf.file, tmp_file)
+        digest = copy_with_digest(pdf.file, tmp_file)
         tmp_path = tmp_file.name
 
-    try:
-        # Initialize the extraction pipeline
-        pipeline = InvoicePipeline()
+    if callback_url:
+        return accept_batch([tmp_path], [pdf.filename], [digest], callback_url)
 
-        # Process the PDF - returns a single InvoiceData object
-        invoice_data = pipeline.process(tmp_path, preprocess=True)
+    try:
+        # Process the PDF off the event loop - returns a single InvoiceData object
+        loop = asyncio.get_event_loop()
+        invoice_data = await loop.run_in_executor(
+            executor, pipeline.process, tmp_path, True
+        )
 
         # Set the original filename
         invoice_data.filename = pdf.filename
+        store_invoices([invoice_data])
 
-        return invoice_data
+        # Already validated: serialize directly instead of via response_model
+        return FastJSONResponse(invoice_data)
 
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
@@ -74,6 +314,93 @@ async def extract_invoice(pdf: UploadFile = File(...)):
             os.remove(tmp_path)
 
 
+def stream_document_events(
+    pdf: UploadFile, process: Callable[[str], Iterator[Dict]]
+) -> StreamingResponse:
+    """
+    Run a pipeline generator on an uploaded PDF in the executor and send its
+    events as Server-Sent Events. The final 'result' event's invoice is
+    named after the upload and stored; a failure ends the stream with an
+    'error' event.
+    """
+    if not pdf.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        shutil.copyfileobj(pdf.file, tmp_file)
+        tmp_path = tmp_file.name
+
+    loop = asyncio.get_event_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def extract():
+        try:
+            for event in process(tmp_path):
+                if event["type"] == "result":
+                    event["data"].filename = pdf.filename
+                    store_invoices([event["data"]])
+                loop.call_soon_threadsafe(events.put_nowait, event)
+        except Exception as e:
+            loop.call_soon_threadsafe(
+                events.put_nowait, {"type": "error", "error": str(e)}
+            )
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    worker = loop.run_in_executor(executor, extract)
+
+    async def stream_events() -> AsyncGenerator[bytes, None]:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield b"data: " + dumps(event) + b"\n\n"
+        await worker
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.post("/extract-stream")
+async def extract_invoice_stream(pdf: UploadFile = File(...)):
+    """
+    Extract invoice data from a PDF, streaming the model's output as
+    Server-Sent Events while it is generated.
+
+    - **pdf**: PDF file to process
+
+    Events have a 'type': 'field' for each header field (partner, VAT
+    number, date, ...) as soon as it is parsed, 'line' for each invoice
+    line, 'page' when a page is done, then 'result' with the complete
+    invoice after VAT post-processing (or 'error').
+    """
+    return stream_document_events(pdf, lambda path: pipeline.process_stream(path, True))
+
+
+@app.post("/extract-progress")
+async def extract_invoice_progress(pdf: UploadFile = File(...)):
+    """
+    Extract invoice data from a PDF like /extract, reporting on each page
+    as Server-Sent Events.
+
+    - **pdf**: PDF file to process
+
+    Events have a 'type': 'start' with the page count, 'page' for each page
+    (status, seconds, lines found, and the error if it failed), then
+    'result' with the invoice merged from the pages that succeeded (or
+    'error' if none did). Failed pages are listed in
+    processing.failed_pages.
+    """
+    return stream_document_events(
+        pdf, lambda path: pipeline.process_progress(path, True)
+    )
+
+
 def process_single_invoice(
     temp_path: str, original_filename: str, pipeline: InvoicePipeline
 ) -> dict:
@@ -84,11 +411,12 @@ def process_single_invoice(
 
         # Set the original filename
         invoice_data.filename = original_filename
+        store_invoices([invoice_data])
 
         return {
             "status": "success",
             "filename": original_filename,
-            "data": invoice_data.dict(),
+            "data": invoice_data,
         }
     except Exception as e:
         return {"status": "error", "filename": original_filename, "error": str(e)}
@@ -96,7 +424,7 @@ def process_single_invoice(
 
 async def generate_streaming_results(
     temp_paths: List[str], original_filenames: List[str]
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """Generate streaming JSON results for multiple invoice processing."""
 
     # Send initial metadata
@@ -105,10 +433,7 @@ async def generate_streaming_results(
         "total_files": len(temp_paths),
         "timestamp": "2024-01-01T00:00:00Z",  # You can use datetime.now().isoformat()
     }
-    yield f"data: {json.dumps(initial_data)}\n\n"
-
-    # Initialize the extraction pipeline
-    pipeline = InvoicePipeline()
+    yield b"data: " + dumps(initial_data) + b"\n\n"
 
     # Process files and stream results
     for i, (temp_path, original_filename) in enumerate(
@@ -130,7 +455,7 @@ async def generate_streaming_results(
             result["type"] = "result"
 
             # Stream the result
-            yield f"data: {json.dumps(result)}\n\n"
+            yield b"data: " + dumps(result) + b"\n\n"
 
         except Exception as e:
             error_result = {
@@ -144,7 +469,7 @@ async def generate_streaming_results(
                     "percentage": round(((i + 1) / len(temp_paths)) * 100, 2),
                 },
             }
-            yield f"data: {json.dumps(error_result)}\n\n"
+            yield b"data: " + dumps(error_result) + b"\n\n"
 
     # Send completion signal
     completion_data = {
@@ -152,7 +477,7 @@ async def generate_streaming_results(
         "message": "All files processed",
         "timestamp": "2024-01-01T00:00:00Z",  # You can use datetime.now().isoformat()
     }
-    yield f"data: {json.dumps(completion_data)}\n\n"
+    yield b"data: " + dumps(completion_data) + b"\n\n"
 
 
 @app.post("/extract-multiple-stream")
@@ -210,12 +535,16 @@ async def extract_multiple_invoices_stream(pdfs: List[UploadFile] = File(...)):
 
 
 @app.post("/extract-multiple", response_model=MultipleInvoicesResponse)
-async def extract_multiple_invoices(pdfs: List[UploadFile] = File(...)):
+async def extract_multiple_invoices(
+    pdfs: List[UploadFile] = File(...), callback_url: Optional[str] = Query(None)
+):
     """
     Extract invoice data from multiple uploaded PDF files (traditional non-streaming).
     Processes each file separately and returns combined results.
 
     - **pdfs**: List of PDF files to process
+    - **callback_url**: if given, return 202 at once and POST each invoice
+      there as it completes, then the batch totals
 
     Returns extracted invoice data from all files with processing statistics.
     """
@@ -226,30 +555,45 @@ async def extract_multiple_invoices(pdfs: List[UploadFile] = File(...)):
                 status_code=400,
                 detail=f"Only PDF files are supported. Invalid file: {pdf.filename}",
             )
+    if callback_url:
+        await check_callback_url(callback_url)
 
     temp_paths = []
     original_filenames = []
+    digests = []
 
     try:
-        # Save all uploaded files to temporary locations
+        # Save all uploaded files to temporary locations, hashing them on the
+        # way so identical uploads are only processed once
         for pdf in pdfs:
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                shutil.copyfileobj(pdf.file, tmp_file)
+                digests.append(copy_with_digest(pdf.file, tmp_file))
                 temp_paths.append(tmp_file.name)
                 original_filenames.append(pdf.filename)
 
-        # Initialize the extraction pipeline
-        pipeline = InvoicePipeline()
-
-        # Process all PDFs
-        result = pipeline.process_multiple(temp_paths, preprocess=True)
-
-        # Set the original filenames for each invoice
-        for i, invoice in enumerate(result.invoices):
-            if i < len(original_filenames):
-                invoice.filename = original_filenames[i]
+        if callback_url:
+            response = accept_batch(
+                temp_paths, original_filenames, digests, callback_url
+            )
+            temp_paths = []  # removed by the background batch
+            return response
+
+        # Process all PDFs, keeping the original filename of each invoice
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(
+            executor,
+            lambda: pipeline.process_multiple(
+                temp_paths,
+                preprocess=True,
+                filenames=original_filenames,
+                digests=digests,
+            ),
+        )
+        store_invoices(
+            [invoice for invoice in result.invoices if not invoice.duplicate_of]
+        )
 
-        return result
+        return FastJSONResponse(result)
 
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
@@ -262,6 +606,117 @@ async def extract_multiple_invoices(pdfs: List[UploadFile] = File(...)):
                 os.remove(tmp_path)
 
 
+ARCHIVE_OUTPUT_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    A streaming response sent while the handler still reads the request
+    body. Starlette's own watches for a disconnect by calling receive(),
+    which would take body chunks away from the handler; here a disconnect
+    ends the body stream, or makes a send fail.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await self.stream_response(send)
+
+
+@app.post("/extract-archive")
+async def extract_archive(
+    request: Request,
+    format: str = "ndjson",
+    archive_format: Optional[str] = None,
+    max_in_flight: Optional[int] = None,
+):
+    """
+    Extract invoice data from every PDF in a ZIP or TAR archive.
+
+    The archive is sent as the raw request body (e.g. ``curl --data-binary
+    @invoices.tar.gz``). Members are read and processed while the upload is
+    still arriving, with at most ``max_in_flight`` PDFs in progress at once,
+    and results are streamed back in completion order.
+
+    - **format**: "ndjson" (default) or "sse"
+    - **archive_format**: "zip" or "tar" (plain, .gz, .bz2 or .xz);
+      detected from the content when omitted
+    - **max_in_flight**: PDFs processed concurrently (default
+      $ARCHIVE_MAX_IN_FLIGHT, 4)
+
+    Response records have a 'type' field: 'result' per PDF (status,
+    filename, data or error), 'error' if the archive itself is unreadable,
+    and a final 'complete' summary.
+    """
+    if format not in ARCHIVE_OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown output format: {format}. Available: {list(ARCHIVE_OUTPUT_FORMATS)}",
+        )
+    formats = archive_ingest.ARCHIVE_FORMATS
+    if archive_format is not None and archive_format not in formats:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown archive format: {archive_format}. Available: {list(formats)}",
+        )
+
+    loop = asyncio.get_event_loop()
+    body = archive_ingest.ChunkPipe()
+    records: asyncio.Queue = asyncio.Queue()
+    processor = archive_ingest.ArchiveProcessor(
+        lambda path, name: process_single_invoice(path, name, pipeline),
+        max_in_flight or int(os.getenv("ARCHIVE_MAX_IN_FLIGHT", "4")),
+        executor=executor,
+    )
+
+    def read_archive():
+        # Runs on the default pool: the members themselves go to the executor
+        try:
+            reader = io.BufferedReader(body)
+            members = archive_ingest.iter_pdf_members(reader, archive_format)
+            for record in processor.results(members):
+                loop.call_soon_threadsafe(records.put_nowait, record)
+        finally:
+            body.abandon()
+            loop.call_soon_threadsafe(records.put_nowait, None)
+
+    async def upload():
+        # Runs alongside the response: records go out while this reads
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await loop.run_in_executor(None, body.feed, chunk)
+        except ClientDisconnect:
+            pass  # the reader sees a truncated archive
+        finally:
+            await loop.run_in_executor(None, body.finish)
+
+    async def stream_records() -> AsyncGenerator[bytes, None]:
+        uploading = asyncio.ensure_future(upload())
+        # Copy the request context so members are billed to the caller's
+        # tenant
+        context = contextvars.copy_context()
+        reader = loop.run_in_executor(None, context.run, read_archive)
+        try:
+            while True:
+                record = await records.get()
+                if record is None:
+                    break
+                line = dumps(record)
+                if format == "sse":
+                    yield b"data: " + line + b"\n\n"
+                else:
+                    yield line + b"\n"
+            await reader
+        finally:
+            # Only still running if the reader stopped early
+            uploading.cancel()
+
+    return UploadStreamingResponse(
+        stream_records(),
+        media_type=ARCHIVE_OUTPUT_FORMATS[format],
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 class CustomExtractionRequest(BaseModel):
     fields: Dict[str, str]  # field_name: description
     # Additional fields not in standard schema
@@ -288,8 +743,6 @@ async def custom_extract_with_body(pdf: UploadFile = File(...), fields: str = No
         raise HTTPException(status_code=400, detail="Fields parameter is required")
 
     try:
-        import json
-
         requested_fields = json.loads(fields)
     except json.JSONDecodeError:
         raise HTTPException(
@@ -306,10 +759,13 @@ async def custom_extract_with_body(pdf: UploadFile = File(...), fields: str = No
         # Initialize custom extraction pipeline
         from src.core.custom_extractor import CustomInvoiceExtractor
 
-        extractor = CustomInvoiceExtractor()
+        extractor = CustomInvoiceExtractor(cache=cache)
 
         # Extract data based on custom fields
-        custom_data = extractor.extract_custom_fields(tmp_path, requested_fields)
+        loop = asyncio.get_event_loop()
+        custom_data = await loop.run_in_executor(
+            executor, extractor.extract_custom_fields, tmp_path, requested_fields
+        )
 
         return {
             "filename": pdf.filename,
@@ -357,10 +813,13 @@ async def predefined_extract(pdf: UploadFile = File(...), field_set: str = "basi
         # Initialize custom extraction pipeline
         from src.core.custom_extractor import CustomInvoiceExtractor
 
-        extractor = CustomInvoiceExtractor()
+        extractor = CustomInvoiceExtractor(cache=cache)
 
         # Extract data based on predefined field set
-        extracted_data = extractor.extract_predefined_fields(tmp_path, field_set)
+        loop = asyncio.get_event_loop()
+        extracted_data = await loop.run_in_executor(
+            executor, extractor.extract_predefined_fields, tmp_path, field_set
+        )
 
         return {
             "filename": pdf.filename,
@@ -380,20 +839,71 @@ async def predefined_extract(pdf: UploadFile = File(...), field_set: str = "basi
             os.remove(tmp_path)
 
 
+@app.get("/export")
+async def export_invoices(
+    format: str = "ndjson",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    partner: Optional[str] = None,
+):
+    """
+    Stream stored invoices with flattened invoice lines.
+
+    - **format**: "ndjson", "csv", "parquet" or "xlsx"
+    - **date_from** / **date_to**: Inclusive invoice date bounds (YYYY-MM-DD)
+    - **partner**: Only invoices from this partner
+
+    Returns one row per invoice line; filters are applied in the database.
+    """
+    if storage is None:
+        raise HTTPException(status_code=503, detail="Invoice storage is not configured")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown export format: {format}. Available: {list(EXPORT_FORMATS)}",
+        )
+
+    exporter = InvoiceExporter()
+    rows = storage.iter_rows(date_from, date_to, partner)
+    try:
+        body = exporter.stream(rows, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        body,
+        media_type=exporter.content_type(format),
+        headers={
+            "Content-Disposition": f'attachment; filename="invoices.{exporter.extension(format)}"'
+        },
+    )
+
+
 @app.get("/")
 async def read_root():
     return {
         "message": "Welcome to the Invoice Extraction API!",
         "endpoints": {
             "POST /extract": "Upload a single PDF file to extract all standard invoice data",
+            "POST /extract-stream": "Upload a PDF; fields and invoice lines stream back as SSE while the model responds",
+            "POST /extract-progress": "Upload a PDF; a progress event per page, then the merged invoice, as SSE",
             "POST /extract-multiple": "Upload multiple PDF files to extract invoice data from all (traditional)",
             "POST /extract-multiple-stream": "Upload multiple PDF files with streaming response (real-time results)",
+            "POST /extract-archive": "Send a ZIP or TAR archive of PDFs; results stream back as NDJSON or SSE",
             "POST /custom-extract": "Upload PDF and specify custom fields to extract (JSON format)",
             "POST /predefined-extract": "Upload PDF and use predefined field sets (basic/detailed/accounting)",
             "GET /available-fields": "Get list of all available fields for extraction",
+            "GET /export": "Stream stored invoices as NDJSON, CSV, Parquet or XLSX",
             "GET /docs": "Interactive API documentation",
             "GET /redoc": "Alternative API documentation",
             "GET /health": "Health check endpoint",
+            "GET /cascade-stats": "Model cascade escalation rate and savings",
+            "GET /repair-stats": "Fields re-requested after failing validation",
+            "GET /usage": "Model calls, tokens and cost per tenant, endpoint and model",
+            "GET /http-stats": "Connection pool shared by the model provider clients",
+            "GET /webhook-stats": "Webhook events waiting for delivery or given up on",
+            "GET /cluster-stats": "Workers and page tasks in coordinator/worker mode",
+            "GET /ready": "Readiness probe (200 once provider clients are warmed)",
         },
         "standard_fields": [
             "partner",
@@ -514,6 +1024,234 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/cascade-stats")
+async def cascade_stats():
+    """
+    Report the model cascade of this worker (enabled with MODEL_CASCADE=1).
+
+    For the standard and custom extraction paths: pages seen, escalation
+    rate to the strong model, and estimated latency and cost saved compared
+    with always calling the strong model.
+    """
+    return {
+        "enabled": cascade_enabled(),
+        "extract": ModelCascade("extract").summary(),
+        "custom": ModelCascade("custom").summary(),
+    }
+
+
+@app.get("/repair-stats")
+async def repair_stats_endpoint():
+    """
+    Report field repairs of this worker (enabled with FIELD_REPAIR=1).
+
+    Counts pages that needed a follow-up request, the fields re-requested
+    and how many of them came back valid and were merged.
+    """
+    return {"enabled": repair_enabled(), **repair_stats.summary()}
+
+
+@app.get("/usage")
+async def usage_report(date: Optional[str] = None, tenant: Optional[str] = None):
+    """
+    Report model usage for one day (UTC, default today).
+
+    Per tenant: calls, images, prompt and completion tokens and cost, in
+    total and by endpoint and model, with the tenant's daily budget and
+    whether it is "ok" or past its "soft" or "hard" limit.
+
+    - **date**: Day as YYYY-MM-DD
+    - **tenant**: Only report this tenant
+    """
+    if not METERING:
+        raise HTTPException(status_code=404, detail="Usage is not metered")
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, get_meter().report, date, tenant)
+
+
+@app.get("/http-stats")
+async def http_stats():
+    """
+    Report the HTTP connection pool shared by the provider clients.
+
+    Open, busy and idle connections, requests sent and connections opened
+    for them (each a TCP and TLS handshake), and the share of requests that
+    reused a warm connection. Pool size, keep-alive and timeouts are set
+    with the HTTP_* environment variables.
+    """
+    from src.utils.http_pool import pool_stats
+
+    stats = pool_stats()
+    return {"in_use": stats is not None, **(stats or {})}
+
+
+@app.get("/webhook-stats")
+async def webhook_stats():
+    """
+    Report the webhook outbox (enabled with WEBHOOK_SECRET).
+
+    pending counts events queued or waiting for a retry; failed counts
+    events dropped after WEBHOOK_MAX_ATTEMPTS deliveries failed.
+    """
+    if webhooks is None:
+        return {"enabled": False}
+    return {"enabled": True, **webhooks.stats()}
+
+
+# Coordinator/worker mode (CLUSTER_MODE=coordinator): workers started with
+# `python -m src.core.cluster_worker` pull page tasks from these endpoints.
+# They are plain functions so they run on the server's thread pool, never
+# queued behind the extractions waiting on the workers in `executor`.
+
+
+class WorkerRegistration(BaseModel):
+    name: str
+    capacity: int = 1
+
+
+class LeaseRequest(BaseModel):
+    max_tasks: int = 1
+
+
+class TaskRelease(BaseModel):
+    task_ids: List[int]
+
+
+class TaskClaim(BaseModel):
+    worker_id: str
+
+
+class ModelCall(BaseModel):
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    images: int = 1
+
+
+class TaskResult(BaseModel):
+    worker_id: str
+    outcome: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    usage: List[ModelCall] = []
+
+
+def cluster_queue(request: Request):
+    """The task queue, after checking the caller's X-Cluster-Token."""
+    if pipeline.cluster is None:
+        raise HTTPException(status_code=404, detail="Cluster mode is not enabled")
+    # Set whenever cluster mode is on (checked at startup)
+    token = os.getenv("CLUSTER_TOKEN")
+    if not token or not hmac.compare_digest(
+        request.headers.get("X-Cluster-Token", ""), token
+    ):
+        raise HTTPException(status_code=401, detail="Invalid cluster token")
+    return pipeline.cluster
+
+
+def unknown_worker():
+    return HTTPException(status_code=404, detail="Unknown worker, register again")
+
+
+@app.post("/cluster/workers")
+def register_worker(registration: WorkerRegistration, request: Request):
+    """Register a worker; it must heartbeat every heartbeat_interval seconds."""
+    queue = cluster_queue(request)
+    return {
+        "worker_id": queue.register(registration.name, registration.capacity),
+        "heartbeat_interval": queue.heartbeat_interval,
+    }
+
+
+@app.delete("/cluster/workers/{worker_id}")
+def deregister_worker(worker_id: str, request: Request):
+    """Remove a worker that is shutting down; its unfinished tasks are re-queued."""
+    cluster_queue(request).deregister(worker_id)
+    return {"ok": True}
+
+
+@app.post("/cluster/workers/{worker_id}/heartbeat")
+def worker_heartbeat(worker_id: str, request: Request):
+    if not cluster_queue(request).heartbeat(worker_id):
+        raise unknown_worker()
+    return {"ok": True}
+
+
+@app.post("/cluster/workers/{worker_id}/lease")
+def lease_tasks(worker_id: str, lease: LeaseRequest, request: Request):
+    """Hand the worker up to max_tasks page tasks, stealing if the queue is empty."""
+    tasks = cluster_queue(request).lease(worker_id, max(0, lease.max_tasks))
+    if tasks is None:
+        raise unknown_worker()
+    return {"tasks": tasks}
+
+
+@app.post("/cluster/workers/{worker_id}/release")
+def release_tasks(worker_id: str, release: TaskRelease, request: Request):
+    """Put leased tasks the worker will not run back in the queue."""
+    cluster_queue(request).release(worker_id, release.task_ids)
+    return {"ok": True}
+
+
+@app.post("/cluster/tasks/{task_id}/start")
+def start_task(task_id: int, claim: TaskClaim, request: Request):
+    """Claim a leased task; started is false if it was stolen or re-queued."""
+    return {"started": cluster_queue(request).start(claim.worker_id, task_id)}
+
+
+@app.post("/cluster/tasks/{task_id}/result")
+def task_result(task_id: int, result: TaskResult, request: Request):
+    """
+    Store a task's outcome; accepted is false if it was already done.
+
+    The worker's model calls are recorded here, against the tenant of the
+    original request, so its budgets and /usage include them. They are
+    recorded even for a late duplicate: the tokens were spent either way.
+    """
+    queue = cluster_queue(request)
+    options = queue.task_options(task_id) if result.usage else None
+    outcome, error = result.outcome, result.error
+    accepted = queue.complete(result.worker_id, task_id, outcome, error)
+    if options and options.get("tenant"):
+        calls = [call.dict() for call in result.usage]
+        record_calls(options["tenant"], options.get("endpoint") or "", calls)
+    return {"accepted": accepted}
+
+
+@app.get("/cluster/jobs/{job_id}/pdf")
+def job_pdf(job_id: str, request: Request):
+    """The PDF of a queued job, for workers to render its pages."""
+    path = cluster_queue(request).job_pdf(job_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return FileResponse(path, media_type="application/pdf")
+
+
+@app.get("/cluster-stats")
+def cluster_stats():
+    """
+    Report coordinator/worker mode (enabled with CLUSTER_MODE=coordinator).
+
+    Live workers with their capacity, running and queued pages, pages
+    completed and stolen from other workers, and tasks by status.
+    """
+    if pipeline.cluster is None:
+        return {"enabled": False}
+    return {"enabled": True, **pipeline.cluster.stats()}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Check if this worker has finished warming up.
+
+    Returns 200 once the imaging modules are imported and the provider client
+    is built, 503 before that (or if warm-up failed).
+    """
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503, content=readiness
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
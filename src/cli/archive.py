@@ -0,0 +1,87 @@
+"""
+Extract invoices from every PDF in a ZIP or TAR archive.
+
+Results are written as NDJSON, one line per PDF in completion order, while
+the archive is still being read. Use "-" to read a TAR stream from stdin.
+
+Usage:
+    python -m src.cli.archive invoices.zip --output results.ndjson
+    curl -s https://example.com/march.tar.gz | python -m src.cli.archive - \
+        --max-in-flight 8
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from src.core import archive_ingest
+from src.core.invoice_pipeline import InvoicePipeline
+from src.utils.env import load_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract invoices from an archive")
+    parser.add_argument("archive", help='ZIP or TAR archive ("-" for stdin)')
+    parser.add_argument("--output", help="NDJSON output file (default stdout)")
+    parser.add_argument(
+        "--format",
+        choices=list(archive_ingest.ARCHIVE_FORMATS),
+        help="Archive type",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=int(os.getenv("ARCHIVE_MAX_IN_FLIGHT", "4")),
+        help="PDFs processed concurrently",
+    )
+    parser.add_argument(
+        "--no-preprocess", action="store_true", help="Skip image preprocessing"
+    )
+    args = parser.parse_args()
+
+    load_env()
+    pipeline = InvoicePipeline()
+
+    def process(path: str, name: str) -> dict:
+        invoice = pipeline.process(path, preprocess=not args.no_preprocess)
+        invoice.filename = name
+        return {"status": "success", "filename": name, "data": invoice.dict()}
+
+    if args.archive == "-":
+        source = sys.stdin.buffer
+    else:
+        source = open(args.archive, "rb")
+    output = open(args.output, "w") if args.output else sys.stdout
+    processor = archive_ingest.ArchiveProcessor(process, args.max_in_flight)
+
+    failed = False
+    try:
+        members = archive_ingest.iter_pdf_members(source, args.format)
+        for record in processor.results(members):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            if record["type"] == "result":
+                status = "✅" if record["status"] == "success" else "❌"
+                print(f"{status} {record['filename']}", file=sys.stderr)
+            elif record["type"] == "error":
+                print(f"❌ Error: {record['error']}", file=sys.stderr)
+                failed = True
+            else:
+                print(
+                    f"Processed {record['total']} PDFs: {record['successful']} "
+                    f"succeeded, {record['failed']} failed",
+                    file=sys.stderr,
+                )
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Extract invoices from every PDF under a directory tree.
+
+Results are appended to an NDJSON file, one line per PDF. A checkpoint
+manifest records each finished file (path, size, mtime, hash and status),
+so rerunning the same command skips files already extracted and retries
+only the ones that failed or changed since.
+
+Usage:
+    python -m src.cli.bulk invoices/ --output results.ndjson --workers 8
+    python -m src.cli.bulk invoices/ --output results.ndjson --no-retry
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional
+
+from src.core.invoice_pipeline import InvoicePipeline
+from src.utils.env import load_env
+from src.utils.shared_cache import file_digest
+
+
+def find_pdfs(root: str) -> Iterator[str]:
+    """PDF paths under root, in a stable order."""
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(folder, name)
+
+
+class Manifest:
+    """
+    Append-only checkpoint of processed files.
+
+    Each line is {"path", "size", "mtime", "sha256", "status", "error"}; the
+    last line for a path wins, so a crash loses at most the files that were
+    in progress.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted run
+                    self.entries[entry["path"]] = entry
+        self._file = open(path, "a")
+
+    def done(self, path: str, size: int, mtime: float) -> bool:
+        """Whether the file was extracted successfully and has not changed."""
+        entry = self.entries.get(path)
+        return (
+            entry is not None
+            and entry["status"] == "success"
+            and entry["size"] == size
+            and entry["mtime"] == mtime
+        )
+
+    def failed(self, path: str) -> bool:
+        entry = self.entries.get(path)
+        return entry is not None and entry["status"] != "success"
+
+    def known_digest(self, path: str) -> Optional[str]:
+        """Hash of the last successful extraction of this path."""
+        entry = self.entries.get(path)
+        return entry["sha256"] if entry and entry["status"] == "success" else None
+
+    def record(self, entry: dict):
+        self.entries[entry["path"]] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+class Progress:
+    """Single-line throughput and ETA readout on stderr."""
+
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.completed = 0
+        self.failed = 0
+        self.pages = 0
+        self.start = time.monotonic()
+
+    def update(self, status: str, pages: int = 0):
+        self.completed += 1
+        self.pages += pages
+        if status != "success":
+            self.failed += 1
+        self.show()
+
+    def show(self, end: str = ""):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        rate = self.completed / elapsed
+        remaining = self.total - self.completed
+        eta = format_duration(remaining / rate) if rate else "--"
+        self.stream.write(
+            f"\r{self.completed}/{self.total} files  {rate:.2f} files/s  "
+            f"{self.pages / elapsed:.2f} pages/s  {self.failed} failed  "
+            f"ETA {eta}   {end}"
+        )
+        self.stream.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract invoices from a directory")
+    parser.add_argument("root", help="Directory to search for PDFs")
+    parser.add_argument("--output", required=True, help="NDJSON results file")
+    parser.add_argument(
+        "--manifest", help="Checkpoint file (default: <output>.manifest)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("BULK_WORKERS", "4")),
+        help="PDFs processed concurrently",
+    )
+    parser.add_argument(
+        "--no-retry", action="store_true", help="Skip files that failed before"
+    )
+    parser.add_argument(
+        "--no-preprocess", action="store_true", help="Skip image preprocessing"
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"❌ Error: {args.root} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    load_env()
+    manifest = Manifest(args.manifest or args.output + ".manifest")
+
+    pending = []
+    skipped = 0
+    for path in find_pdfs(args.root):
+        stat = os.stat(path)
+        if manifest.done(path, stat.st_size, stat.st_mtime) or (
+            args.no_retry and manifest.failed(path)
+        ):
+            skipped += 1
+            continue
+        pending.append((path, stat.st_size, stat.st_mtime))
+
+    print(
+        f"📁 {len(pending)} PDFs to process, {skipped} already done",
+        file=sys.stderr,
+    )
+    if not pending:
+        manifest.close()
+        return
+
+    pipeline = InvoicePipeline()
+
+    def process(path: str, size: int, mtime: float):
+        entry = {"path": path, "size": size, "mtime": mtime, "error": None}
+        entry["sha256"] = file_digest(path)
+        if entry["sha256"] == manifest.known_digest(path):
+            # Touched but unchanged: keep the earlier result
+            entry["status"] = "success"
+            return entry, None
+        try:
+            invoice = pipeline.process(path, preprocess=not args.no_preprocess)
+            invoice.filename = path
+            entry["status"] = "success"
+            return entry, invoice
+        except Exception as e:
+            entry["status"] = "error"
+            entry["error"] = str(e)
+            return entry, None
+
+    progress = Progress(len(pending))
+    interrupted = False
+    with open(args.output, "a") as output, ThreadPoolExecutor(
+        max_workers=max(1, args.workers)
+    ) as pool:
+        queue = iter(pending)
+        in_flight = set()
+        try:
+            while True:
+                # Submit only a few files ahead so an interrupt stops quickly
+                while len(in_flight) < args.workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    in_flight.add(pool.submit(process, *item))
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry, invoice = future.result()
+                    pages = 0
+                    if invoice is not None:
+                        output.write(invoice.json() + "\n")
+                        output.flush()
+                        if invoice.processing:
+                            pages = invoice.processing.pages_processed
+                    elif entry["status"] != "success":
+                        output.write(
+                            json.dumps(
+                                {"filename": entry["path"], "error": entry["error"]}
+                            )
+                            + "\n"
+                        )
+                        output.flush()
+                    # The result is written before the checkpoint: a crash in
+                    # between reprocesses the file rather than losing it
+                    manifest.record(entry)
+                    progress.update(entry["status"], pages)
+        except KeyboardInterrupt:
+            interrupted = True
+            for future in in_flight:
+                future.cancel()
+
+    progress.show(end="\n")
+    manifest.close()
+    if interrupted:
+        print("⏸️  Interrupted - rerun the same command to resume", file=sys.stderr)
+        sys.exit(130)
+    if progress.failed:
+        print(
+            f"❌ {progress.failed} PDFs failed - rerun to retry them", file=sys.stderr
+        )
+        sys.exit(1)
+    print("✅ Done", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Bulk export of stored invoices.
+
+Usage:
+    python -m src.cli.export --format csv --output invoices.csv
+    python -m src.cli.export --format parquet --output march.parquet \
+        --date-from 2024-03-01 --date-to 2024-03-31
+"""
+
+import argparse
+import sys
+
+from src.utils.invoice_exporter import EXPORT_FORMATS, InvoiceExporter
+from src.utils.sqlite_storage import SQLiteInvoiceStorage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stored invoices")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--output", help="Output file (default: stdout)")
+    parser.add_argument("--db", help="Database path (default: $INVOICE_DB_PATH)")
+    parser.add_argument("--date-from", help="First invoice date, YYYY-MM-DD")
+    parser.add_argument("--date-to", help="Last invoice date, YYYY-MM-DD")
+    parser.add_argument("--partner", help="Only invoices from this partner")
+    args = parser.parse_args()
+
+    storage = SQLiteInvoiceStorage(args.db)
+    rows = storage.iter_rows(args.date_from, args.date_to, args.partner)
+    exporter = InvoiceExporter()
+
+    try:
+        if args.output:
+            exporter.export(rows, args.format, args.output)
+        else:
+            for chunk in exporter.stream(rows, args.format):
+                sys.stdout.buffer.write(chunk)
+    except ValueError as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
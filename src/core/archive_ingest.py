@@ -0,0 +1,351 @@
+import io
+import logging
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from src.utils.context_executor import ContextThreadPoolExecutor
+
+ARCHIVE_FORMATS = ("zip", "tar")
+
+# Members larger than this are reported as errors instead of processed
+MAX_MEMBER_BYTES = int(os.getenv("ARCHIVE_MAX_MEMBER_BYTES", str(100 * 1024 * 1024)))
+
+_COPY_CHUNK = 1024 * 1024
+
+# Leading bytes of compressed tar streams (gzip, bzip2, xz)
+_TAR_COMPRESSION_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")
+
+
+class MemberTooLarge(Exception):
+    """A member holds more than MAX_MEMBER_BYTES, whatever its header says."""
+
+
+class ArchiveMember:
+    """
+    One PDF read from an archive.
+
+    Attributes:
+        name: Path of the member inside the archive
+        path: Temporary file holding its bytes (None if it could not be read)
+        error: Why the member was not extracted
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, error: str = ""):
+        self.name = name
+        self.path = path
+        self.error = error
+
+
+class ChunkPipe(io.RawIOBase):
+    """
+    A read-only file fed with chunks from another thread.
+
+    Lets an archive be read (by ``iter_pdf_members`` in a worker thread)
+    while its bytes are still arriving, e.g. from an HTTP request body.
+    ``feed`` blocks once ``max_chunks`` are buffered, so a slow reader
+    holds back the upload instead of buffering it in memory.
+    """
+
+    def __init__(self, max_chunks: int = 64):
+        self._chunks: queue.Queue = queue.Queue(maxsize=max_chunks)
+        self._current = b""
+        self._eof = False
+        self._abandoned = False
+
+    def readable(self) -> bool:
+        return True
+
+    def feed(self, chunk: bytes):
+        """Append a chunk; dropped if the reader has stopped reading."""
+        while not self._abandoned:
+            try:
+                self._chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        """Mark the end of the data."""
+        self.feed(b"")
+
+    def abandon(self):
+        """Called by the reader when it stops early, to unblock ``feed``."""
+        self._abandoned = True
+        while True:
+            try:
+                self._chunks.get_nowait()
+            except queue.Empty:
+                return
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            if self._eof:
+                return 0
+            self._current = self._chunks.get()
+            if not self._current:
+                self._eof = True
+                return 0
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    """Guess "zip" or "tar" from the first bytes of an archive."""
+    if head.startswith(b"PK\x03\x04") or head.startswith(b"PK\x05\x06"):
+        return "zip"
+    if head.startswith(_TAR_COMPRESSION_MAGIC) or head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+def _wanted(name: str) -> bool:
+    base = os.path.basename(name)
+    return (
+        name.lower().endswith(".pdf")
+        and not name.startswith("__MACOSX/")
+        and not base.startswith("._")
+    )
+
+
+def _spool(source: BinaryIO, output_folder: Optional[str]) -> str:
+    """
+    Copy a member to a temporary file, counting the bytes actually read:
+    the size in the archive header is not trusted (e.g. a ZIP bomb).
+
+    Raises:
+        MemberTooLarge: The member exceeds MAX_MEMBER_BYTES; nothing is
+            left on disk
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=output_folder, suffix=".pdf", delete=False
+    ) as tmp_file:
+        try:
+            copied = 0
+            while True:
+                chunk = source.read(_COPY_CHUNK)
+                if not chunk:
+                    return tmp_file.name
+                copied += len(chunk)
+                if copied > MAX_MEMBER_BYTES:
+                    raise MemberTooLarge()
+                tmp_file.write(chunk)
+        except BaseException:
+            tmp_file.close()
+            os.remove(tmp_file.name)
+            raise
+
+
+def iter_pdf_members(
+    fileobj: BinaryIO, fmt: Optional[str] = None, output_folder: Optional[str] = None
+) -> Iterator[ArchiveMember]:
+    """
+    Read the PDFs of a ZIP or TAR archive one member at a time.
+
+    TAR archives (plain or gzip/bzip2/xz compressed) are read as a stream,
+    so members are yielded while the rest of the archive is still arriving.
+    ZIP archives keep their index at the end, so a non-seekable ZIP stream
+    is first spooled to a temporary file. Each member is written to its own
+    temporary file only when the consumer asks for it; the consumer deletes
+    it once processed.
+
+    Args:
+        fileobj: The archive, as a binary file object
+        fmt: "zip" or "tar"; detected from the first bytes when omitted
+        output_folder: Where member files are written (system temp default)
+    """
+    if fmt is None:
+        head = fileobj.peek(512)[:512] if hasattr(fileobj, "peek") else None
+        if head is None:
+            raise ValueError("Archive format must be given for this stream")
+        fmt = detect_format(head)
+        if fmt is None:
+            raise ValueError("Not a ZIP or TAR archive")
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unsupported archive format. Available: {ARCHIVE_FORMATS}")
+
+    if fmt == "tar":
+        yield from _iter_tar(fileobj, output_folder)
+        return
+
+    seekable = getattr(fileobj, "seekable", lambda: False)()
+    spooled = None
+    if not seekable:
+        spooled = tempfile.TemporaryFile(dir=output_folder)
+        shutil.copyfileobj(fileobj, spooled)
+        spooled.seek(0)
+    try:
+        yield from _iter_zip(spooled or fileobj, output_folder)
+    finally:
+        if spooled:
+            spooled.close()
+
+
+def _iter_tar(fileobj: BinaryIO, output_folder: Optional[str]):
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError as e:
+        raise ValueError(f"Invalid TAR archive: {e}")
+
+    with archive:
+        try:
+            yield from _tar_members(archive, output_folder)
+        except (tarfile.TarError, EOFError) as e:
+            # Corrupt or truncated mid-stream, after the first members
+            raise ValueError(f"Invalid TAR archive: {e}")
+
+
+def _tar_members(archive: tarfile.TarFile, output_folder: Optional[str]):
+    for member in archive:
+        if not member.isfile() or not _wanted(member.name):
+            continue
+        if member.size > MAX_MEMBER_BYTES:
+            yield ArchiveMember(member.name, error="File too large")
+            continue
+        try:
+            path = _spool(archive.extractfile(member), output_folder)
+        except MemberTooLarge:
+            yield ArchiveMember(member.name, error="File too large")
+            continue
+        yield ArchiveMember(member.name, path)
+
+
+def _iter_zip(fileobj: BinaryIO, output_folder: Optional[str]):
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid ZIP archive: {e}")
+
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _wanted(info.filename):
+                continue
+            if info.file_size > MAX_MEMBER_BYTES:
+                yield ArchiveMember(info.filename, error="File too large")
+                continue
+            try:
+                with archive.open(info) as source:
+                    path = _spool(source, output_folder)
+            except MemberTooLarge:
+                yield ArchiveMember(info.filename, error="File too large")
+                continue
+            except (zipfile.BadZipFile, RuntimeError, OSError) as e:
+                error = f"Unreadable member: {e}"
+                yield ArchiveMember(info.filename, error=error)
+                continue
+            yield ArchiveMember(info.filename, path)
+
+
+class ArchiveProcessor:
+    """
+    Process the PDFs of an archive concurrently, yielding results as they
+    complete while further members are still being read.
+
+    At most ``max_in_flight`` members are extracted to disk and queued for
+    processing at any time, so an archive of thousands of PDFs never has
+    more than that many temporary files or pending tasks.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, str], dict],
+        max_in_flight: int = 4,
+        executor: Optional[Executor] = None,
+    ):
+        """
+        Args:
+            process: Called with (temporary path, member name); returns the
+                result record for that member (e.g. status, filename, data)
+            max_in_flight: Members being processed at once
+            executor: Pool to run on; a private pool is used when omitted
+        """
+        self.process = process
+        self.max_in_flight = max(1, max_in_flight)
+        self.executor = executor
+
+    def _run(self, member: ArchiveMember) -> dict:
+        try:
+            return self.process(member.path, member.name)
+        except Exception as e:
+            logging.error(f"Error processing {member.name}: {e}")
+            return {"status": "error", "filename": member.name, "error": str(e)}
+        finally:
+            if os.path.exists(member.path):
+                os.remove(member.path)
+
+    def results(self, members: Iterator[ArchiveMember]) -> Iterator[dict]:
+        """
+        Yields:
+            One {"type": "result", ...} record per PDF member in completion
+            order, then a {"type": "complete", ...} summary
+        """
+        pool = self.executor or ContextThreadPoolExecutor(
+            max_workers=self.max_in_flight
+        )
+        in_flight = set()
+        ready = deque()
+        counts = {"total": 0, "successful": 0, "failed": 0}
+
+        def record(result: dict) -> dict:
+            counts["total"] += 1
+            if result.get("status") == "success":
+                counts["successful"] += 1
+            else:
+                counts["failed"] += 1
+            return {"type": "result", "index": counts["total"], **result}
+
+        def collect(block: bool):
+            if not in_flight:
+                return
+            done, _ = wait(
+                in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                in_flight.discard(future)
+                ready.append(record(future.result()))
+
+        try:
+            for member in members:
+                if member.path is None:
+                    ready.append(
+                        record(
+                            {
+                                "status": "error",
+                                "filename": member.name,
+                                "error": member.error,
+                            }
+                        )
+                    )
+                else:
+                    while len(in_flight) >= self.max_in_flight:
+                        collect(block=True)
+                    in_flight.add(pool.submit(self._run, member))
+                collect(block=False)
+                while ready:
+                    yield ready.popleft()
+
+            while in_flight:
+                collect(block=True)
+                while ready:
+                    yield ready.popleft()
+        except ValueError as e:
+            # The archive itself is broken: report it after what was processed
+            for future in list(in_flight):
+                ready.append(record(future.result()))
+            in_flight.clear()
+            while ready:
+                yield ready.popleft()
+            yield {"type": "error", "error": str(e)}
+        finally:
+            if not self.executor:
+                pool.shutdown(wait=True)
+
+        yield {"type": "complete", **counts}
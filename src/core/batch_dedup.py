@@ -0,0 +1,100 @@
+import hashlib
+import logging
+from typing import BinaryIO, Dict, List, Optional
+
+from src.core.page_classifier import difference_hash, hamming
+from src.utils.shared_cache import file_digest
+
+# First pages whose hashes differ in at most this many of 256 bits match
+MAX_PAGE_HASH_DISTANCE = 4
+
+# Resolution used to render first pages for the perceptual hash
+THUMBNAIL_DPI = 40
+
+
+def copy_with_digest(
+    source: BinaryIO, destination: BinaryIO, chunk_size: int = 1024 * 1024
+) -> str:
+    """Copy a file object and return the SHA-256 of the copied bytes."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: source.read(chunk_size), b""):
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
+
+
+def first_page_signature(pdf_path: str) -> Optional[tuple]:
+    """
+    (page count, difference hash of the first page), or None if the PDF
+    cannot be rendered.
+    """
+    import numpy as np
+    from pdf2image import convert_from_path, pdfinfo_from_path
+
+    try:
+        pages = int(pdfinfo_from_path(pdf_path)["Pages"])
+        first = convert_from_path(
+            pdf_path, dpi=THUMBNAIL_DPI, first_page=1, last_page=1, grayscale=True
+        )[0]
+        return pages, difference_hash(np.asarray(first))
+    except Exception as e:
+        logging.error(f"Could not hash first page of {pdf_path}: {e}")
+        return None
+
+
+def find_duplicates(
+    pdf_paths: List[str],
+    digests: Optional[List[str]] = None,
+    perceptual: bool = False,
+) -> Dict[int, int]:
+    """
+    Find documents that appear more than once in a batch.
+
+    Documents match when their bytes are identical. With ``perceptual``,
+    documents with the same page count whose first pages look the same also
+    match (e.g. the same scan saved twice). That check can pair two invoices
+    printed from one template with near-identical content, so it is opt-in.
+
+    Args:
+        pdf_paths: Documents of the batch
+        digests: SHA-256 of each document if already known (e.g. computed
+            while spooling the upload)
+        perceptual: Also compare rendered first pages
+
+    Returns:
+        Index of each duplicate -> index of its first occurrence
+    """
+    digests = digests or [file_digest(path) for path in pdf_paths]
+
+    duplicate_of = {}
+    first_by_digest = {}
+    for i, digest in enumerate(digests):
+        if digest in first_by_digest:
+            duplicate_of[i] = first_by_digest[digest]
+        else:
+            first_by_digest[digest] = i
+
+    if perceptual:
+        signatures = []  # (index, page count, hash) of documents kept so far
+        for i, path in enumerate(pdf_paths):
+            if i in duplicate_of:
+                continue
+            signature = first_page_signature(path)
+            if signature is None:
+                continue
+            pages, page_hash = signature
+            for original, original_pages, original_hash in signatures:
+                if (
+                    pages == original_pages
+                    and hamming(page_hash, original_hash) <= MAX_PAGE_HASH_DISTANCE
+                ):
+                    duplicate_of[i] = original
+                    break
+            else:
+                signatures.append((i, pages, page_hash))
+
+        # Exact copies of a document that itself matched perceptually
+        for i, original in duplicate_of.items():
+            duplicate_of[i] = duplicate_of.get(original, original)
+
+    return duplicate_of
@@ -0,0 +1,157 @@
+import logging
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import List, Optional, Sequence, Tuple
+
+from src.models.extraction_models import InvoiceDataExtracted
+from src.models.line_amounts import LineAmounts
+from src.models.models import InvoiceData, InvoiceLine, InvoiceTotals
+from src.utils.vat_calculator import VATCalculator
+
+TWO_PLACES = Decimal("0.01")
+ZERO = Decimal("0")
+
+
+def _round(value: Decimal) -> Decimal:
+    """Round to 2 decimal places the same way ``round(value, 2)`` does."""
+    return value.quantize(TWO_PLACES, rounding=ROUND_HALF_EVEN)
+
+
+class LineColumns:
+    """
+    The parsed amounts of every invoice line of a whole batch.
+
+    All lines of all invoices are laid out back to back; ``offsets[i]`` and
+    ``offsets[i + 1]`` delimit the lines belonging to invoice ``i``. Each
+    line is parsed once (``line.amounts``) and reused from then on.
+    """
+
+    def __init__(self, invoices: Sequence):
+        self.offsets = [0]
+        self.amounts: List[LineAmounts] = []
+
+        for invoice in invoices:
+            lines = invoice.invoice_lines if invoice else []
+            self.amounts.extend(line.amounts for line in lines)
+            self.offsets.append(len(self.amounts))
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def net_amounts(self) -> List[Optional[Decimal]]:
+        """Exact quantity × unit_price per line (None when either is missing)."""
+        return [amounts.net for amounts in self.amounts]
+
+
+class BatchPostProcessor:
+    """
+    Post-processes a whole batch of invoices in one pass.
+
+    Equivalent to calling ``InvoicePostProcessor.add_vat_calculations`` and
+    ``InvoicePostProcessor.calculate_total_amount`` per invoice, with the
+    whole batch's lines gathered in one pass.
+    """
+
+    @staticmethod
+    def _line_vat(columns: LineColumns) -> List[Optional[Decimal]]:
+        """Compute the rounded VAT amount of every line in one pass."""
+        return [VATCalculator.vat_for(net) for net in columns.net_amounts()]
+
+    @staticmethod
+    def _totals(
+        subtotal: Decimal, total_vat: Decimal, line_count: int, filename=None
+    ) -> InvoiceTotals:
+        subtotal = _round(subtotal)
+        total_vat = _round(total_vat)
+        return InvoiceTotals(
+            filename=filename,
+            subtotal=str(subtotal),
+            total_vat=str(total_vat),
+            total_amount=str(subtotal + total_vat),
+            line_count=line_count,
+        )
+
+    @classmethod
+    def add_vat_calculations(
+        cls, extracted: Sequence[Optional[InvoiceDataExtracted]]
+    ) -> List[Optional[InvoiceData]]:
+        """
+        Convert a batch of extracted invoices to final format with VAT amounts.
+
+        Args:
+            extracted: Invoice data from AI extraction (entries may be None)
+
+        Returns:
+            List aligned with ``extracted``; failed entries are None
+        """
+        columns = LineColumns(extracted)
+        line_vat = cls._line_vat(columns)
+
+        results = []
+        for index, data in enumerate(extracted):
+            if not data:
+                results.append(None)
+                continue
+            try:
+                start = columns.offsets[index]
+                lines = []
+                for i, line in enumerate(data.invoice_lines):
+                    vat = line_vat[start + i]
+                    vat_text = str(vat) if vat is not None else ""
+                    processed = InvoiceLine(
+                        product=line.product,
+                        quantity=line.quantity,
+                        unit_price=line.unit_price,
+                        taxes=line.taxes,
+                        gross_price=line.gross_price,
+                        vat_amount=vat_text,
+                    )
+                    # Carry the parsed amounts over instead of parsing again
+                    parsed = columns.amounts[start + i]
+                    LineAmounts.known(
+                        processed, parsed.quantity, parsed.unit_price, vat
+                    )
+                    lines.append(processed)
+                results.append(
+                    InvoiceData(
+                        **data.dict(exclude={"invoice_lines"}), invoice_lines=lines
+                    )
+                )
+            except Exception as e:
+                logging.error(f"Batch post-processing failed: {e}")
+                results.append(None)
+
+        return results
+
+    @classmethod
+    def calculate_totals(
+        cls, invoices: Sequence[InvoiceData]
+    ) -> Tuple[List[InvoiceTotals], InvoiceTotals]:
+        """
+        Calculate subtotal, VAT and total for every invoice and for the batch.
+
+        VAT totals are the sum of the rounded line VAT amounts, matching
+        ``InvoicePostProcessor.calculate_total_vat``.
+
+        Args:
+            invoices: Processed invoice data with VAT amounts
+
+        Returns:
+            Tuple of (per-invoice totals aligned with ``invoices``, batch totals)
+        """
+        columns = LineColumns(invoices)
+        net = columns.net_amounts()
+        vat = [amounts.vat for amounts in columns.amounts]
+
+        per_invoice = []
+        batch_subtotal = ZERO
+        batch_vat = ZERO
+        for invoice, start, end in zip(invoices, columns.offsets, columns.offsets[1:]):
+            subtotal = sum((n for n in net[start:end] if n), ZERO)
+            total_vat = sum((v for v in vat[start:end] if v), ZERO)
+            batch_subtotal += subtotal
+            batch_vat += total_vat
+            per_invoice.append(
+                cls._totals(subtotal, total_vat, end - start, invoice.filename)
+            )
+
+        return per_invoice, cls._totals(batch_subtotal, batch_vat, len(columns))
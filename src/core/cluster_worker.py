@@ -0,0 +1,324 @@
+"""
+Extraction worker for coordinator/worker mode.
+
+Pulls page tasks from a coordinator (an API node started with
+CLUSTER_MODE=coordinator), renders, preprocesses and extracts each page
+with the local pipeline, and posts the outcome back. Start as many as the
+hardware allows, on any host that can reach the coordinator:
+
+    python -m src.core.cluster_worker --coordinator http://localhost:8000
+
+Configuration (environment, overridden by the options below):
+    CLUSTER_COORDINATOR  coordinator URL
+    CLUSTER_TOKEN        shared secret, as set on the coordinator
+    WORKER_CAPACITY      pages extracted at once, default 4
+    WORKER_PREFETCH      extra pages leased ahead of time, default the
+                         capacity; idle workers may steal them
+"""
+
+import argparse
+import logging
+import os
+import queue
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from src.core.invoice_pipeline import InvoicePipeline
+from src.utils.usage import collected_usage
+
+TOKEN_HEADER = "X-Cluster-Token"
+
+
+class WorkerLost(Exception):
+    """The coordinator no longer knows this worker; it must register again."""
+
+
+class ClusterWorker:
+    """
+    Pull-based worker: leases up to capacity + prefetch page tasks, claims
+    each one just before running it (a task stolen by an idle worker in the
+    meantime is dropped), and heartbeats so the coordinator can re-queue
+    its tasks if it dies.
+    """
+
+    def __init__(
+        self,
+        coordinator: str,
+        name: Optional[str] = None,
+        capacity: Optional[int] = None,
+        prefetch: Optional[int] = None,
+        token: Optional[str] = None,
+        work_dir: Optional[str] = None,
+    ):
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.capacity = max(1, capacity or int(os.getenv("WORKER_CAPACITY", "4")))
+        self.prefetch = (
+            prefetch
+            if prefetch is not None
+            else int(os.getenv("WORKER_PREFETCH", str(self.capacity)))
+        )
+        token = token or os.getenv("CLUSTER_TOKEN")
+        self.client = httpx.Client(
+            base_url=coordinator.rstrip("/"),
+            headers={TOKEN_HEADER: token} if token else {},
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="cluster-worker-")
+        self.pipeline = InvoicePipeline(os.path.join(self.work_dir, "pages"))
+        self.pipeline.cluster = None  # always extract locally
+
+        self.worker_id: Optional[str] = None
+        self.heartbeat_interval = 2.0
+        self.tasks: "queue.Queue[Dict]" = queue.Queue()
+        self.running = 0
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pdfs: Dict[str, str] = {}  # job id -> downloaded PDF
+        self._pdf_locks: Dict[str, threading.Lock] = {}
+        # job id -> tasks of the job queued or running here
+        self._job_tasks: Dict[str, int] = {}
+
+    def _post(self, path: str, **body) -> Dict:
+        response = self.client.post(path, json=body)
+        if response.status_code == 404 and path.startswith("/cluster/workers/"):
+            raise WorkerLost()
+        response.raise_for_status()
+        return response.json()
+
+    def register(self):
+        registered = self._post(
+            "/cluster/workers", name=self.name, capacity=self.capacity
+        )
+        self.worker_id = registered["worker_id"]
+        self.heartbeat_interval = registered["heartbeat_interval"]
+        logging.info(f"Registered with the coordinator as {self.worker_id}")
+
+    def run(self):
+        """Process tasks until stop() is called (or SIGINT/SIGTERM)."""
+        self._connect()
+        threading.Thread(target=self._heartbeats, daemon=True).start()
+        threads = [
+            threading.Thread(target=self._work, name=f"extract-{i}")
+            for i in range(self.capacity)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self.stopping.is_set():
+                with self._lock:
+                    wanted = self.capacity + self.prefetch
+                    wanted -= self.running + self.tasks.qsize()
+                leased = self._lease(wanted) if wanted > 0 else 0
+                if not leased:
+                    self.stopping.wait(0.5)
+        finally:
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+            self._shutdown()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _connect(self):
+        # Retry until the coordinator is up, so workers can start first
+        delay = 1.0
+        while not self.stopping.is_set():
+            try:
+                self.register()
+                return
+            except httpx.HTTPError as e:
+                logging.warning(f"Coordinator unreachable ({e}), retrying")
+                self.stopping.wait(delay)
+                delay = min(delay * 2, 30.0)
+
+    def _lease(self, wanted: int) -> int:
+        try:
+            tasks = self._post(
+                f"/cluster/workers/{self.worker_id}/lease", max_tasks=wanted
+            )["tasks"]
+        except WorkerLost:
+            logging.warning("Coordinator lost this worker, registering again")
+            self._connect()
+            return 0
+        except httpx.HTTPError as e:
+            logging.warning(f"Leasing tasks failed: {e}")
+            return 0
+        with self._lock:
+            counts = self._job_tasks
+            for task in tasks:
+                counts[task["job_id"]] = counts.get(task["job_id"], 0) + 1
+        for task in tasks:
+            self.tasks.put(task)
+        return len(tasks)
+
+    def _heartbeats(self):
+        while not self.stopping.wait(self.heartbeat_interval):
+            try:
+                self._post(f"/cluster/workers/{self.worker_id}/heartbeat")
+            except WorkerLost:
+                pass  # the lease loop registers again
+            except httpx.HTTPError as e:
+                logging.warning(f"Heartbeat failed: {e}")
+
+    def _work(self):
+        while not self.stopping.is_set():
+            try:
+                task = self.tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self.running += 1
+            try:
+                self._run_task(task)
+            except Exception as e:
+                logging.error(f"Task {task['task_id']} could not be reported: {e}")
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self._task_done(task["job_id"])
+
+    def _task_done(self, job_id: str):
+        # Called with self._lock held
+        left = self._job_tasks.pop(job_id, 1) - 1
+        if left > 0:
+            self._job_tasks[job_id] = left
+
+    def _run_task(self, task: Dict):
+        worker_id = self.worker_id
+        claimed = self._post(
+            f"/cluster/tasks/{task['task_id']}/start", worker_id=worker_id
+        )
+        if not claimed["started"]:
+            return  # stolen by another worker or re-queued
+
+        start = time.perf_counter()
+        outcome, error = None, None
+        # Model calls are recorded by the coordinator, against the tenant of
+        # the original request, so its budgets see them
+        usage = []
+        collecting = collected_usage.set(usage)
+        try:
+            outcome = self.process(task)
+        except Exception as e:
+            logging.error(f"Page {task['page']} of job {task['job_id']} failed: {e}")
+            error = str(e) or type(e).__name__
+        finally:
+            collected_usage.reset(collecting)
+        if outcome is not None:
+            outcome["seconds"] = round(time.perf_counter() - start, 3)
+        self._post(
+            f"/cluster/tasks/{task['task_id']}/result",
+            worker_id=worker_id,
+            outcome=outcome,
+            error=error,
+            usage=usage,
+        )
+
+    def process(self, task: Dict) -> Dict:
+        """Render, classify and extract the page of a task."""
+        options = task["options"]
+        page_dir = tempfile.mkdtemp(dir=self.pipeline.output_folder)
+        try:
+            img, pixels = self._render(task, page_dir)
+            outcome = self.pipeline.extract_task_page(img, options)
+            outcome["pixels"] = pixels
+            return outcome
+        finally:
+            shutil.rmtree(page_dir, ignore_errors=True)
+
+    def _render(self, task: Dict, page_dir: str):
+        converter = self.pipeline.pdf_converter
+        page = task["page"]
+        images = converter.render(
+            self._pdf(task["job_id"]), page, page, task["options"]["dpi"]
+        )
+        try:
+            image = converter.limit_size(images[0])
+            path = os.path.join(page_dir, f"page_{page}.png")
+            image.save(path, "PNG")
+            return path, image.width * image.height
+        finally:
+            for image in images:
+                image.close()
+
+    def _pdf(self, job_id: str) -> str:
+        """The job's PDF, downloaded from the coordinator once per job."""
+        with self._lock:
+            lock = self._pdf_locks.setdefault(job_id, threading.Lock())
+        with lock:
+            if job_id not in self._pdfs:
+                path = os.path.join(self.work_dir, f"{job_id}.pdf")
+                with self.client.stream("GET", f"/cluster/jobs/{job_id}/pdf") as r:
+                    r.raise_for_status()
+                    with open(path, "wb") as f:
+                        for chunk in r.iter_bytes():
+                            f.write(chunk)
+                with self._lock:
+                    self._pdfs[job_id] = path
+                    self._evict_pdfs()
+            return self._pdfs[job_id]
+
+    def _evict_pdfs(self, keep: int = 16):
+        """
+        Delete the oldest PDFs beyond the keep most recent of jobs with no
+        task queued or running here. Called with self._lock held.
+        """
+        idle = [job for job in self._pdfs if job not in self._job_tasks]
+        for job_id in idle[:-keep]:
+            path = self._pdfs.pop(job_id)
+            self._pdf_locks.pop(job_id, None)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _shutdown(self):
+        """Return unstarted tasks and leave the cluster."""
+        unstarted = []
+        while not self.tasks.empty():
+            unstarted.append(self.tasks.get_nowait()["task_id"])
+        try:
+            if unstarted:
+                self._post(
+                    f"/cluster/workers/{self.worker_id}/release", task_ids=unstarted
+                )
+            self.client.delete(f"/cluster/workers/{self.worker_id}")
+        except (httpx.HTTPError, WorkerLost) as e:
+            logging.warning(f"Leaving the cluster failed: {e}")
+        self.client.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoice extraction cluster worker")
+    parser.add_argument(
+        "--coordinator",
+        default=os.getenv("CLUSTER_COORDINATOR", "http://localhost:8000"),
+        help="URL of the coordinator API",
+    )
+    parser.add_argument("--name", help="name shown in /cluster-stats")
+    parser.add_argument("--capacity", type=int, help="pages extracted at once")
+    parser.add_argument("--prefetch", type=int, help="extra pages leased ahead")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # a line per request
+    worker = ClusterWorker(
+        args.coordinator, name=args.name, capacity=args.capacity, prefetch=args.prefetch
+    )
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: worker.stop())
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
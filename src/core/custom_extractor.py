@@ -1,22 +1,53 @@
 import base64
 import logging
 import os
+from collections import deque
+from typing import List, Optional
 
-from dotenv import load_dotenv
-from google import genai
-
-from models import InvoiceData
-from pdf_converter import PDFConverter
+from src.core import field_schema
+from src.core.field_schema import PREDEFINED_FIELD_SETS, compile_field_set
 from src.core.image_preprocessor import ImagePreprocessor
+from src.core.model_cascade import ModelCascade, cascade_enabled
+from src.core.pdf_converter import PDFConverter
+from src.utils.context_executor import ContextThreadPoolExecutor
+from src.utils.env import load_env
+from src.utils.invoice_validator import InvoiceValidator
+from src.utils.shared_cache import SharedCache
+from src.utils.usage import record_gemini_usage
+
+# Values the model returns when it could not find a field
+EMPTY_VALUES = {"", "none", "null", "n/a", "na", "-"}
 
-load_dotenv(dotenv_path=".env")
+
+def is_confident(value) -> bool:
+    """Whether an extracted scalar value is an actual value, not a placeholder."""
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value.strip().lower() not in EMPTY_VALUES
+    return bool(value) or value == 0
 
 
 class CustomInvoiceExtractor:
-    def __init__(self, output_folder: str = "temp_images"):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.pdf_converter = PDFConverter(output_folder)
+    def __init__(
+        self,
+        output_folder: str = "temp_images",
+        cache: Optional[SharedCache] = None,
+        max_workers: Optional[int] = None,
+    ):
+        from google import genai
+
+        from src.utils.http_pool import genai_http_options
+
+        load_env()
+        self.client = genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"), http_options=genai_http_options()
+        )
+        self.pdf_converter = PDFConverter(output_folder, cache=cache)
         self.preprocessor = ImagePreprocessor()
+        self.max_workers = max_workers or int(os.getenv("CUSTOM_EXTRACT_WORKERS", "4"))
+        self.model = os.getenv("CUSTOM_EXTRACT_MODEL", "gemini-2.0-flash-exp")
+        self.cascade = ModelCascade("custom") if cascade_enabled() else None
 
     def extract_custom_fields(
         self, pdf_path: str, requested_fields: dict, preprocess=True
@@ -24,6 +55,10 @@ class CustomInvoiceExtractor:
         """
         Extract custom fields from PDF based on user specifications.
 
+        All pages are considered. Scalar fields take the first confident
+        value in page order and list fields (e.g. invoice_lines) are
+        concatenated across pages. See ``_extract_pages``.
+
         Args:
             pdf_path: Path to the PDF file
             requested_fields: Dictionary of field_name: description
@@ -32,6 +67,7 @@ class CustomInvoiceExtractor:
         Returns:
             Dictionary with extracted custom fields
         """
+        image_paths = []
         try:
             # Convert PDF to images
             image_paths = self.pdf_converter.convert(pdf_path)
@@ -39,65 +75,130 @@ class CustomInvoiceExtractor:
             if not image_paths:
                 raise ValueError("Failed to convert PDF to images")
 
-            # Process the first image (you can extend this to handle multiple pages)
-            image_path = image_paths[0]
-
-            if preprocess:
-                image_path = self.preprocessor.preprocess(image_path)
-
-            # Extract custom fields using AI
-            custom_data = self._extract_with_ai(image_path, requested_fields)
+            # Extract custom fields from all pages using AI
+            custom_data = self._extract_pages(image_paths, requested_fields, preprocess)
 
             return custom_data
 
         except Exception as e:
             logging.error(f"Custom extraction failed: {e}")
             raise ValueError(f"Custom extraction failed: {str(e)}")
+        finally:
+            self.pdf_converter.release(image_paths)
 
-    def _extract_with_ai(self, image_path: str, requested_fields: dict) -> dict:
+    def _extract_pages(
+        self, image_paths: List[str], requested_fields: dict, preprocess=True
+    ) -> dict:
+        """
+        Extract the requested fields from every page concurrently.
+
+        Up to ``max_workers`` pages are in flight at once and results are
+        merged in page order, so "first value" means first by page, not by
+        completion time. Once every scalar field has a confident value, the
+        remaining pages are only asked for list fields, or not queried at all
+        when no list fields were requested.
+        """
+        list_fields = {
+            name for name in requested_fields if name in field_schema.LIST_FIELDS
+        }
+        merged = {name: [] if name in list_fields else "" for name in requested_fields}
+
+        def missing_scalars() -> List[str]:
+            return [
+                name
+                for name in requested_fields
+                if name not in list_fields and not is_confident(merged[name])
+            ]
+
+        def extract_page(image_path: str, fields: dict) -> dict:
+            if preprocess:
+                image_path = self.preprocessor.preprocess(image_path)
+            if self.cascade:
+                # Dates are requested as DD/MM/YYYY on this path
+                return self.cascade.run(
+                    lambda model: self._extract_with_ai(image_path, fields, model),
+                    lambda data: InvoiceValidator.invalid_fields(data, "%d/%m/%Y"),
+                )
+            return self._extract_with_ai(image_path, fields)
+
+        pages = iter(image_paths)
+        pending = deque()
+
+        with ContextThreadPoolExecutor(max_workers=self.max_workers) as pool:
+
+            def submit_next() -> bool:
+                if missing_scalars():
+                    fields = requested_fields
+                else:
+                    fields = {name: requested_fields[name] for name in list_fields}
+                if not fields:
+                    return False  # every field is filled: stop early
+                image_path = next(pages, None)
+                if image_path is None:
+                    return False
+                pending.append(pool.submit(extract_page, image_path, fields))
+                return True
+
+            for _ in range(self.max_workers):
+                if not submit_next():
+                    break
+
+            while pending:
+                page_data = pending.popleft().result()
+                self._merge_page(merged, page_data, list_fields)
+                submit_next()
+
+        return merged
+
+    @staticmethod
+    def _merge_page(merged: dict, page_data: dict, list_fields: set):
+        """Merge one page's fields into the combined result (in place)."""
+        if not isinstance(page_data, dict):
+            return
+        for name, value in page_data.items():
+            if name not in merged:
+                continue
+            if isinstance(value, list):
+                # Fields returned as lists are concatenated across pages
+                list_fields.add(name)
+                current = merged[name] if isinstance(merged[name], list) else []
+                merged[name] = current + value
+            elif name not in list_fields and not is_confident(merged[name]):
+                if is_confident(value):
+                    merged[name] = value
+
+    def _extract_with_ai(
+        self, image_path: str, requested_fields: dict, model: Optional[str] = None
+    ) -> dict:
         """
         Use AI to extract the requested fields from the image.
+
+        The prompt and response schema come from the compiled field set
+        cache, so repeated field sets skip prompt building and the model is
+        constrained to the expected JSON shape.
         """
         try:
             with open(image_path, "rb") as f:
                 img_base64 = base64.b64encode(f.read()).decode("utf-8")
 
-            # Build dynamic prompt based on requested fields
-            fields_prompt = self._build_fields_prompt(requested_fields)
-
-            prompt = f"""
-            Extract ONLY the following specific fields from the invoice image. Return the data in JSON format:
-            
-            {fields_prompt}
-            
-            EXTRACTION GUIDELINES:
-            1. Extract text in both English and Arabic where available
-            2. For dates, use DD/MM/YYYY format
-            3. For amounts, include only numeric values without currency symbols
-            4. If a field is not visible or not applicable, use empty string ""
-            5. Look for information in headers, footers, and main content areas
-            6. Be precise and extract only what is requested
-            7. For line items, include all relevant entries from tables
-            
-            IMPORTANT: Only extract the requested fields. Do not add extra information.
-            Return the result as a valid JSON object.
-            """
+            compiled = compile_field_set(requested_fields)
+
+            config = {"response_mime_type": "application/json"}
+            if compiled.model is not None:
+                config["response_schema"] = compiled.model
 
             response = self.client.models.generate_content(
-                model="gemini-2.0-flash-exp",
+                model=model or self.model,
                 contents=[
-                    {"text": prompt},
+                    {"text": compiled.prompt},
                     {"inline_data": {"mime_type": "image/png", "data": img_base64}},
                 ],
-                config={
-                    "response_mime_type": "application/json",
-                },
+                config=config,
             )
+            record_gemini_usage(model or self.model, response)
 
             # Parse the response
-            import json
-
-            extracted_data = json.loads(response.text)
+            extracted_data = compiled.parse(response)
 
             return extracted_data
 
@@ -105,28 +206,6 @@ class CustomInvoiceExtractor:
             logging.error(f"AI extraction failed: {e}")
             return {field: "" for field in requested_fields.keys()}
 
-    def _build_fields_prompt(self, requested_fields: dict) -> str:
-        """
-        Build a dynamic prompt based on requested fields.
-        """
-        fields_json = {}
-        field_descriptions = []
-
-        for field_name, description in requested_fields.items():
-            fields_json[field_name] = ""
-            field_descriptions.append(f"- {field_name}: {description}")
-
-        json_structure = json.dumps(fields_json, indent=2)
-        descriptions_text = "\n".join(field_descriptions)
-
-        return f"""
-JSON Structure to return:
-{json_structure}
-
-Field Descriptions:
-{descriptions_text}
-        """
-
     def extract_predefined_fields(
         self, pdf_path: str, field_set: str = "basic"
     ) -> dict:
@@ -140,40 +219,9 @@ Field Descriptions:
         Returns:
             Dictionary with extracted fields
         """
-        predefined_fields = {
-            "basic": {
-                "partner": "Company or client name",
-                "invoice_bill_date": "Invoice date",
-                "reference": "Invoice number or reference",
-                "total_amount": "Total invoice amount",
-            },
-            "detailed": {
-                "partner": "Company or client name",
-                "vat_number": "VAT registration number",
-                "invoice_bill_date": "Invoice date",
-                "reference": "Invoice number or reference",
-                "street": "Address street",
-                "city": "City name",
-                "country": "Country name",
-                "email": "Email address",
-                "mobile": "Phone number",
-            },
-            "accounting": {
-                "partner": "Company or client name",
-                "vat_number": "VAT registration number",
-                "cr_number": "Commercial registration number",
-                "invoice_type": "Type of invoice",
-                "invoice_bill_date": "Invoice date",
-                "reference": "Invoice number or reference",
-                "invoice_lines": "All line items with product, quantity, price, taxes",
-                "total_amount": "Total invoice amount",
-                "tax_amount": "Total tax amount",
-            },
-        }
-
-        if field_set not in predefined_fields:
+        if field_set not in PREDEFINED_FIELD_SETS:
             raise ValueError(
-                f"Unknown field set: {field_set}. Available: {list(predefined_fields.keys())}"
+                f"Unknown field set: {field_set}. Available: {list(PREDEFINED_FIELD_SETS.keys())}"
             )
 
-        return self.extract_custom_fields(pdf_path, predefined_fields[field_set])
+        return self.extract_custom_fields(pdf_path, PREDEFINED_FIELD_SETS[field_set])
@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from src.core.field_schema import CompiledFieldSet, compile_field_set
+from src.models import extraction_models
+from src.models.extraction_models import InvoiceDataExtracted
+from src.utils.invoice_validator import InvoiceValidator
+
+# Fields that can be re-requested on their own, with a description that
+# spells out the format the validator expects
+REPAIR_FIELDS = {
+    "vat_number": "Seller VAT number: exactly 15 digits, no spaces",
+    "cr_number": "Seller C.R. number: exactly 10 letters or digits",
+    "invoice_bill_date": "Invoice issue date in YYYY-MM-DD format",
+    "invoice_lines": (
+        "All line items with product, quantity, unit_price, gross_price "
+        "and taxes, copied exactly as printed"
+    ),
+}
+
+# Vertical band of the page (fractions of its height) where each field is
+# usually printed. Header fields sit at the top, line items below them.
+FIELD_REGIONS = {
+    "vat_number": (0.0, 0.45),
+    "cr_number": (0.0, 0.45),
+    "invoice_bill_date": (0.0, 0.45),
+    "invoice_lines": (0.2, 1.0),
+}
+
+# Crops covering more of the page than this are not worth the extra image
+MAX_CROP_FRACTION = 0.9
+
+REPAIR_PROMPT_TEMPLATE = """
+            A previous extraction of this invoice returned values that
+            failed validation. Re-read the document and return ONLY the
+            following fields in JSON format:
+
+            {fields_prompt}
+
+            RULES:
+            1. Follow the format given in each field description exactly
+            2. Copy digits exactly as printed; never guess or pad digits
+            3. If a field is not visible, use empty string ""
+
+            Return the result as a valid JSON object.
+            """
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
+
+
+def repair_enabled() -> bool:
+    return os.getenv("FIELD_REPAIR", "").lower() in ("1", "true", "yes")
+
+
+class RepairStats:
+    """Thread-safe counters for field repairs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.fields_requested = 0
+        self.fields_repaired = 0
+
+    def record(self, requested: int, repaired: int):
+        with self._lock:
+            self.pages += 1
+            self.fields_requested += requested
+            self.fields_repaired += repaired
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "fields_requested": self.fields_requested,
+                "fields_repaired": self.fields_repaired,
+                "repair_rate": (
+                    round(self.fields_repaired / self.fields_requested, 4)
+                    if self.fields_requested
+                    else 0.0
+                ),
+            }
+
+
+repair_stats = RepairStats()
+
+
+class FieldRepairer:
+    """
+    Re-request only the fields of an extraction that fail validation.
+
+    Instead of re-running the whole page with the full prompt, the failing
+    fields are asked for in a small follow-up request, optionally on a crop
+    of the page region where they are usually printed. A correction is only
+    merged when it passes validation, so a repair never makes a page worse.
+
+    Configuration (environment):
+        FIELD_REPAIR        set to 1 to enable repairs (off by default)
+        FIELD_REPAIR_CROP   set to 0 to always send the full page
+        FIELD_REPAIR_MODEL  model for repair requests (Gemini only), defaults
+                            to the extractor's model
+    """
+
+    def __init__(self, crop: Optional[bool] = None):
+        self.crop = _env_flag("FIELD_REPAIR_CROP") if crop is None else crop
+        self.model = os.getenv("FIELD_REPAIR_MODEL") or None
+        self.stats = repair_stats
+
+    @staticmethod
+    def fields_to_repair(failed: List[str]) -> List[str]:
+        """Map validator failures (``invoice_lines[3]``) to field names."""
+        fields = []
+        for name in failed:
+            name = name.split("[", 1)[0]
+            if name in REPAIR_FIELDS and name not in fields:
+                fields.append(name)
+        return fields
+
+    def repair(
+        self,
+        image_path: str,
+        data: InvoiceDataExtracted,
+        query: Callable[[str, CompiledFieldSet], Optional[dict]],
+    ) -> InvoiceDataExtracted:
+        """
+        Args:
+            image_path: Page image the data was extracted from
+            data: Extracted page data, corrected in place
+            query: Runs the compiled field set against an image path and
+                returns the extracted fields (None on error)
+
+        Returns:
+            The (possibly corrected) page data
+        """
+        failed = InvoiceValidator.invalid_fields(data)
+        fields = self.fields_to_repair(failed)
+        if not fields:
+            return data
+
+        logging.info(f"Repairing fields: {', '.join(failed)}")
+        compiled = compile_field_set(
+            {name: REPAIR_FIELDS[name] for name in fields},
+            REPAIR_PROMPT_TEMPLATE,
+        )
+
+        region_path = None
+        if self.crop:
+            region_path = self.crop_region(image_path, fields)
+        try:
+            corrections = query(region_path or image_path, compiled)
+        finally:
+            if region_path:
+                try:
+                    os.remove(region_path)
+                except OSError:
+                    pass
+
+        repaired = self._merge(data, corrections or {}, fields)
+        self.stats.record(len(fields), repaired)
+        return data
+
+    @staticmethod
+    def crop_region(image_path: str, fields: List[str]) -> Optional[str]:
+        """
+        Crop the page to the band covering the given fields.
+
+        Returns:
+            Path of the cropped image, or None when the crop would cover
+            (almost) the whole page or the image cannot be read
+        """
+        import cv2
+
+        top = min(FIELD_REGIONS[name][0] for name in fields)
+        bottom = max(FIELD_REGIONS[name][1] for name in fields)
+        if bottom - top >= MAX_CROP_FRACTION:
+            return None
+
+        img = cv2.imread(image_path)
+        if img is None:
+            return None
+        height = img.shape[0]
+        first, last = int(top * height), int(bottom * height)
+        region = img[first:last]
+
+        root, _ = os.path.splitext(image_path)
+        output_path = f"{root}_repair.png"
+        cv2.imwrite(output_path, region)
+        return output_path
+
+    @staticmethod
+    def _merge(
+        data: InvoiceDataExtracted,
+        corrections: dict,
+        fields: List[str],
+    ) -> int:
+        """Apply the corrections that pass validation; return their count."""
+        repaired = 0
+        for name in fields:
+            value = corrections.get(name)
+            if name == "invoice_lines":
+                lines = FieldRepairer._parse_lines(value)
+                before = len(InvoiceValidator.invalid_fields(data))
+                after = data.copy(update={"invoice_lines": lines})
+                still_invalid = len(InvoiceValidator.invalid_fields(after))
+                if lines and still_invalid < before:
+                    data.invoice_lines = lines
+                    repaired += 1
+            elif isinstance(value, str) and value.strip():
+                value = value.strip()
+                if not InvoiceValidator.invalid_fields({name: value}):
+                    setattr(data, name, value)
+                    repaired += 1
+        return repaired
+
+    @staticmethod
+    def _parse_lines(value) -> List[extraction_models.InvoiceLineExtracted]:
+        if not isinstance(value, list):
+            return []
+        try:
+            return [
+                (
+                    line
+                    if isinstance(line, extraction_models.InvoiceLineExtracted)
+                    else extraction_models.InvoiceLineExtracted(**line)
+                )
+                for line in value
+            ]
+        except Exception as e:
+            logging.error(f"Invalid repaired invoice lines: {e}")
+            return []
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, create_model
+
+from src.models.extraction_models import InvoiceLineExtracted
+
+# Fields whose values are lists and are concatenated across pages
+LIST_FIELDS = {"invoice_lines"}
+
+PREDEFINED_FIELD_SETS = {
+    "basic": {
+        "partner": "Company or client name",
+        "invoice_bill_date": "Invoice date",
+        "reference": "Invoice number or reference",
+        "total_amount": "Total invoice amount",
+    },
+    "detailed": {
+        "partner": "Company or client name",
+        "vat_number": "VAT registration number",
+        "invoice_bill_date": "Invoice date",
+        "reference": "Invoice number or reference",
+        "street": "Address street",
+        "city": "City name",
+        "country": "Country name",
+        "email": "Email address",
+        "mobile": "Phone number",
+    },
+    "accounting": {
+        "partner": "Company or client name",
+        "vat_number": "VAT registration number",
+        "cr_number": "Commercial registration number",
+        "invoice_type": "Type of invoice",
+        "invoice_bill_date": "Invoice date",
+        "reference": "Invoice number or reference",
+        "invoice_lines": "All line items with product, quantity, price, taxes",
+        "total_amount": "Total invoice amount",
+        "tax_amount": "Total tax amount",
+    },
+}
+
+PROMPT_TEMPLATE = """
+            Extract ONLY the following specific fields from the invoice image. Return the data in JSON format:
+
+            {fields_prompt}
+
+            EXTRACTION GUIDELINES:
+            1. Extract text in both English and Arabic where available
+            2. For dates, use DD/MM/YYYY format
+            3. For amounts, include only numeric values without currency symbols
+            4. If a field is not visible or not applicable, use empty string ""
+            5. Look for information in headers, footers, and main content areas
+            6. Be precise and extract only what is requested
+            7. For line items, include all relevant entries from tables
+
+            IMPORTANT: Only extract the requested fields. Do not add extra information.
+            Return the result as a valid JSON object.
+            """
+
+MAX_CACHED_FIELD_SETS = 256
+
+
+class CompiledFieldSet:
+    """
+    Everything needed to request one set of custom fields from the model.
+
+    Attributes:
+        key: Stable hash of the field set (names and descriptions)
+        fields: The requested field_name: description mapping
+        prompt: The complete extraction prompt
+        model: Generated pydantic model used as the structured-output schema,
+            or None when a field name cannot be a model attribute
+        list_fields: Names of the fields that hold lists
+    """
+
+    def __init__(
+        self,
+        key: str,
+        fields: Dict[str, str],
+        prompt: str,
+        model: Optional[Type[BaseModel]],
+        list_fields: set,
+    ):
+        self.key = key
+        self.fields = fields
+        self.prompt = prompt
+        self.model = model
+        self.list_fields = list_fields
+
+    def parse(self, response) -> dict:
+        """Read the extracted fields from a generate_content response."""
+        parsed = getattr(response, "parsed", None) if self.model else None
+        if isinstance(parsed, BaseModel):
+            return parsed.dict()
+        return json.loads(response.text)
+
+
+def field_set_key(requested_fields: Dict[str, str]) -> str:
+    """Stable hash of a field set, independent of key order."""
+    canonical = json.dumps(requested_fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def build_fields_prompt(requested_fields: Dict[str, str]) -> str:
+    """
+    Build the JSON structure and field description part of the prompt.
+    """
+    fields_json = {}
+    field_descriptions = []
+
+    for field_name, description in requested_fields.items():
+        fields_json[field_name] = [] if field_name in LIST_FIELDS else ""
+        field_descriptions.append(f"- {field_name}: {description}")
+
+    json_structure = json.dumps(fields_json, indent=2)
+    descriptions_text = "\n".join(field_descriptions)
+
+    return f"""
+JSON Structure to return:
+{json_structure}
+
+Field Descriptions:
+{descriptions_text}
+        """
+
+
+def _build_model(
+    key: str, requested_fields: Dict[str, str]
+) -> Optional[Type[BaseModel]]:
+    """Generate a pydantic model for the field set, if the names allow it."""
+    definitions = {}
+    for name in requested_fields:
+        if not name.isidentifier() or name.startswith("_") or hasattr(BaseModel, name):
+            return None
+        if name in LIST_FIELDS:
+            definitions[name] = (List[InvoiceLineExtracted], [])
+        else:
+            definitions[name] = (str, "")
+    return create_model(f"CustomFields_{key}", **definitions)
+
+
+_compiled: "OrderedDict[Tuple[str, str], CompiledFieldSet]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_field_set(
+    requested_fields: Dict[str, str], template: str = PROMPT_TEMPLATE
+) -> CompiledFieldSet:
+    """
+    Return the compiled prompt and schema for a field set.
+
+    Results are cached by ``field_set_key`` and prompt template, so repeated
+    requests for the same fields reuse the prompt text and the generated
+    model.
+
+    Args:
+        requested_fields: Dictionary of field_name: description
+        template: Prompt template with a ``{fields_prompt}`` placeholder
+    """
+    key = field_set_key(requested_fields)
+    cache_key = (key, template)
+    with _lock:
+        compiled = _compiled.get(cache_key)
+        if compiled is not None:
+            _compiled.move_to_end(cache_key)
+            return compiled
+
+    compiled = CompiledFieldSet(
+        key=key,
+        fields=dict(requested_fields),
+        prompt=template.format(fields_prompt=build_fields_prompt(requested_fields)),
+        model=_build_model(key, requested_fields),
+        list_fields={name for name in requested_fields if name in LIST_FIELDS},
+    )
+
+    with _lock:
+        _compiled[cache_key] = compiled
+        while len(_compiled) > MAX_CACHED_FIELD_SETS:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def precompile_field_sets(field_sets: Iterable[Dict[str, str]]) -> List[str]:
+    """
+    Compile field sets ahead of time (e.g. at startup).
+
+    The list-fields-only subset of each set is compiled as well, since that
+    is what later pages are asked for once every scalar field is filled.
+
+    Returns:
+        Keys of the compiled field sets
+    """
+    keys = []
+    for fields in field_sets:
+        keys.append(compile_field_set(fields).key)
+        list_only = {name: d for name, d in fields.items() if name in LIST_FIELDS}
+        if list_only and len(list_only) < len(fields):
+            keys.append(compile_field_set(list_only).key)
+    return keys
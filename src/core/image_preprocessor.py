@@ -1,11 +1,10 @@
 import logging
-import os
-
-import cv2
 
 
 class ImagePreprocessor:
     def preprocess(self, image_path: str) -> str:
+        import cv2
+
         try:
             img = cv2.imread(image_path)
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -1,26 +1,18 @@
 import base64
 import logging
 import os
-
-from dotenv import load_dotenv
-from google import genai
+from typing import TYPE_CHECKING, Iterator, Optional
 
 from src.models.extraction_models import InvoiceDataExtracted
+from src.utils.env import load_env
+from src.utils.usage import record_gemini_usage
 
-load_dotenv(dotenv_path=".env")
-print("API Key:", os.getenv("GEMINI_API_KEY"))
-
-
-class InvoiceExtractorGEMINI:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+if TYPE_CHECKING:
+    from src.core.field_schema import CompiledFieldSet
 
-    def extract(self, image_path: str) -> InvoiceDataExtracted:
-        try:
-            with open(image_path, "rb") as f:
-                img_base64 = base64.b64encode(f.read()).decode("utf-8")
 
-            prompt = """You are a specialized invoice data extraction engine. Your mission is to meticulously analyze the provided document image and extract information exclusively about the Biller/Seller. The Biller is the entity that issued the document (e.g., the store, the bank, the utility company).
+# Instructions sent with every page image
+EXTRACTION_PROMPT = """You are a specialized invoice data extraction engine. Your mission is to meticulously analyze the provided document image and extract information exclusively about the Biller/Seller. The Biller is the entity that issued the document (e.g., the store, the bank, the utility company).
 
 You must return a single, valid JSON object. Adhere strictly to the schema and rules below. Do not include any introductory text, explanations, or markdown code fences (```json).
 
@@ -140,19 +132,102 @@ Tax Formatting Rule: For the taxes field inside each line item, the value MUST b
 Data Exclusion: Do not extract or include any information related to product warranties, return policies, website addresses (unless it's an email), or general promotional text. Focus exclusively on the data points defined in the schema.
 
             """
+
+
+class InvoiceExtractorGEMINI:
+    def __init__(self):
+        from google import genai
+
+        from src.utils.http_pool import genai_http_options
+
+        load_env()
+        self.client = genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"), http_options=genai_http_options()
+        )
+        self.model = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+
+    def _request(self, image_path: str) -> dict:
+        with open(image_path, "rb") as f:
+            img_base64 = base64.b64encode(f.read()).decode("utf-8")
+        return {
+            "contents": [
+                {"text": EXTRACTION_PROMPT},
+                {"inline_data": {"mime_type": "image/png", "data": img_base64}},
+            ],
+            "config": {
+                "response_mime_type": "application/json",
+                "response_schema": InvoiceDataExtracted,
+            },
+        }
+
+    def extract(
+        self, image_path: str, model: Optional[str] = None
+    ) -> InvoiceDataExtracted:
+        try:
             response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=[
-                    {"text": prompt},
-                    {"inline_data": {"mime_type": "image/png", "data": img_base64}},
-                ],
-                config={
-                    "response_mime_type": "application/json",
-                    "response_schema": InvoiceDataExtracted,
-                },
+                model=model or self.model, **self._request(image_path)
             )
+            record_gemini_usage(model or self.model, response)
 
             return response.parsed
         except Exception as e:
             logging.error(f"Extraction failed: {e}")
             return None
+
+    def extract_stream(
+        self, image_path: str, model: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Stream the JSON text of an extraction as the model generates it.
+
+        Yields:
+            Text chunks; together they form the same JSON object extract()
+            parses. Errors are raised, not logged.
+        """
+        model = model or self.model
+        last = None
+        for chunk in self.client.models.generate_content_stream(
+            model=model, **self._request(image_path)
+        ):
+            if chunk.usage_metadata is not None:
+                last = chunk  # usage is cumulative; the last chunk has the total
+            if chunk.text:
+                yield chunk.text
+        if last is not None:
+            record_gemini_usage(model, last)
+
+    def extract_fields(
+        self, image_path: str, compiled: "CompiledFieldSet", model: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        Extract only the fields of a compiled field set from the image.
+
+        Args:
+            image_path: Path to the page image (or a crop of it)
+            compiled: Prompt and response schema from compile_field_set
+            model: Overrides the configured model for this call
+
+        Returns:
+            Dictionary of the requested fields, None on error
+        """
+        try:
+            with open(image_path, "rb") as f:
+                img_base64 = base64.b64encode(f.read()).decode("utf-8")
+
+            config = {"response_mime_type": "application/json"}
+            if compiled.model is not None:
+                config["response_schema"] = compiled.model
+
+            response = self.client.models.generate_content(
+                model=model or self.model,
+                contents=[
+                    {"text": compiled.prompt},
+                    {"inline_data": {"mime_type": "image/png", "data": img_base64}},
+                ],
+                config=config,
+            )
+            record_gemini_usage(model or self.model, response)
+            return compiled.parse(response)
+        except Exception as e:
+            logging.error(f"Field extraction failed: {e}")
+            return None
@@ -1,33 +1,18 @@
 import base64
 import logging
 import os
-
-import openai
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Iterator, Optional
 
 from src.models.extraction_models import InvoiceDataExtracted
+from src.utils.env import load_env
+from src.utils.usage import record_openai_usage
 
-load_dotenv(dotenv_path=".env")
-print("API Key:", os.getenv("OPENAI_API_KEY"))
+if TYPE_CHECKING:
+    from src.core.field_schema import CompiledFieldSet
 
 
-class InvoiceExtractorOPENAI:
-    def __init__(self):
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        self.model = (
-            "gpt-5-mini-2025-08-07"  # or "gpt-4-vision-preview" if you have access
-        )
-
-    def extract(self, image_path: str) -> InvoiceDataExtracted:
-        try:
-            with open(image_path, "rb") as f:
-                img_base64 = base64.b64encode(f.read()).decode("utf-8")
-            # Construct the image data for OpenAI API according to requirements
-            image_data = {
-                "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{img_base64}"},
-            }
-            prompt = """
+# Instructions sent with every page image
+EXTRACTION_PROMPT = """
 You are a specialized, AI-powered data extraction engine. Your mission is to meticulously analyze the provided document image and extract information exclusively about the Biller/Seller. The Biller is the entity that issued the document (e.g., the store, the bank, the utility company).
 
 You must return a  valid JSON object. Adhere strictly to the schema and rules below. Do not include any introductory text, explanations, or markdown code fences (```json).
@@ -146,19 +131,45 @@ STRICT TAX FORMATTING: For the taxes field inside each line item, the value MUST
 DATA EXCLUSION: Do not extract or include information related to warranties, return policies, websites, or promotional text. Focus exclusively on the defined data points.Also do not extract any information that is not related to the defined data points like E-Vouchers,Complementry etc.
             """
 
-            messages = [
-                {"role": "system", "content": prompt},
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": prompt}, image_data],
-                },
-            ]
 
-            response = openai.chat.completions.create(
+class InvoiceExtractorOPENAI:
+    def __init__(self):
+        import openai
+
+        from src.utils.http_pool import openai_http_client
+
+        load_env()
+        self.client = openai.OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"), http_client=openai_http_client()
+        )
+        self.model = (
+            "gpt-5-mini-2025-08-07"  # or "gpt-4-vision-preview" if you have access
+        )
+
+    def _messages(self, image_path: str) -> list:
+        with open(image_path, "rb") as f:
+            img_base64 = base64.b64encode(f.read()).decode("utf-8")
+        # Construct the image data for OpenAI API according to requirements
+        image_data = {
+            "type": "image_url",
+            "image_url": {"url": f"data:image/png;base64,{img_base64}"},
+        }
+        return [
+            {"role": "system", "content": EXTRACTION_PROMPT},
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": EXTRACTION_PROMPT}, image_data],
+            },
+        ]
+
+    def extract(self, image_path: str) -> InvoiceDataExtracted:
+        try:
+            response = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                messages=self._messages(image_path),
                 response_format={"type": "json_object"},
             )
+            record_openai_usage(self.model, response)
             import json
 
             return InvoiceDataExtracted(
@@ -167,3 +178,63 @@ DATA EXCLUSION: Do not extract or include information related to warranties, ret
         except Exception as e:
             logging.error(f"Extraction failed: {e}")
             return None
+
+    def extract_stream(self, image_path: str) -> Iterator[str]:
+        """
+        Stream the JSON text of an extraction as the model generates it.
+
+        Yields:
+            Text chunks; together they form the same JSON object extract()
+            parses. Errors are raised, not logged.
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(image_path),
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            if chunk.usage is not None:
+                record_openai_usage(self.model, chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def extract_fields(
+        self, image_path: str, compiled: "CompiledFieldSet"
+    ) -> Optional[dict]:
+        """
+        Extract only the fields of a compiled field set from the image.
+
+        Returns:
+            Dictionary of the requested fields, None on error
+        """
+        import json
+
+        try:
+            with open(image_path, "rb") as f:
+                img_base64 = base64.b64encode(f.read()).decode("utf-8")
+
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": compiled.prompt},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/png;base64,{img_base64}"
+                                },
+                            },
+                        ],
+                    }
+                ],
+                response_format={"type": "json_object"},
+            )
+            record_openai_usage(self.model, response)
+            return json.loads(response.choices[0].message.content)
+        except Exception as e:
+            logging.error(f"Field extraction failed: {e}")
+            return None
@@ -1,96 +1,942 @@
+import itertools
 import logging
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Callable, Dict, Generator, Iterator, List, Optional, Tuple
 
-from dotenv import load_dotenv
-
-from pdf_converter import PDFConverter
+from src.core import pdf_converter
+from src.core.batch_dedup import find_duplicates
+from src.core.batch_postprocessor import BatchPostProcessor
+from src.core.field_repair import FieldRepairer, repair_enabled
 from src.core.image_preprocessor import ImagePreprocessor
-from src.core.invoice_extractorgemini import InvoiceExtractorGEMINI
-from src.core.invoice_extractoropenai import InvoiceExtractorOPENAI
-from src.core.invoice_postprocessor import InvoicePostProcessor
-from src.models.models import InvoiceData, MultipleInvoicesResponse
+from src.core.layout_analyzer import LAYOUT_MODES, LayoutAnalyzer
+from src.core.model_cascade import ModelCascade, cascade_enabled
+from src.core.page_classifier import PageClassifier
+from src.core.page_scheduler import PageScheduler
+from src.core.pdf_converter import PixelBudgetExceeded, RenderedDocument
+from src.models import models
+from src.models.extraction_models import InvoiceDataExtracted
+from src.models.models import InvoiceData, ProcessingInfo, SkippedPage
+from src.utils.env import load_env
+from src.utils.incremental_json import IncrementalJSONParser
+from src.utils.invoice_validator import InvoiceValidator
+from src.utils.memory import current_rss_mb
+from src.utils.shared_cache import SharedCache, file_digest
+from src.utils.task_queue import TaskQueue
+from src.utils.usage import current_scope
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
-load_dotenv()  # Load environment variables from .env file
 
+class DocumentJob:
+    """A PDF on its way through the pipeline: its pages, or a cached result."""
 
-print("SERVICE:", os.getenv("SERVICE"))
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.cache_key: Optional[str] = None
+        self.cached: Optional[InvoiceData] = None
+        self.document: Optional[RenderedDocument] = None
+        self.pages: Iterator[str] = iter(())  # the image paths to extract
+        self.processing: Optional[ProcessingInfo] = None
+        # Set when the pages are extracted by cluster workers instead
+        self.remote: Optional[str] = None  # job id in the task queue
+        self.pdf_path: Optional[str] = None
+        self.options: Dict = {}
+
+    def observe_memory(self, rss: Optional[float] = None):
+        """Record the current (or given) RSS if it is the highest seen so far."""
+        rss = rss if rss is not None else current_rss_mb()
+        if rss is not None and rss > (self.processing.peak_rss_mb or 0):
+            self.processing.peak_rss_mb = rss
+
+    def page_failed(self, img: str, error: str):
+        """Record that the page rendered to img is left out of the result."""
+        self.processing.failed_pages.append(
+            models.FailedPage(page=RenderedDocument.page_number(img), error=error)
+        )
 
 
 class InvoicePipeline:
-    def __init__(self, output_folder: str = "temp_images"):
-        self.pdf_converter = PDFConverter(output_folder)
+    def __init__(
+        self, output_folder: str = "temp_images", cache: Optional[SharedCache] = None
+    ):
+        load_env()
+        self.cache = cache
+        self.pdf_converter = pdf_converter.PDFConverter(output_folder, cache=cache)
         self.preprocessor = ImagePreprocessor()
-        self.extractor_openai = InvoiceExtractorOPENAI()
-        self.extractor_gemini = InvoiceExtractorGEMINI()
+        self._extractor_openai = None
+        self._extractor_gemini = None
         self.output_folder = output_folder
         self.service = os.getenv("SERVICE")
+        # The fast-then-strong cascade only applies to the Gemini extractor
+        self.cascade = (
+            ModelCascade("extract")
+            if cascade_enabled() and self.service != "openai"
+            else None
+        )
+        self.repairer = FieldRepairer() if repair_enabled() else None
+        # Optional cropping of pages to their content: "margins" or "composite"
+        self.layout_mode = os.getenv("LAYOUT_CROP", "none").lower()
+        if self.layout_mode not in LAYOUT_MODES:
+            logging.warning(f"Unknown LAYOUT_CROP {self.layout_mode!r}, ignoring it")
+            self.layout_mode = "none"
+        self.layout = LayoutAnalyzer() if self.layout_mode != "none" else None
+        # Skip blank/boilerplate pages; optionally stop after the totals page
+        self.page_classifier = (
+            PageClassifier() if _env_flag("PAGE_FILTER", "1") else None
+        )
+        self.stop_after_totals = _env_flag("STOP_AFTER_TOTALS", "0")
+        # Process documents uploaded more than once in a batch only once
+        self.dedup = _env_flag("BATCH_DEDUP", "1")
+        self.dedup_perceptual = _env_flag("BATCH_DEDUP_PERCEPTUAL", "0")
+        # Pages of a batch run interleaved on this pool
+        self.scheduler = PageScheduler(
+            max_workers=int(os.getenv("PAGE_WORKERS", "4")),
+            policy=os.getenv("PAGE_SCHEDULING", "shortest"),
+        )
+        # As a coordinator, pages are queued for cluster workers to render
+        # and extract (see TaskQueue and cluster_worker)
+        self.cluster = None
+        if os.getenv("CLUSTER_MODE", "").lower() == "coordinator":
+            if not os.getenv("CLUSTER_TOKEN"):
+                # The /cluster/* endpoints hand out documents and results
+                raise ValueError("CLUSTER_TOKEN is required for a coordinator")
+            self.cluster = TaskQueue()
+        self.cluster_timeout = float(os.getenv("CLUSTER_JOB_TIMEOUT", "1800"))
+
+    @property
+    def extractor_openai(self):
+        # Provider SDKs are heavy to import, so clients are built on first use
+        if self._extractor_openai is None:
+            from src.core.invoice_extractoropenai import InvoiceExtractorOPENAI
+
+            self._extractor_openai = InvoiceExtractorOPENAI()
+        return self._extractor_openai
+
+    @property
+    def extractor_gemini(self):
+        if self._extractor_gemini is None:
+            from src.core.invoice_extractorgemini import InvoiceExtractorGEMINI
+
+            self._extractor_gemini = InvoiceExtractorGEMINI()
+        return self._extractor_gemini
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Import the rendering/vision modules and build the configured client.
+
+        Returns:
+            Seconds spent warming each component
+        """
+        timings = {}
+
+        start = time.perf_counter()
+        import cv2  # noqa: F401
+        import pdf2image  # noqa: F401
+
+        timings["imaging"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        if self.service == "openai":
+            self.extractor_openai
+        else:
+            self.extractor_gemini
+        timings[self.service or "gemini"] = round(time.perf_counter() - start, 3)
+
+        return timings
+
+    def _page_image(self, img: str, preprocess: bool) -> str:
+        """The page image as sent to the model: preprocessed and cropped."""
+        if preprocess:
+            img = self.preprocessor.preprocess(img)
+        if self.layout:
+            img = self.layout.apply(img, self.layout_mode)
+        return img
+
+    def _extract_page(self, img: str, preprocess=True):
+        """
+        Preprocess one page image and run the configured extractor on it.
+        Fields that still fail validation are re-requested on their own.
+        """
+        img = self._page_image(img, preprocess)
+        if self.service == "openai":
+            data = self.extractor_openai.extract(img)
+        elif self.cascade:
+            data = self.cascade.run(
+                lambda model: self.extractor_gemini.extract(img, model=model),
+                InvoiceValidator.invalid_fields,
+            )
+        else:
+            data = self.extractor_gemini.extract(img)
+
+        if data and self.repairer:
+            data = self.repairer.repair(img, data, self._query_fields)
+        return data
+
+    def extract_task_page(self, img: str, options: Dict) -> Dict:
+        """
+        Classify and extract a page rendered by a cluster worker.
+
+        Args:
+            img: Path to the rendered page image
+            options: The task's options, as queued by the coordinator
+
+        Returns:
+            The task outcome: {"data": the extracted page} or
+            {"skipped": reason}. Failures raise.
+        """
+        if options.get("classify") and self.page_classifier:
+            verdict = self.page_classifier.classify(img)
+            if verdict.skip:
+                return {"skipped": verdict.kind}
+        data = self._extract_page(img, options.get("preprocess", True))
+        if not data:
+            raise ValueError("No data extracted")
+        return {"data": data.dict()}
+
+    def _query_fields(self, img: str, compiled) -> Optional[dict]:
+        """Request only the fields of a compiled field set from the extractor."""
+        if self.service == "openai":
+            return self.extractor_openai.extract_fields(img, compiled)
+        return self.extractor_gemini.extract_fields(
+            img, compiled, model=self.repairer.model
+        )
+
+    def _iter_selected(
+        self, pages: Iterator[str], processing: ProcessingInfo, page_count: int
+    ) -> Iterator[str]:
+        """
+        Classify the pages as they come and drop blank and boilerplate ones,
+        and with STOP_AFTER_TOTALS the pages after the one holding the totals
+        block (those are never rendered).
+
+        Yields:
+            Image paths of the pages to extract. If every page would be
+            skipped, all pages are kept so a document is never dropped on the
+            classifier's word alone.
+        """
+        if not self.page_classifier:
+            yield from pages
+            return
+
+        held = []  # skipped pages, kept until some page is selected
+        selected_any = False
+        for i, img in enumerate(pages):
+            verdict = self.page_classifier.classify(img, self.stop_after_totals)
+            if verdict.skip:
+                processing.skipped_pages.append(
+                    SkippedPage(page=i + 1, reason=verdict.kind)
+                )
+                if selected_any:
+                    self.pdf_converter.release_page(img)
+                else:
+                    held.append(img)
+                continue
+
+            if not selected_any:
+                selected_any = True
+                for skipped in held:
+                    self.pdf_converter.release_page(skipped)
+                held = []
+            yield img
+
+            if verdict.has_totals:
+                for later in range(i + 2, page_count + 1):
+                    processing.skipped_pages.append(
+                        SkippedPage(page=later, reason="after_totals")
+                    )
+                return
+
+        if not selected_any:
+            processing.skipped_pages.clear()
+            yield from held
+
+    @staticmethod
+    def _combine_pages(extracted_pages: List, filename: str) -> Optional[InvoiceData]:
+        """Post-process extracted pages and merge them into one invoice."""
+        combined_data = None
+
+        # Post-process all pages in one pass to add VAT calculations
+        for data in BatchPostProcessor.add_vat_calculations(extracted_pages):
+            if data:
+                if not combined_data:
+                    combined_data = data  # Initialize with the first page data
+                    combined_data.filename = filename
+                else:
+                    # Combine subsequent page data (merge invoice lines)
+                    combined_data.invoice_lines.extend(data.invoice_lines)
+
+        return combined_data
+
+    def _result_cache_key(self, pdf_path: str, preprocess: bool) -> Optional[str]:
+        """
+        Results cache key: the PDF's digest and every setting that changes
+        what is extracted from it, so a result is never served to a worker
+        configured differently.
+        """
+        if not self.cache:
+            return None
+        settings = (
+            self.service or "gemini",
+            int(preprocess),
+            self.layout_mode,
+            int(self.cascade is not None),
+            int(self.repairer is not None),
+            int(self.page_classifier is not None),
+            int(self.stop_after_totals),
+            self._planned_dpi(pdf_path),
+        )
+        return ":".join([file_digest(pdf_path)] + [str(s) for s in settings])
+
+    def _planned_dpi(self, pdf_path: str) -> int:
+        """The resolution the PDF will be rendered at (see plan_dpi)."""
+        converter = self.pdf_converter
+        if not converter.pixel_budget:
+            return converter.dpi
+        try:
+            return converter.plan_dpi(*converter.page_info(pdf_path))
+        except PixelBudgetExceeded:
+            raise
+        except Exception:
+            return converter.dpi  # opening the PDF reports the error
+
+    def _prepare(
+        self,
+        pdf_path: str,
+        preprocess: bool,
+        distribute: bool = True,
+    ) -> DocumentJob:
+        """
+        Look the PDF up in the results cache, or open it for rendering and
+        select its pages. job.pages is a generator that renders the pages a
+        window at a time as they are consumed. As a cluster coordinator, the
+        pages are queued for the workers instead (job.remote).
+
+        Args:
+            distribute: Queue the pages for cluster workers, if configured
+        """
+        job = DocumentJob(os.path.basename(pdf_path))
+
+        job.cache_key = self._result_cache_key(pdf_path, preprocess)
+        if job.cache_key:
+            cached = self.cache.get("results", job.cache_key)
+            if cached:
+                job.cached = InvoiceData.parse_raw(cached)
+                job.cached.filename = job.filename
+                return job
+
+        if self.cluster and distribute:
+            return self._submit_remote(job, pdf_path, preprocess)
+
+        try:
+            job.document = self.pdf_converter.open(pdf_path)
+        except PixelBudgetExceeded:
+            raise
+        except Exception as e:
+            raise ValueError(f"PDF conversion failed: {e}")
+
+        job.processing = ProcessingInfo(
+            pages_total=job.document.page_count, render_dpi=job.document.dpi
+        )
+        job.pages = self._iter_selected(
+            self._rendered_pages(job.document),
+            job.processing,
+            job.document.page_count,
+        )
+        return job
+
+    def _submit_remote(
+        self, job: DocumentJob, pdf_path: str, preprocess: bool
+    ) -> DocumentJob:
+        """Queue one task per page of the PDF for the cluster workers."""
+        try:
+            page_count, page_size = self.pdf_converter.page_info(pdf_path)
+        except Exception as e:
+            raise ValueError(f"PDF conversion failed: {e}")
+        dpi = self.pdf_converter.plan_dpi(page_count, page_size)
+        job.processing = ProcessingInfo(pages_total=page_count, render_dpi=dpi)
+
+        # The coordinator bills the workers' model calls to the tenant of the
+        # request (see the /cluster/tasks/{id}/result endpoint)
+        scope = current_scope.get()
+        job.options = {
+            "dpi": dpi,
+            "preprocess": preprocess,
+            "classify": self.page_classifier is not None,
+            "tenant": scope.tenant if scope else None,
+            "endpoint": scope.endpoint if scope else None,
+        }
+        job.pdf_path = pdf_path
+        job.remote = self.cluster.submit(
+            pdf_path, range(1, page_count + 1), job.options
+        )
+        return job
+
+    def _remote_pages(self, job: DocumentJob) -> Iterator[Tuple[int, Dict]]:
+        """
+        Wait for the cluster workers to process the pages of a queued job.
+
+        Yields:
+            (page, outcome) as each page is done, in completion order. The
+            outcome's "data" is the extracted page, None if the page failed
+            ("error") or was skipped ("skipped"); "seconds" and "worker" say
+            how long it took and where. Failed and skipped pages are recorded
+            on job.processing. As with local extraction, if every page would
+            be skipped, all of them are extracted after all.
+        """
+        held = []  # skipped pages, reported once some page is kept
+        selected = False
+        try:
+            while True:
+                for outcome in self.cluster.results(job.remote, self.cluster_timeout):
+                    job.processing.pixels_rendered += outcome.get("pixels", 0)
+                    if outcome.get("skipped") and not selected:
+                        held.append(outcome)
+                        continue
+                    if not outcome.get("skipped") and not selected:
+                        selected = True
+                        for skipped in held:
+                            yield self._remote_outcome(job, skipped)
+                        held = []
+                    yield self._remote_outcome(job, outcome)
+
+                if selected or not held:
+                    return
+                self.cluster.finish(job.remote)
+                job.remote = self.cluster.submit(
+                    job.pdf_path,
+                    sorted(outcome["page"] for outcome in held),
+                    {**job.options, "classify": False},
+                )
+                held = []
+                selected = True
+        finally:
+            self.cluster.finish(job.remote)
+
+    @staticmethod
+    def _remote_outcome(job: DocumentJob, outcome: Dict) -> Tuple[int, Dict]:
+        page = outcome["page"]
+        if outcome["error"]:
+            job.processing.failed_pages.append(
+                models.FailedPage(page=page, error=outcome["error"])
+            )
+            outcome["data"] = None
+        elif outcome.get("skipped"):
+            job.processing.skipped_pages.append(
+                SkippedPage(page=page, reason=outcome["skipped"])
+            )
+            outcome["data"] = None
+        else:
+            outcome["data"] = InvoiceDataExtracted.parse_obj(outcome["data"])
+        return page, outcome
+
+    def _remote_extracted(self, job: DocumentJob) -> List:
+        """The extracted pages of a queued job, in page order, once all are done."""
+        pages = {
+            page: outcome["data"]
+            for page, outcome in self._remote_pages(job)
+            if not outcome.get("skipped")
+        }
+        return [pages[page] for page in sorted(pages)]
+
+    @staticmethod
+    def _rendered_pages(document: RenderedDocument) -> Iterator[str]:
+        try:
+            yield from document
+        except PixelBudgetExceeded:
+            raise
+        except Exception as e:
+            raise ValueError(f"PDF conversion failed: {e}")
+
+    def _finish(self, job: DocumentJob, extracted_pages: List) -> InvoiceData:
+        """Release the page images and combine the extracted pages."""
+        if job.document is not None:
+            job.document.close()
+
+        processing = job.processing
+        processing.pages_processed = len(extracted_pages)
+        processing.skipped_pages.sort(key=lambda skipped: skipped.page)
+        processing.pages_skipped = len(processing.skipped_pages)
+        processing.failed_pages.sort(key=lambda failed: failed.page)
+        processing.pages_failed = len(processing.failed_pages)
+        if job.document is not None:
+            processing.pixels_rendered = job.document.pixels
+            job.observe_memory(job.document.peak_rss_mb)
+
+        combined_data = self._combine_pages(
+            [page for page in extracted_pages if page], job.filename
+        )
+
+        if not combined_data:
+            raise ValueError("Failed to extract any data from the PDF.")
+        combined_data.processing = processing
+
+        # A partial result is not cached, so a retry can recover failed pages
+        if job.cache_key and not processing.failed_pages:
+            self.cache.set(
+                "results", job.cache_key, combined_data.json().encode("utf-8")
+            )
+
+        return combined_data
+
+    def _extract_page_safely(
+        self, img: str, preprocess: bool, job: Optional[DocumentJob] = None
+    ):
+        """
+        Extract a page, logging errors instead of raising them. A failed page
+        is recorded on job, if given, and returns None.
+        """
+        try:
+            data = self._extract_page(img, preprocess)
+            error = None if data else "No data extracted"
+        except Exception as e:
+            logging.error(f"Error processing image {img}: {str(e)}")
+            data, error = None, str(e)
+        finally:
+            # The page (and its preprocessed copies) is no longer needed
+            self.pdf_converter.release_page(img)
+        if error and job is not None:
+            job.page_failed(img, error)
+        return data
 
     def process(self, pdf_path: str, preprocess=True) -> Optional[InvoiceData]:
         """
         Process a PDF and extract invoice data from all pages.
         Returns a single InvoiceData object with combined data from all pages.
+        With a shared cache, a PDF already extracted by any worker is served
+        from the cache.
+
+        Pages are rendered a window at a time and deleted once extracted, so
+        memory use does not grow with the length of the PDF. The peak RSS
+        seen while processing is reported in ``processing.peak_rss_mb``.
         """
-        combined_data = None
-        filename = os.path.basename(pdf_path)
+        job = self._prepare(pdf_path, preprocess)
+        if job.cached:
+            return job.cached
+        if job.remote:
+            return self._finish(job, self._remote_extracted(job))
+
+        extracted_pages = []
+        try:
+            for img in job.pages:
+                extracted_pages.append(self._extract_page_safely(img, preprocess, job))
+                job.observe_memory()
+        except BaseException:
+            job.document.close()
+            raise
+        return self._finish(job, extracted_pages)
+
+    def _stream_page(
+        self, img: str, preprocess: bool
+    ) -> Generator[Tuple, None, Optional[InvoiceDataExtracted]]:
+        """
+        Extract one page with the provider's streaming API.
+
+        Yields the parser events (see IncrementalJSONParser) for the members
+        and invoice lines of the JSON as soon as each is complete, and
+        returns the extracted page.
+
+        The model cascade is not used here: it needs the complete result to
+        decide on escalation. Field repair runs once the page is complete.
+        """
+        img = self._page_image(img, preprocess)
+        if self.service == "openai":
+            chunks = self.extractor_openai.extract_stream(img)
+        else:
+            chunks = self.extractor_gemini.extract_stream(img)
+
+        parser = IncrementalJSONParser(item_keys=("invoice_lines",))
+        for chunk in chunks:
+            yield from parser.feed(chunk)
+        data = InvoiceDataExtracted.parse_raw(parser.document)
 
-        image_paths = self.pdf_converter.convert(pdf_path)
+        if self.repairer:
+            data = self.repairer.repair(img, data, self._query_fields)
+        return data
 
-        for img in image_paths:
+    @staticmethod
+    def _page_events(
+        stream: Generator, page: int, sent_fields: set, line_numbers: Iterator[int]
+    ) -> Generator[Dict, None, Optional[InvoiceDataExtracted]]:
+        """Turn the parser events of a streamed page into field and line events."""
+        while True:
             try:
-                if preprocess:
-                    img = self.preprocessor.preprocess(img)
-                if self.service == "openai":
-                    extracted_data = self.extractor_openai.extract(img)
-                else:
-                    extracted_data = self.extractor_gemini.extract(img)
-
-                if extracted_data:
-                    # Post-process to add VAT calculations
-                    data = InvoicePostProcessor.add_vat_calculations(extracted_data)
-
-                    if data:
-                        if not combined_data:
-                            combined_data = data  # Initialize with the first page data
-                            combined_data.filename = filename
-                        else:
-                            # Combine subsequent page data (merge invoice lines)
-                            combined_data.invoice_lines.extend(data.invoice_lines)
+                event = next(stream)
+            except StopIteration as finished:
+                return finished.value
+
+            if event[0] == "item":
+                yield {
+                    "type": "line",
+                    "index": next(line_numbers),
+                    "page": page,
+                    "data": event[3],
+                }
+            elif (
+                event[1] != "invoice_lines"
+                and event[1] not in sent_fields
+                and str(event[2] or "").strip()
+            ):
+                sent_fields.add(event[1])
+                yield {
+                    "type": "field",
+                    "name": event[1],
+                    "value": event[2],
+                    "page": page,
+                }
+
+    def process_stream(self, pdf_path: str, preprocess=True) -> Iterator[Dict]:
+        """
+        Process a PDF like process(), reporting the model's output while it
+        is generated. Pages are streamed one after another.
+
+        Yields:
+            {"type": "field", "name", "value", "page"} for each header field
+                the first time a page gives it a non-empty value
+            {"type": "line", "index", "page", "data"} for each invoice line
+                as extracted, before VAT is calculated
+            {"type": "page", "page", "status"} when a page is done
+                ("success" or "error")
+            {"type": "result", "data"} last: the combined invoice after VAT
+                post-processing. It is authoritative: field repair may have
+                corrected fields, and lines of a page that failed validation
+                are dropped.
+
+        Pages are always extracted here, not by cluster workers, since the
+        model's output is streamed from this process.
+        """
+        job = self._prepare(pdf_path, preprocess, distribute=False)
+        if job.cached:
+            yield {"type": "result", "data": job.cached}
+            return
+
+        extracted_pages = []
+        sent_fields = set()
+        line_numbers = itertools.count()
+        try:
+            for img in job.pages:
+                page = RenderedDocument.page_number(img)
+                data = None
+                try:
+                    data = yield from self._page_events(
+                        self._stream_page(img, preprocess),
+                        page,
+                        sent_fields,
+                        line_numbers,
+                    )
+                except Exception as e:
+                    logging.error(f"Error processing image {img}: {str(e)}")
+                    job.page_failed(img, str(e))
+                finally:
+                    self.pdf_converter.release_page(img)
+                extracted_pages.append(data)
+                job.observe_memory()
+                yield {
+                    "type": "page",
+                    "page": page,
+                    "status": "success" if data else "error",
+                }
+        except BaseException:
+            job.document.close()
+            raise
+        yield {"type": "result", "data": self._finish(job, extracted_pages)}
+
+    def process_progress(self, pdf_path: str, preprocess=True) -> Iterator[Dict]:
+        """
+        Process a PDF like process(), reporting on each page as it is done.
+
+        Yields:
+            {"type": "start", "pages_total"} once the PDF is open
+            {"type": "page", "page", "status", "seconds", "lines"} for each
+                page: status is "success", "error" (with the reason in
+                "error") or "skipped" (with the classifier's "reason")
+            {"type": "result", "data"} last: the invoice merged from the
+                pages that succeeded. Pages that failed are listed in
+                processing.failed_pages instead of failing the document.
+
+        Pages extracted by cluster workers are reported as they finish, in
+        any order, with the "worker" that extracted them.
+        """
+        job = self._prepare(pdf_path, preprocess)
+        if job.cached:
+            yield {"type": "result", "data": job.cached}
+            return
+        yield {"type": "start", "pages_total": job.processing.pages_total}
+        if job.remote:
+            yield from self._remote_progress(job)
+            return
+
+        skipped = job.processing.skipped_pages
+        reported_skips = 0
+
+        def skip_events() -> Iterator[Dict]:
+            nonlocal reported_skips
+            for page in skipped[reported_skips:]:
+                yield {
+                    "type": "page",
+                    "page": page.page,
+                    "status": "skipped",
+                    "reason": page.reason,
+                }
+            reported_skips = len(skipped)
+
+        extracted_pages = []
+        try:
+            for img in job.pages:
+                yield from skip_events()
+                start = time.perf_counter()
+                data = self._extract_page_safely(img, preprocess, job)
+                extracted_pages.append(data)
+                job.observe_memory()
+                event = {
+                    "type": "page",
+                    "page": RenderedDocument.page_number(img),
+                    "status": "success" if data else "error",
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "lines": len(data.invoice_lines) if data else 0,
+                }
+                if not data:
+                    event["error"] = job.processing.failed_pages[-1].error
+                yield event
+            yield from skip_events()
+        except BaseException:
+            job.document.close()
+            raise
+        yield {"type": "result", "data": self._finish(job, extracted_pages)}
+
+    def _remote_progress(self, job: DocumentJob) -> Iterator[Dict]:
+        """process_progress() for pages queued for cluster workers."""
+        pages = {}
+        for page, outcome in self._remote_pages(job):
+            event = {"type": "page", "page": page, "worker": outcome["worker"]}
+            data = outcome["data"]
+            if outcome.get("skipped"):
+                event.update(status="skipped", reason=outcome["skipped"])
+            else:
+                pages[page] = data
+                event.update(
+                    status="success" if data else "error",
+                    seconds=outcome.get("seconds"),
+                    lines=len(data.invoice_lines) if data else 0,
+                )
+                if not data:
+                    event["error"] = outcome["error"]
+            yield event
+        yield {
+            "type": "result",
+            "data": self._finish(job, [pages[page] for page in sorted(pages)]),
+        }
+
+    def _process_scheduled(
+        self,
+        documents: List[Tuple[int, str]],
+        preprocess: bool,
+        on_result: Optional[Callable[[int, Optional[InvoiceData]], None]] = None,
+    ) -> Dict[int, Optional[InvoiceData]]:
+        """
+        Extract several PDFs with their pages interleaved on one worker pool
+        (see PageScheduler), so short documents are not stuck behind long
+        ones. Smaller files are opened first. on_result, if given, is called
+        with each document's index and result as soon as it is done.
+
+        Pages are rendered as their tasks run, not when a document is
+        prepared: each of a document's page tasks takes the next selected
+        page from the document, so only the pages being extracted (and the
+        current render window) are held at once.
+
+        Returns:
+            Index -> extracted invoice (None on failure)
+        """
+        jobs: Dict[int, DocumentJob] = {}
+        locks: Dict[int, threading.Lock] = {}
+        broken: Dict[int, Exception] = {}  # documents whose rendering failed
+        results: Dict[int, Optional[InvoiceData]] = {}
+
+        def prepare(index: int, pdf_path: str) -> List[int]:
+            job = jobs[index] = self._prepare(pdf_path, preprocess)
+            locks[index] = threading.Lock()
+            if job.cached:
+                return []
+            # One task per page; tasks left over once pages are skipped
+            # find the document exhausted and return None
+            return [index] * job.document.page_count
+
+        def next_page(index: int) -> Optional[str]:
+            with locks[index]:
+                if index in broken:
+                    return None
+                try:
+                    return next(jobs[index].pages, None)
+                except Exception as e:
+                    broken[index] = e
+                    return None
+
+        def extract(index: int) -> Optional[Tuple[int, object]]:
+            job = jobs[index]
+            img = next_page(index)
+            if img is None:
+                return None
+            extracted = self._extract_page_safely(img, preprocess, job)
+            job.observe_memory()
+            return RenderedDocument.page_number(img), extracted
+
+        def finish(index: int, extracted_pages: List):
+            job = jobs.get(index)
+            results[index] = None
+            if job is None:
+                return  # preparation failed and was logged
+            if job.cached:
+                results[index] = job.cached
+                return
+            if index in broken:
+                job.document.close()
+                logging.error(f"Error processing {job.filename}: {broken[index]}")
+                return
+            try:
+                results[index] = self._finish(job, extracted_pages)
             except Exception as e:
-                logging.error(f"Error processing image {img}: {str(e)}")
+                logging.error(f"Error processing {job.filename}: {str(e)}")
 
-        if not combined_data:
-            raise ValueError("Failed to extract any data from the PDF.")
+        def on_done(index: int, extracted_pages: List):
+            finish(index, extracted_pages)
+            if on_result is not None:
+                try:
+                    on_result(index, results[index])
+                except Exception as e:
+                    logging.error(f"Result callback failed: {str(e)}")
 
-        return combined_data
+        documents = sorted(documents, key=lambda doc: _file_size(doc[1]))
+        if self.cluster:
+            # Queue every document before waiting on any, so workers can
+            # take pages from all of them
+            for index, pdf_path in documents:
+                try:
+                    prepare(index, pdf_path)
+                except Exception as e:
+                    logging.error(f"Failed to prepare document {index}: {e}")
+            for index, _ in documents:
+                job = jobs.get(index)
+                extracted = []
+                if job is not None and job.remote is not None:
+                    try:
+                        extracted = self._remote_extracted(job)
+                    except Exception as e:
+                        # Fail this document only, like a failed preparation
+                        logging.error(f"Error processing {job.filename}: {e}")
+                        del jobs[index]
+                on_done(index, extracted)
+            return results
+
+        def on_scheduled(index: int, page_results: List):
+            # Tasks may take pages out of order; combine them in PDF order
+            pages = sorted(result for result in page_results if result)
+            on_done(index, [data for _, data in pages])
+
+        self.scheduler.run(
+            [
+                (index, lambda index=index, path=path: prepare(index, path))
+                for index, path in documents
+            ],
+            extract,
+            on_scheduled,
+        )
+        return results
 
     def process_multiple(
-        self, pdf_paths: List[str], preprocess=True
-    ) -> MultipleInvoicesResponse:
+        self,
+        pdf_paths: List[str],
+        preprocess=True,
+        filenames: Optional[List[str]] = None,
+        digests: Optional[List[str]] = None,
+        on_invoice: Optional[Callable[[int, Optional[InvoiceData]], None]] = None,
+    ) -> models.MultipleInvoicesResponse:
         """
         Process multiple PDF files and extract invoice data from each.
-        Returns a MultipleInvoicesResponse with all processed invoices.
+        Returns a MultipleInvoicesResponse with all processed invoices and
+        per-invoice and batch totals.
+
+        filenames, when given, are the original names aligned with pdf_paths.
+        digests are the SHA-256 of each file if already known. Documents
+        uploaded more than once are processed once; every copy gets the
+        result, marked with the filename it duplicates, and is counted once
+        in the batch totals.
+
+        on_invoice, if given, is called with the index of each upload and its
+        result (None on failure) as soon as that document is done, before
+        the whole batch has finished.
         """
+        duplicate_of = (
+            find_duplicates(pdf_paths, digests, self.dedup_perceptual)
+            if self.dedup
+            else {}
+        )
+        copies: Dict[int, List[int]] = {}
+        for i, original in duplicate_of.items():
+            copies.setdefault(original, []).append(i)
+        uploads: Dict[int, Optional[InvoiceData]] = {}
+
+        def completed(index: int, invoice_data: Optional[InvoiceData]):
+            # Name the result after each upload that shares it
+            if invoice_data and filenames:
+                invoice_data.filename = filenames[index]
+            uploads[index] = invoice_data
+            for i in copies.get(index, []):
+                uploads[i] = invoice_data and invoice_data.copy(
+                    deep=True,
+                    update={
+                        "filename": (
+                            filenames[i]
+                            if filenames
+                            else os.path.basename(pdf_paths[i])
+                        ),
+                        "duplicate_of": invoice_data.filename,
+                    },
+                )
+            if on_invoice is not None:
+                for i in [index] + copies.get(index, []):
+                    on_invoice(i, uploads[i])
+
+        self._process_scheduled(
+            [(i, path) for i, path in enumerate(pdf_paths) if i not in duplicate_of],
+            preprocess,
+            completed,
+        )
+
         invoices = []
+        distinct = []
         successful_extractions = 0
         failed_extractions = 0
 
-        for pdf_path in pdf_paths:
-            try:
-                invoice_data = self.process(pdf_path, preprocess)
-                if invoice_data:
-                    invoices.append(invoice_data)
-                    successful_extractions += 1
-                else:
-                    failed_extractions += 1
-                    logging.warning(f"Failed to extract data from {pdf_path}")
-            except Exception as e:
+        for i in range(len(pdf_paths)):
+            invoice_data = uploads.get(i)
+            if not invoice_data:
                 failed_extractions += 1
-                logging.error(f"Error processing {pdf_path}: {str(e)}")
+                continue
+            if i not in duplicate_of:
+                distinct.append(invoice_data)
+            invoices.append(invoice_data)
+            successful_extractions += 1
+
+        invoice_totals, batch_totals = BatchPostProcessor.calculate_totals(invoices)
+        if duplicate_of:
+            _, batch_totals = BatchPostProcessor.calculate_totals(distinct)
 
-        return MultipleInvoicesResponse(
+        return models.MultipleInvoicesResponse(
             invoices=invoices,
             total_processed=len(pdf_paths),
             successful_extractions=successful_extractions,
             failed_extractions=failed_extractions,
+            invoice_totals=invoice_totals,
+            batch_totals=batch_totals,
+            deduplicated=len(duplicate_of),
         )
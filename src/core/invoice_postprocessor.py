@@ -1,7 +1,9 @@
 import logging
+from decimal import Decimal
 from typing import Optional
 
-from src.models.extraction_models import InvoiceDataExtracted, InvoiceLineExtracted
+from src.models.extraction_models import InvoiceDataExtracted
+from src.models.line_amounts import LineAmounts
 from src.models.models import InvoiceData, InvoiceLine
 from src.utils.vat_calculator import VATCalculator
 
@@ -29,9 +31,14 @@ class InvoicePostProcessor:
 
             for line in extracted_data.invoice_lines:
                 # Calculate VAT amount using quantity × unit_price × 15%
-                vat_amount = VATCalculator.calculate_vat_amount(
-                    line.quantity, line.unit_price
+                quantity = VATCalculator.parse_amount(line.quantity)
+                unit_price = VATCalculator.parse_amount(line.unit_price)
+                vat = VATCalculator.vat_for(
+                    quantity * unit_price
+                    if quantity is not None and unit_price is not None
+                    else None
                 )
+                vat_amount = str(vat) if vat is not None else ""
 
                 # Create new InvoiceLine with calculated VAT
                 processed_line = InvoiceLine(
@@ -39,8 +46,11 @@ class InvoicePostProcessor:
                     quantity=line.quantity,
                     unit_price=line.unit_price,
                     taxes=line.taxes,
+                    gross_price=line.gross_price,
                     vat_amount=vat_amount,
                 )
+                # Keep the parsed values so totals don't parse the line again
+                LineAmounts.known(processed_line, quantity, unit_price, vat)
                 processed_lines.append(processed_line)
 
             # Create final InvoiceData with calculated VAT amounts
@@ -82,14 +92,10 @@ class InvoicePostProcessor:
             Total VAT amount as string
         """
         try:
-            total_vat = 0.0
-
-            for line in invoice_data.invoice_lines:
-                if line.vat_amount and line.vat_amount.strip():
-                    vat_value = VATCalculator.clean_numeric_value(line.vat_amount)
-                    if vat_value:
-                        total_vat += float(vat_value)
-
+            total_vat = sum(
+                (line.amounts.vat or 0 for line in invoice_data.invoice_lines),
+                Decimal("0"),
+            )
             return str(round(total_vat, 2))
 
         except Exception as e:
@@ -108,16 +114,10 @@ class InvoicePostProcessor:
             Subtotal amount as string
         """
         try:
-            subtotal = 0.0
-
-            for line in invoice_data.invoice_lines:
-                qty = VATCalculator.clean_numeric_value(line.quantity)
-                price = VATCalculator.clean_numeric_value(line.unit_price)
-
-                if qty and price:
-                    line_subtotal = float(qty) * float(price)
-                    subtotal += line_subtotal
-
+            subtotal = sum(
+                (line.amounts.net or 0 for line in invoice_data.invoice_lines),
+                Decimal("0"),
+            )
             return str(round(subtotal, 2))
 
         except Exception as e:
@@ -139,12 +139,9 @@ class InvoicePostProcessor:
             subtotal_str = InvoicePostProcessor.calculate_subtotal(invoice_data)
             total_vat_str = InvoicePostProcessor.calculate_total_vat(invoice_data)
 
-            subtotal = float(subtotal_str) if subtotal_str else 0.0
-            total_vat = float(total_vat_str) if total_vat_str else 0.0
-
-            total_amount = subtotal + total_vat
+            total_amount = Decimal(subtotal_str) + Decimal(total_vat_str)
 
-            return str(round(total_amount, 2))
+            return str(total_amount)
 
         except Exception as e:
             logging.error(f"Total amount calculation failed: {e}")
@@ -0,0 +1,310 @@
+import logging
+import os
+from typing import List, Optional, Tuple
+
+# (x0, y0, x1, y1) in pixels, end exclusive
+Box = Tuple[int, int, int, int]
+
+LAYOUT_MODES = ("none", "margins", "composite")
+
+
+def union(boxes: List[Box]) -> Optional[Box]:
+    if not boxes:
+        return None
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
+
+def area(box: Box) -> int:
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+
+class PageLayout:
+    """
+    Text blocks and table regions detected on one page.
+
+    Attributes:
+        width, height: Page size in pixels
+        text_blocks: Boxes of text outside tables (header, addresses, totals)
+        tables: Boxes of ruled tables (usually the line items)
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        text_blocks: List[Box],
+        tables: List[Box],
+    ):
+        self.width = width
+        self.height = height
+        self.text_blocks = text_blocks
+        self.tables = tables
+
+    @property
+    def content_box(self) -> Optional[Box]:
+        """Smallest box containing all content, None for a blank page."""
+        return union(self.text_blocks + self.tables)
+
+    def totals_box(
+        self, tolerance: float = 0.03, max_gap: float = 0.15
+    ) -> Optional[Box]:
+        """
+        Box of the totals block under the item table, None if there is none.
+
+        Totals are figures printed under the amount column: text that starts
+        shortly below the table (within max_gap of the page height), lies in
+        its right half and ends where the table ends (within tolerance of
+        the page width). Notes, bank details and page footers spanning or
+        centred under the table do not count.
+        """
+        table = union(self.tables)
+        if table is None:
+            return None
+        middle = (table[0] + table[2]) // 2
+        lowest = table[3] + max_gap * self.height
+        slack = tolerance * self.width
+        return union(
+            [
+                b
+                for b in self.text_blocks
+                if table[3] - 5 <= b[1] <= lowest
+                and b[0] >= middle
+                and abs(b[2] - table[2]) <= slack
+            ]
+        )
+
+
+class LayoutAnalyzer:
+    """
+    Find the parts of a page that carry content, so the extractor can send
+    less image to the model.
+
+    Text blocks are found by smearing ink horizontally until characters
+    merge into lines and paragraphs; tables by their long horizontal and
+    vertical rules. From those the page can be cropped to its content
+    ("margins"), or packed into a composite of the content bands with the
+    blank space between them removed ("composite").
+    """
+
+    def __init__(
+        self,
+        padding: int = 16,
+        min_gap: int = 40,
+        spacer: int = 12,
+        min_block_area: int = 150,
+        min_saving: float = 0.05,
+    ):
+        """
+        Args:
+            padding: Pixels kept around each cropped region
+            min_gap: Blank vertical gaps taller than this are collapsed in
+                composites
+            spacer: Height of the blank strip between composite bands
+            min_block_area: Smaller ink blobs are treated as noise
+            min_saving: Crops removing less than this fraction of the page
+                are skipped and the original image is used
+        """
+        self.padding = padding
+        self.min_gap = min_gap
+        self.spacer = spacer
+        self.min_block_area = min_block_area
+        self.min_saving = min_saving
+
+    def analyze(self, image_path: str) -> Optional[PageLayout]:
+        """Detect text blocks and tables; None if the image cannot be read."""
+        import cv2
+
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            logging.error(f"Layout analysis could not read {image_path}")
+            return None
+        height, width = gray.shape
+
+        flags = cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU
+        _, ink = cv2.threshold(gray, 0, 255, flags)
+        if cv2.countNonZero(ink) > 0.5 * width * height:
+            # Nearly uniform page: Otsu split the background itself
+            return PageLayout(width, height, [], [])
+
+        tables = self._find_tables(ink, width, height)
+        text_blocks = [
+            box
+            for box in self._find_text_blocks(ink, width, height)
+            if not any(self._overlap(box, table) > 0.5 for table in tables)
+        ]
+        return PageLayout(width, height, text_blocks, tables)
+
+    def _find_tables(self, ink, width: int, height: int) -> List[Box]:
+        import cv2
+
+        def opened(size: Tuple[int, int]):
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, size)
+            return cv2.morphologyEx(ink, cv2.MORPH_OPEN, kernel)
+
+        horizontal = opened((max(20, width // 20), 1))
+        vertical = opened((1, max(20, height // 40)))
+        # Join the rules of one table (also tables ruled only between rows)
+        size = (5, max(10, height // 25))
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, size)
+        rules = cv2.dilate(cv2.bitwise_or(horizontal, vertical), kernel)
+        tables = []
+        for box in self._boxes(rules):
+            wide = box[2] - box[0] >= width // 4
+            if wide and box[3] - box[1] >= height // 50:
+                tables.append(box)
+        return tables
+
+    def _find_text_blocks(self, ink, width: int, height: int) -> List[Box]:
+        import cv2
+
+        # Isolated specks stay below min_block_area after smearing
+        size = (max(15, width // 40), max(5, height // 120))
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, size)
+        smeared = cv2.dilate(ink, kernel)
+        boxes = self._boxes(smeared)
+        return [box for box in boxes if area(box) >= self.min_block_area]
+
+    @staticmethod
+    def _boxes(mask) -> List[Box]:
+        import cv2
+
+        mode, method = cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        contours, _ = cv2.findContours(mask, mode, method)
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((x, y, x + w, y + h))
+        return boxes
+
+    @staticmethod
+    def _overlap(box: Box, outer: Box) -> float:
+        """Fraction of box that lies inside outer."""
+        inner = (
+            max(box[0], outer[0]),
+            max(box[1], outer[1]),
+            min(box[2], outer[2]),
+            min(box[3], outer[3]),
+        )
+        if inner[0] >= inner[2] or inner[1] >= inner[3]:
+            return 0.0
+        return area(inner) / area(box) if area(box) else 0.0
+
+    def _pad(self, box: Box, layout: PageLayout) -> Box:
+        return (
+            max(0, box[0] - self.padding),
+            max(0, box[1] - self.padding),
+            min(layout.width, box[2] + self.padding),
+            min(layout.height, box[3] + self.padding),
+        )
+
+    def bands(self, layout: PageLayout) -> List[Tuple[int, int]]:
+        """Vertical content bands, separated by gaps taller than min_gap."""
+        bands = []
+        boxes = layout.text_blocks + layout.tables
+        for box in sorted(boxes, key=lambda b: b[1]):
+            if bands and box[1] <= bands[-1][1] + self.min_gap:
+                bands[-1][1] = max(bands[-1][1], box[3])
+            else:
+                bands.append([box[1], box[3]])
+        return [(top, bottom) for top, bottom in bands]
+
+    def _output_path(self, image_path: str, suffix: str) -> str:
+        root, _ = os.path.splitext(image_path)
+        return f"{root}_{suffix}.png"
+
+    def crop_margins(
+        self,
+        image_path: str,
+        layout: Optional[PageLayout] = None,
+    ):
+        """
+        Crop the page to its content box.
+
+        Returns:
+            Path of the cropped image, or image_path when there is nothing
+            worth cropping
+        """
+        import cv2
+
+        layout = layout or self.analyze(image_path)
+        if not layout or not layout.content_box:
+            return image_path
+
+        box = self._pad(layout.content_box, layout)
+        if area(box) > (1 - self.min_saving) * layout.width * layout.height:
+            return image_path
+
+        img = cv2.imread(image_path)
+        output_path = self._output_path(image_path, "layout")
+        x0, y0, x1, y1 = box
+        cv2.imwrite(output_path, img[y0:y1, x0:x1])
+        return output_path
+
+    def composite(
+        self,
+        image_path: str,
+        layout: Optional[PageLayout] = None,
+    ):
+        """
+        Stack the content bands of the page into one tighter image.
+
+        Margins are cropped and blank vertical gaps are reduced to a thin
+        spacer, keeping the reading order of the page.
+
+        Returns:
+            Path of the composite image, or image_path when there is nothing
+            worth cropping
+        """
+        import cv2
+        import numpy as np
+
+        layout = layout or self.analyze(image_path)
+        if not layout or not layout.content_box:
+            return image_path
+
+        x0, _, x1, _ = self._pad(layout.content_box, layout)
+        img = cv2.imread(image_path)
+        spacer = np.full((self.spacer, x1 - x0, 3), 255, dtype=img.dtype)
+        parts = []
+        for top, bottom in self.bands(layout):
+            top = max(0, top - self.padding)
+            bottom = min(layout.height, bottom + self.padding)
+            if parts:
+                parts.append(spacer)
+            parts.append(img[top:bottom, x0:x1])
+
+        composite = np.vstack(parts)
+        if composite.shape[0] * composite.shape[1] > (1 - self.min_saving) * (
+            layout.width * layout.height
+        ):
+            return image_path
+
+        output_path = self._output_path(image_path, "layout")
+        cv2.imwrite(output_path, composite)
+        return output_path
+
+    def apply(self, image_path: str, mode: str) -> str:
+        """
+        Prepare a page image for the extractor.
+
+        Args:
+            image_path: Page image
+            mode: "margins", "composite" or "none"
+
+        Returns:
+            Path of the image to send (the original on failure)
+        """
+        if mode not in ("margins", "composite"):
+            return image_path
+        try:
+            if mode == "margins":
+                return self.crop_margins(image_path)
+            return self.composite(image_path)
+        except Exception as e:
+            logging.error(f"Layout cropping failed: {e}")
+            return image_path
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+class CascadeStats:
+    """Thread-safe counters for one cascade (e.g. "extract" or "custom")."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.escalations = 0
+        self.fast_calls = 0
+        self.fast_seconds = 0.0
+        self.strong_calls = 0
+        self.strong_seconds = 0.0
+
+    def record(self, fast_seconds: float, strong_seconds: Optional[float]):
+        with self._lock:
+            self.pages += 1
+            self.fast_calls += 1
+            self.fast_seconds += fast_seconds
+            if strong_seconds is not None:
+                self.escalations += 1
+                self.strong_calls += 1
+                self.strong_seconds += strong_seconds
+
+    def summary(
+        self, fast_cost: Optional[float] = None, strong_cost: Optional[float] = None
+    ) -> Dict:
+        """
+        Escalation rate plus latency and cost saved versus always using the
+        strong model. Savings are estimated from the observed average latency
+        of the strong model (None until at least one page was escalated) and
+        from the configured per-page costs (None when not configured).
+        """
+        with self._lock:
+            pages = self.pages
+            avg_fast = self.fast_seconds / self.fast_calls if self.fast_calls else None
+            avg_strong = (
+                self.strong_seconds / self.strong_calls if self.strong_calls else None
+            )
+            spent = self.fast_seconds + self.strong_seconds
+            escalations = self.escalations
+
+        latency_saved = (
+            round(pages * avg_strong - spent, 3) if avg_strong is not None else None
+        )
+        cost_saved = None
+        if fast_cost is not None and strong_cost is not None:
+            cost_saved = round(
+                pages * strong_cost - (pages * fast_cost + escalations * strong_cost), 6
+            )
+
+        return {
+            "pages": pages,
+            "escalations": escalations,
+            "escalation_rate": round(escalations / pages, 4) if pages else 0.0,
+            "avg_fast_seconds": round(avg_fast, 3) if avg_fast is not None else None,
+            "avg_strong_seconds": (
+                round(avg_strong, 3) if avg_strong is not None else None
+            ),
+            "latency_saved_seconds": latency_saved,
+            "cost_saved": cost_saved,
+        }
+
+
+_stats: Dict[str, CascadeStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_stats(name: str) -> CascadeStats:
+    """Process-wide stats for the cascade with this name."""
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = CascadeStats()
+        return _stats[name]
+
+
+def cascade_enabled() -> bool:
+    return os.getenv("MODEL_CASCADE", "").lower() in ("1", "true", "yes")
+
+
+class ModelCascade:
+    """
+    Run a cheap, fast model first and escalate to the strong model only when
+    the fast result fails local checks.
+
+    Configuration (environment):
+        CASCADE_FAST_MODEL    default "gemini-2.5-flash"
+        CASCADE_STRONG_MODEL  default "gemini-2.5-pro"
+        CASCADE_FAST_COST / CASCADE_STRONG_COST
+                              optional cost per page, used to report savings
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fast_model: Optional[str] = None,
+        strong_model: Optional[str] = None,
+    ):
+        self.name = name
+        self.fast_model = fast_model or os.getenv(
+            "CASCADE_FAST_MODEL", "gemini-2.5-flash"
+        )
+        self.strong_model = strong_model or os.getenv(
+            "CASCADE_STRONG_MODEL", "gemini-2.5-pro"
+        )
+        self.stats = get_stats(name)
+
+    def run(
+        self,
+        call: Callable[[str], Optional[T]],
+        failures: Callable[[T], List[str]],
+    ) -> Optional[T]:
+        """
+        Args:
+            call: Runs the extraction with the given model name
+            failures: Returns the names of fields that fail local checks
+
+        Returns:
+            The fast result if it passes, otherwise the strong result (or the
+            fast result if the strong model returned nothing)
+        """
+        start = time.perf_counter()
+        result = call(self.fast_model)
+        fast_seconds = time.perf_counter() - start
+
+        failed = failures(result) if result else ["<no result>"]
+        if not failed:
+            self.stats.record(fast_seconds, None)
+            return result
+
+        logging.info(
+            f"Escalating to {self.strong_model}, failed checks: {', '.join(failed)}"
+        )
+        start = time.perf_counter()
+        escalated = call(self.strong_model)
+        self.stats.record(fast_seconds, time.perf_counter() - start)
+        return escalated or result
+
+    def summary(self) -> Dict:
+        return {
+            "fast_model": self.fast_model,
+            "strong_model": self.strong_model,
+            **self.stats.summary(
+                _env_float("CASCADE_FAST_COST"), _env_float("CASCADE_STRONG_COST")
+            ),
+        }
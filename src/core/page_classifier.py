@@ -0,0 +1,179 @@
+import logging
+import os
+from typing import List, Optional
+
+from src.core.layout_analyzer import LayoutAnalyzer
+
+PAGE_INVOICE = "invoice"
+PAGE_BLANK = "blank"
+PAGE_BOILERPLATE = "boilerplate"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+# Side of the difference hash grid; the hash has HASH_SIZE² bits
+HASH_SIZE = 16
+
+
+def difference_hash(gray) -> int:
+    """Perceptual hash of a grayscale image: brighter/darker than right neighbour."""
+    import cv2
+
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PageVerdict:
+    """
+    Result of classifying one page.
+
+    Attributes:
+        kind: PAGE_INVOICE, PAGE_BLANK or PAGE_BOILERPLATE
+        ink_density: Fraction of dark pixels
+        text_lines: Number of text lines found by horizontal projection
+        page_hash: Difference hash of the page
+        has_totals: Whether the page holds the totals block (None if not
+            checked)
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        ink_density: float,
+        text_lines: int,
+        page_hash: int,
+        has_totals: Optional[bool] = None,
+    ):
+        self.kind = kind
+        self.ink_density = ink_density
+        self.text_lines = text_lines
+        self.page_hash = page_hash
+        self.has_totals = has_totals
+
+    @property
+    def skip(self) -> bool:
+        return self.kind != PAGE_INVOICE
+
+
+class PageClassifier:
+    """
+    Cheap local checks that keep pages without invoice content away from
+    the model.
+
+    A page is "blank" when it has almost no ink or fewer than
+    ``min_text_lines`` lines of text (e.g. the empty back of a duplex scan),
+    and "boilerplate" when it looks like a known non-invoice page such as
+    printed terms and conditions. Known boilerplate pages are sample images
+    in BOILERPLATE_DIR and/or hex hashes in BOILERPLATE_HASHES (comma
+    separated, ``format(PageClassifier.page_hash(path), "x")``).
+    """
+
+    def __init__(
+        self,
+        min_ink: float = 0.002,
+        min_text_lines: int = 2,
+        max_hash_distance: int = 20,
+        boilerplate_hashes: Optional[List[int]] = None,
+    ):
+        """
+        Args:
+            min_ink: Pages with a smaller fraction of dark pixels are blank
+            min_text_lines: Pages with fewer text lines are blank
+            max_hash_distance: Pages whose hash differs from a boilerplate
+                hash in at most this many of the 256 bits are boilerplate
+            boilerplate_hashes: Known boilerplate hashes; defaults to the
+                environment configuration
+        """
+        self.min_ink = min_ink
+        self.min_text_lines = min_text_lines
+        self.max_hash_distance = max_hash_distance
+        self.layout = LayoutAnalyzer()
+        self.boilerplate_hashes = (
+            boilerplate_hashes
+            if boilerplate_hashes is not None
+            else self._configured_hashes()
+        )
+
+    def _configured_hashes(self) -> List[int]:
+        hashes = []
+        for value in os.getenv("BOILERPLATE_HASHES", "").split(","):
+            if value.strip():
+                hashes.append(int(value.strip(), 16))
+
+        folder = os.getenv("BOILERPLATE_DIR")
+        if folder and os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    page_hash = self.page_hash(os.path.join(folder, name))
+                    if page_hash is not None:
+                        hashes.append(page_hash)
+        return hashes
+
+    @staticmethod
+    def page_hash(image_path: str) -> Optional[int]:
+        import cv2
+
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        return difference_hash(gray) if gray is not None else None
+
+    @staticmethod
+    def count_text_lines(ink) -> int:
+        """Count runs of rows containing ink (at least 3 px tall)."""
+        import numpy as np
+
+        min_pixels = max(3, ink.shape[1] // 200)
+        rows = np.count_nonzero(ink, axis=1) >= min_pixels
+        lines, run = 0, 0
+        for has_ink in rows:
+            if has_ink:
+                run += 1
+            else:
+                lines += run >= 3
+                run = 0
+        return lines + (run >= 3)
+
+    def classify(self, image_path: str, detect_totals: bool = False) -> PageVerdict:
+        """
+        Args:
+            image_path: Rendered page image (before preprocessing)
+            detect_totals: Also check whether the page holds the totals block
+
+        Returns:
+            PageVerdict; unreadable pages are treated as invoice pages
+        """
+        import cv2
+
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            logging.error(f"Page classification could not read {image_path}")
+            return PageVerdict(PAGE_INVOICE, 1.0, 0, 0)
+
+        # A fixed threshold keeps faint bleed-through on blank backs out of the ink
+        _, ink = cv2.threshold(gray, 160, 255, cv2.THRESH_BINARY_INV)
+        ink_density = cv2.countNonZero(ink) / ink.size
+        text_lines = self.count_text_lines(ink)
+        page_hash = difference_hash(gray)
+
+        if ink_density < self.min_ink or text_lines < self.min_text_lines:
+            kind = PAGE_BLANK
+        elif any(
+            hamming(page_hash, known) <= self.max_hash_distance
+            for known in self.boilerplate_hashes
+        ):
+            kind = PAGE_BOILERPLATE
+        else:
+            kind = PAGE_INVOICE
+
+        has_totals = None
+        if detect_totals and kind == PAGE_INVOICE:
+            layout = self.layout.analyze(image_path)
+            has_totals = bool(layout and layout.totals_box())
+
+        return PageVerdict(kind, ink_density, text_lines, page_hash, has_totals)
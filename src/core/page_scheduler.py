@@ -0,0 +1,140 @@
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+from src.utils.context_executor import ContextThreadPoolExecutor
+
+SCHEDULING_POLICIES = ("shortest", "round_robin")
+
+
+class _Document:
+    def __init__(self, key: Hashable, prepare: Callable[[], Sequence]):
+        self.key = key
+        self.prepare = prepare
+        self.prepared = False
+        self.pages: Sequence = []
+        self.pending: deque = deque()  # indexes of pages not started yet
+        self.in_flight = 0
+        self.results: List = []
+
+    @property
+    def remaining(self) -> int:
+        return len(self.pending) + self.in_flight
+
+    @property
+    def finished(self) -> bool:
+        return self.prepared and self.remaining == 0
+
+
+class PageScheduler:
+    """
+    Run the pages of many documents on one worker pool, interleaving them
+    fairly so a long document does not hold up the short ones behind it.
+
+    Each document is first prepared (e.g. opened) as a task of its own;
+    preparation tasks run before page tasks, in the order the documents were
+    given. Page tasks are then picked by policy:
+
+        shortest     pages of the document with the fewest pages left first,
+                     so short documents complete as early as possible
+        round_robin  one page from each document in turn
+
+    A document's results are handed to ``on_done`` as soon as its last page
+    finishes, while other documents are still running.
+    """
+
+    def __init__(self, max_workers: int = 4, policy: str = "shortest"):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(
+                f"Unknown scheduling policy: {policy}. "
+                f"Available: {list(SCHEDULING_POLICIES)}"
+            )
+        self.max_workers = max(1, max_workers)
+        self.policy = policy
+        self._next_turn = 0
+
+    def run(
+        self,
+        documents: List[Tuple[Hashable, Callable[[], Optional[Sequence]]]],
+        work: Callable[[Any], Any],
+        on_done: Callable[[Hashable, List[Optional[Any]]], None],
+    ):
+        """
+        Args:
+            documents: (key, prepare) pairs; prepare returns the document's
+                page items (empty or None if there is nothing to run)
+            work: Processes one page item
+            on_done: Called with the key and the results aligned with the
+                pages; pages that failed have a None result
+        """
+        docs = [_Document(key, prepare) for key, prepare in documents]
+        unprepared = deque(docs)
+        futures = {}
+
+        with ContextThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                while len(futures) < self.max_workers:
+                    if unprepared:
+                        doc = unprepared.popleft()
+                        futures[pool.submit(doc.prepare)] = (doc, None)
+                        continue
+                    doc = self._pick(docs)
+                    if doc is None:
+                        break
+                    index = doc.pending.popleft()
+                    doc.in_flight += 1
+                    futures[pool.submit(work, doc.pages[index])] = (doc, index)
+
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    doc, index = futures.pop(future)
+                    if index is None:
+                        self._prepared(doc, future)
+                    else:
+                        self._page_done(doc, index, future)
+                    if doc.finished:
+                        self._finish(doc, on_done)
+
+    def _pick(self, docs: List[_Document]) -> Optional[_Document]:
+        ready = [doc for doc in docs if doc.pending]
+        if not ready:
+            return None
+        if self.policy == "shortest":
+            return min(ready, key=lambda doc: doc.remaining)
+
+        # round_robin: the first ready document at or after the current turn
+        position = {id(doc): i for i, doc in enumerate(docs)}
+        turn = self._next_turn
+        doc = min(ready, key=lambda d: (position[id(d)] - turn) % len(docs))
+        self._next_turn = (position[id(doc)] + 1) % len(docs)
+        return doc
+
+    @staticmethod
+    def _prepared(doc: _Document, future):
+        try:
+            doc.pages = list(future.result() or [])
+        except Exception as e:
+            logging.error(f"Failed to prepare document {doc.key}: {e}")
+            doc.pages = []
+        doc.prepared = True
+        doc.pending = deque(range(len(doc.pages)))
+        doc.results = [None] * len(doc.pages)
+
+    @staticmethod
+    def _page_done(doc: _Document, index: int, future):
+        doc.in_flight -= 1
+        try:
+            doc.results[index] = future.result()
+        except Exception as e:
+            logging.error(f"Page {index + 1} of {doc.key} failed: {e}")
+
+    @staticmethod
+    def _finish(doc: _Document, on_done):
+        doc.prepared = False  # report each document once
+        try:
+            on_done(doc.key, doc.results)
+        except Exception as e:
+            logging.error(f"Failed to assemble document {doc.key}: {e}")
@@ -1,24 +1,302 @@
 import logging
+import math
 import os
-from typing import List
+import re
+import shutil
+import tempfile
+from typing import Iterator, List, Optional
 
-from pdf2image import convert_from_path
+from src.utils.memory import current_rss_mb
+from src.utils.shared_cache import SharedCache, file_digest
+
+# Rendering resolution is lowered down to this to fit the budgets
+MIN_DPI = 100
+
+
+class PixelBudgetExceeded(ValueError):
+    """The PDF needs more pixels than the per-request budget allows."""
+
+
+class RenderedDocument:
+    """
+    The pages of one PDF, rendered lazily a window of pages at a time.
+
+    Iterating yields page image paths. Only one window of pages is held in
+    memory while rendering, and pages the caller has released are deleted,
+    so memory and disk use stay bounded however long the PDF is. Call
+    ``close`` when done to delete whatever is left.
+
+    Attributes:
+        page_count: Number of pages in the PDF
+        dpi: Resolution used for rendering
+        pixels: Pixels rendered so far
+        peak_rss_mb: Highest RSS seen right after rendering a window
+        paths: Image paths yielded so far
+    """
+
+    def __init__(self, converter: "PDFConverter", pdf_path: str):
+        self.converter = converter
+        self.pdf_path = pdf_path
+        self.digest = file_digest(pdf_path) if converter.cache else None
+        self.page_count = 0
+        self.dpi = converter.dpi
+        self.pixels = 0
+        self.peak_rss_mb: Optional[float] = None
+        self.paths: List[str] = []
+
+        info = self._cached_info()
+        if info is None:
+            info = converter.page_info(pdf_path)
+            self._cache_info(info)
+        self.page_count, page_size = info
+        self.dpi = converter.plan_dpi(self.page_count, page_size)
+        # Pages are cached per resolution: the planned dpi depends on the
+        # converter's settings, not only on the PDF
+        self.key = f"{self.digest}:{self.dpi}"
+        self.page_dir = tempfile.mkdtemp(dir=converter.output_folder)
+
+    def _cached_info(self) -> Optional[tuple]:
+        if not self.digest:
+            return None
+        data = self.converter.cache.get("pages", f"{self.digest}:info")
+        if not data:
+            return None
+        count, *size = data.decode().split()
+        return int(count), tuple(map(float, size)) or None
+
+    def _cache_info(self, info: tuple):
+        if not self.digest:
+            return
+        page_count, page_size = info
+        # "<pages> [<width> <height>]", the size in points
+        value = " ".join(map(str, [page_count, *(page_size or ())]))
+        key = f"{self.digest}:info"
+        try:
+            self.converter.cache.set("pages", key, value.encode())
+        except Exception as e:
+            logging.warning(f"Caching rendered pages failed: {e}")
+
+    def _cached_count(self) -> int:
+        """Page count once every page is cached at this resolution, else 0."""
+        if not self.digest:
+            return 0
+        count = self.converter.cache.get("pages", f"{self.key}:count")
+        return int(count) if count else 0
+
+    def __iter__(self) -> Iterator[str]:
+        window = self.converter.window
+        for first in range(1, self.page_count + 1, window):
+            last = min(first + window - 1, self.page_count)
+            for path in self._load_window(first, last) or self._render_window(
+                first, last
+            ):
+                self.paths.append(path)
+                yield path
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.page_dir, f"page_{number}.png")
+
+    @staticmethod
+    def page_number(image_path: str) -> int:
+        """1-based page number of a page image rendered by a document."""
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        return int(name.rsplit("_", 1)[1])
+
+    def _load_window(self, first: int, last: int) -> List[str]:
+        if not self._cached_count():
+            return []
+        paths = []
+        for number in range(first, last + 1):
+            data = self.converter.cache.get("pages", f"{self.key}:{number}")
+            if data is None:
+                return []
+            with open(self._path(number), "wb") as f:
+                f.write(data)
+            paths.append(self._path(number))
+        return paths
+
+    def _render_window(self, first: int, last: int) -> List[str]:
+        images = self.converter.render(self.pdf_path, first, last, self.dpi)
+        rss = current_rss_mb()
+        if rss is not None and rss > (self.peak_rss_mb or 0):
+            self.peak_rss_mb = rss
+        paths = []
+        try:
+            for number, image in zip(range(first, last + 1), images):
+                image = self.converter.limit_size(image)
+                self.pixels += image.width * image.height
+                if 0 < self.converter.pixel_budget < self.pixels:
+                    raise PixelBudgetExceeded(
+                        f"PDF exceeds the rendering budget of "
+                        f"{self.converter.pixel_budget} pixels"
+                    )
+                image.save(self._path(number), "PNG")
+                paths.append(self._path(number))
+        finally:
+            # Drop the window's page buffers before the next one is rendered
+            for image in images:
+                image.close()
+            del images
+
+        self._store_window(first, paths)
+        if last == self.page_count and self.digest:
+            try:
+                self.converter.cache.set(
+                    "pages", f"{self.key}:count", str(self.page_count).encode()
+                )
+            except Exception as e:
+                logging.warning(f"Caching rendered pages failed: {e}")
+        return paths
+
+    def _store_window(self, first: int, paths: List[str]):
+        if not self.digest:
+            return
+        try:
+            for number, path in enumerate(paths, start=first):
+                key = f"{self.key}:{number}"
+                with open(path, "rb") as f:
+                    self.converter.cache.set("pages", key, f.read())
+        except Exception as e:
+            logging.warning(f"Caching rendered pages failed: {e}")
+
+    def close(self):
+        shutil.rmtree(self.page_dir, ignore_errors=True)
 
 
 class PDFConverter:
-    def __init__(self, output_folder: str):
+    """
+    Render PDF pages to PNG files.
+
+    Configuration (environment):
+        RENDER_DPI              rendering resolution, default 200
+        RENDER_WINDOW           pages rendered (and held in memory) at once,
+                                default 8
+        RENDER_MAX_PAGE_PIXELS  larger pages are scaled down, default 12M
+        RENDER_PIXEL_BUDGET     maximum pixels rendered for one PDF, 0 for no
+                                limit (default). The resolution is lowered (to
+                                no less than 100 dpi) to fit; larger PDFs are
+                                rejected with PixelBudgetExceeded.
+    """
+
+    def __init__(
+        self,
+        output_folder: str,
+        cache: Optional[SharedCache] = None,
+        window: Optional[int] = None,
+        dpi: Optional[int] = None,
+        max_page_pixels: Optional[int] = None,
+        pixel_budget: Optional[int] = None,
+    ):
         self.output_folder = output_folder
+        self.cache = cache
+        self.window = max(1, window or int(os.getenv("RENDER_WINDOW", "8")))
+        self.dpi = dpi or int(os.getenv("RENDER_DPI", "200"))
+        self.max_page_pixels = max_page_pixels or int(
+            os.getenv("RENDER_MAX_PAGE_PIXELS", str(12_000_000))
+        )
+        self.pixel_budget = (
+            pixel_budget
+            if pixel_budget is not None
+            else int(os.getenv("RENDER_PIXEL_BUDGET", "0"))
+        )
         os.makedirs(self.output_folder, exist_ok=True)
 
+    def page_info(self, pdf_path: str):
+        """
+        Returns:
+            (page count, (width, height) of the first page in points or None)
+        """
+        from pdf2image import pdfinfo_from_path
+
+        info = pdfinfo_from_path(pdf_path)
+        match = re.match(r"([\d.]+) x ([\d.]+)", info.get("Page size", ""))
+        size = (float(match.group(1)), float(match.group(2))) if match else None
+        return int(info["Pages"]), size
+
+    def plan_dpi(self, page_count: int, page_size: Optional[tuple]) -> int:
+        """Highest resolution (up to RENDER_DPI) that fits the pixel budget."""
+        if not self.pixel_budget or not page_size or not page_count:
+            return self.dpi
+        square_inches = page_size[0] * page_size[1] / 72**2
+        fitting = int(math.sqrt(self.pixel_budget / (page_count * square_inches)))
+        if fitting < MIN_DPI:
+            raise PixelBudgetExceeded(
+                f"PDF with {page_count} pages exceeds the rendering budget of "
+                f"{self.pixel_budget} pixels"
+            )
+        return min(self.dpi, fitting)
+
+    def render(self, pdf_path: str, first_page: int, last_page: int, dpi: int):
+        """Render a range of pages (1-based, inclusive) to PIL images."""
+        from pdf2image import convert_from_path
+
+        return convert_from_path(
+            pdf_path, dpi=dpi, first_page=first_page, last_page=last_page
+        )
+
+    def limit_size(self, image):
+        """Scale a page down if it has more than max_page_pixels."""
+        pixels = image.width * image.height
+        if pixels <= self.max_page_pixels:
+            return image
+        scale = math.sqrt(self.max_page_pixels / pixels)
+        resized = image.resize((int(image.width * scale), int(image.height * scale)))
+        image.close()
+        return resized
+
+    def open(self, pdf_path: str) -> RenderedDocument:
+        """
+        Prepare a PDF for rendering page by page (see RenderedDocument).
+
+        Each document renders into its own directory under the output folder,
+        so concurrent conversions (threads or worker processes) never
+        overwrite each other's pages. With a shared cache, pages rendered by
+        any worker are reused.
+        """
+        return RenderedDocument(self, pdf_path)
+
     def convert(self, pdf_path: str) -> List[str]:
+        """
+        Render every page of a PDF to PNG.
+
+        Pages are rendered a window at a time, so only RENDER_WINDOW page
+        buffers are in memory at once. Call ``release`` once the pages are no
+        longer needed.
+        """
+        document = None
         try:
-            images = convert_from_path(pdf_path)
-            output_paths = []
-            for i, image in enumerate(images):
-                path = os.path.join(self.output_folder, f"page_{i+1}.png")
-                image.save(path, "PNG")
-                output_paths.append(path)
-            return output_paths
+            document = self.open(pdf_path)
+            return list(document)
+        except PixelBudgetExceeded:
+            if document:
+                document.close()
+            raise
         except Exception as e:
             logging.error(f"PDF conversion failed: {e}")
+            if document:
+                document.close()
             return []
+
+    def release_page(self, image_path: str):
+        """Delete a page image and the images derived from it (e.g. _processed)."""
+        root, _ = os.path.splitext(image_path)
+        prefix = os.path.basename(root)
+        folder = os.path.dirname(image_path)
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return
+        for name in names:
+            if name == os.path.basename(image_path) or name.startswith(prefix + "_"):
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+
+    def release(self, image_paths: List[str]):
+        """Delete the page directories created by ``convert``."""
+        for page_dir in {os.path.dirname(p) for p in image_paths}:
+            if os.path.dirname(os.path.abspath(page_dir)) == os.path.abspath(
+                self.output_folder
+            ):
+                shutil.rmtree(page_dir, ignore_errors=True)
@@ -2,6 +2,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel
 
+from src.models.line_amounts import LineAmounts
+
 
 class InvoiceLineExtracted(BaseModel):
     """Temporary model for AI extraction (without vat_amount)"""
@@ -12,6 +14,20 @@ class InvoiceLineExtracted(BaseModel):
     gross_price: Optional[str] = "0"
     taxes: Optional[str] = "0"
 
+    # Parsed amounts cache (see LineAmounts.of): a slot, not a field
+    __slots__ = ("_amounts",)
+
+    @property
+    def amounts(self) -> LineAmounts:
+        """Numeric fields parsed once into Decimals (see LineAmounts)."""
+        return LineAmounts.of(self)
+
+    def __eq__(self, other) -> bool:
+        # Fields only: the cached amounts are not part of the line's value
+        if type(other) is not type(self):
+            return NotImplemented
+        return dict(self) == dict(other)
+
 
 class InvoiceDataExtracted(BaseModel):
     """Temporary model for AI extraction (without vat_amount in invoice lines)"""
@@ -0,0 +1,100 @@
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from src.utils.vat_calculator import VATCalculator
+
+Source = Tuple[Optional[str], ...]
+
+# Fields parsed on first use; the others are parsed up front
+LAZY_FIELDS = {"gross_price": 2, "taxes": 3}
+
+
+def _source(line) -> Source:
+    return (
+        line.quantity,
+        line.unit_price,
+        line.gross_price,
+        line.taxes,
+        getattr(line, "vat_amount", None),
+    )
+
+
+def _store(line, amounts: "LineAmounts") -> None:
+    # Set the slot directly: pydantic's __setattr__ checks the name against
+    # the model's fields first
+    object.__setattr__(line, "_amounts", amounts)
+
+
+class LineAmounts:
+    """
+    The numeric fields of an invoice line, parsed once into exact Decimals.
+
+    Invoice line models keep their string fields as the public API; this is
+    the parsed form calculations work on. It is cached in the line's
+    ``_amounts`` slot (see ``of``) together with the strings it was parsed
+    from, so it is rebuilt only if one of them is reassigned. Slots are left
+    out of dumps and JSON, and the line models compare their fields only, so
+    caching never changes line equality. quantity, unit_price and vat are
+    parsed up front; gross_price and taxes, which totals don't need, the
+    first time they are read. Missing or unparseable values are None.
+    """
+
+    __slots__ = (
+        "source",
+        "quantity",
+        "unit_price",
+        "vat",
+        "gross_price",
+        "taxes",
+    )
+
+    def __init__(self, source: Source):
+        parse = VATCalculator.parse_amount
+        self.source = source
+        self.quantity = parse(source[0])
+        self.unit_price = parse(source[1])
+        self.vat = parse(source[4])
+
+    def __getattr__(self, name: str):
+        # Only called for lazy fields that have not been parsed yet
+        if name not in LAZY_FIELDS:
+            raise AttributeError(name)
+        value = VATCalculator.parse_amount(self.source[LAZY_FIELDS[name]])
+        setattr(self, name, value)
+        return value
+
+    @classmethod
+    def of(cls, line) -> "LineAmounts":
+        """Parsed amounts of a line model, cached while its fields match."""
+        source = _source(line)
+        # A slot rather than a private attribute: pydantic's lookup of those
+        # costs about as much as the parsing it saves
+        cached = getattr(line, "_amounts", None)
+        if cached is None or cached.source != source:
+            cached = cls(source)
+            _store(line, cached)
+        return cached
+
+    @classmethod
+    def known(
+        cls,
+        line,
+        quantity: Optional[Decimal],
+        unit_price: Optional[Decimal],
+        vat: Optional[Decimal],
+    ) -> "LineAmounts":
+        """Cache amounts already parsed or computed for a new line model."""
+        amounts = cls.__new__(cls)
+        amounts.source = _source(line)
+        amounts.quantity = quantity
+        amounts.unit_price = unit_price
+        amounts.vat = vat
+        _store(line, amounts)
+        return amounts
+
+    @property
+    def net(self) -> Optional[Decimal]:
+        """quantity × unit_price, None when either is missing."""
+        if self.quantity is None or self.unit_price is None:
+            return None
+        return self.quantity * self.unit_price
@@ -2,6 +2,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel
 
+from src.models.line_amounts import LineAmounts
+
 
 # Temporary model for AI extraction (without vat_amount)
 class InvoiceLineExtracted(BaseModel):
@@ -11,6 +13,20 @@ class InvoiceLineExtracted(BaseModel):
     taxes: Optional[str] = "0"
     gross_price: Optional[str] = "0"
 
+    # Parsed amounts cache (see LineAmounts.of): a slot, not a field
+    __slots__ = ("_amounts",)
+
+    @property
+    def amounts(self) -> LineAmounts:
+        """Numeric fields parsed once into Decimals (see LineAmounts)."""
+        return LineAmounts.of(self)
+
+    def __eq__(self, other) -> bool:
+        # Fields only: the cached amounts are not part of the line's value
+        if type(other) is not type(self):
+            return NotImplemented
+        return dict(self) == dict(other)
+
 
 # Final model with calculated vat_amount
 class InvoiceLine(BaseModel):
@@ -21,6 +37,42 @@ class InvoiceLine(BaseModel):
     gross_price: Optional[str] = "0"
     vat_amount: Optional[str] = "0"
 
+    # Parsed amounts cache (see LineAmounts.of): a slot, not a field
+    __slots__ = ("_amounts",)
+
+    @property
+    def amounts(self) -> LineAmounts:
+        """Numeric fields parsed once into Decimals (see LineAmounts)."""
+        return LineAmounts.of(self)
+
+    def __eq__(self, other) -> bool:
+        # Fields only: the cached amounts are not part of the line's value
+        if type(other) is not type(self):
+            return NotImplemented
+        return dict(self) == dict(other)
+
+
+class SkippedPage(BaseModel):
+    page: int  # 1-based page number
+    reason: str  # "blank", "boilerplate" or "after_totals"
+
+
+class FailedPage(BaseModel):
+    page: int  # 1-based page number
+    error: str
+
+
+class ProcessingInfo(BaseModel):
+    pages_total: int = 0
+    pages_processed: int = 0
+    pages_skipped: int = 0
+    skipped_pages: List[SkippedPage] = []
+    pages_failed: int = 0  # pages left out of the result
+    failed_pages: List[FailedPage] = []
+    render_dpi: Optional[int] = None
+    pixels_rendered: int = 0
+    peak_rss_mb: Optional[float] = None  # highest RSS seen while processing
+
 
 class InvoiceData(BaseModel):
     partner: str
@@ -40,6 +92,16 @@ class InvoiceData(BaseModel):
     discount: Optional[str] = "0"
     currency: Optional[str] = ""
     filename: Optional[str] = None
+    processing: Optional[ProcessingInfo] = None
+    duplicate_of: Optional[str] = None  # filename of the identical upload
+
+
+class InvoiceTotals(BaseModel):
+    filename: Optional[str] = None
+    subtotal: str = "0.00"
+    total_vat: str = "0.00"
+    total_amount: str = "0.00"
+    line_count: int = 0
 
 
 class MultipleInvoicesResponse(BaseModel):
@@ -47,3 +109,6 @@ class MultipleInvoicesResponse(BaseModel):
     total_processed: int
     successful_extractions: int
     failed_extractions: int
+    invoice_totals: List[InvoiceTotals] = []  # aligned with invoices
+    batch_totals: Optional[InvoiceTotals] = None  # duplicates counted once
+    deduplicated: int = 0
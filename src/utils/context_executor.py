@@ -0,0 +1,14 @@
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that runs each task in a copy of the submitter's
+    context, so context variables set for a request (e.g. the usage scope)
+    are seen by the threads working on it. asyncio's run_in_executor does
+    not copy the context by itself.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
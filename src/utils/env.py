@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@lru_cache(maxsize=None)
+def load_env() -> bool:
+    """
+    Load environment variables from the .env file.
+
+    Safe to call from every entry point and constructor: the file is only
+    read once per process.
+    """
+    return load_dotenv(dotenv_path=".env")
@@ -0,0 +1,47 @@
+import json
+from decimal import Decimal
+from typing import Any
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used instead
+    orjson = None
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode to compact JSON bytes.
+
+    Models are serialized directly by pydantic without being validated
+    again. Other values (e.g. result dicts holding models) go through
+    orjson when installed, otherwise through the standard library.
+    """
+    if isinstance(obj, BaseModel):
+        return obj.json().encode()
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for content that is already valid.
+
+    Returning it from an endpoint bypasses FastAPI's response_model
+    validation and jsonable_encoder pass, which re-walk every invoice line
+    of a large batch.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,149 @@
+import os
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+try:
+    import h2
+except ImportError:  # optional: HTTP/1.1 keep-alive only without it
+    h2 = None
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def http2_enabled() -> bool:
+    return h2 is not None and os.getenv("HTTP2", "1").lower() in ("1", "true", "yes")
+
+
+def timeout() -> httpx.Timeout:
+    """Connect and read timeouts for provider calls (HTTP_*_TIMEOUT, seconds)."""
+    return httpx.Timeout(
+        _env_float("HTTP_READ_TIMEOUT", 120.0),
+        connect=_env_float("HTTP_CONNECT_TIMEOUT", 10.0),
+    )
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    HTTP transport shared by every provider client in the process, so
+    concurrent calls reuse warm TLS connections instead of each client
+    keeping a pool of its own.
+
+    Clients built on it may close at any time (the genai client closes its
+    httpx client when garbage collected), so ``close`` leaves the pool open;
+    ``shutdown`` closes it. ``stats`` reports pool utilization.
+    """
+
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2_enabled()
+        super().__init__(limits=self.limits, http2=self.http2)
+        self._lock = threading.Lock()
+        self._known = weakref.WeakSet()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return super().handle_request(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                # Connections not seen before were opened for this request
+                for connection in list(self._pool.connections):
+                    if connection not in self._known:
+                        self._known.add(connection)
+                        self.connections_opened += 1
+
+    def close(self):
+        pass  # shared: see shutdown
+
+    def shutdown(self):
+        super().close()
+
+    def stats(self) -> Dict:
+        """Open, busy and idle connections, and how often one was reused."""
+        connections = list(self._pool.connections)
+        idle = sum(1 for c in connections if c.is_idle())
+        with self._lock:
+            requests, opened = self.requests, self.connections_opened
+            in_flight, peak = self.in_flight, self.peak_in_flight
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "in_flight": in_flight,
+            "peak_in_flight": peak,
+            "requests": requests,
+            "connections_opened": opened,
+            "reuse_rate": round(1 - opened / requests, 3) if requests else None,
+        }
+
+
+_transport: Optional[PooledTransport] = None
+_transport_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def shared_transport() -> PooledTransport:
+    """
+    The process-wide transport, configured from HTTP_MAX_CONNECTIONS
+    (default 32), HTTP_MAX_KEEPALIVE (16), HTTP_KEEPALIVE_EXPIRY (60 s) and
+    HTTP2 (on when the h2 package is installed).
+    """
+    global _transport, _transport_pid
+    with _lock:
+        # Connections must not be shared with a forked worker
+        if _transport is None or _transport_pid != os.getpid():
+            _transport = PooledTransport(
+                max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "32")),
+                max_keepalive=int(os.getenv("HTTP_MAX_KEEPALIVE", "16")),
+                keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 60.0),
+            )
+            _transport_pid = os.getpid()
+        return _transport
+
+
+def pool_stats() -> Optional[Dict]:
+    """Stats of the shared transport, None if no client has used it yet."""
+    if _transport is None or _transport_pid != os.getpid():
+        return None
+    return _transport.stats()
+
+
+def genai_http_options():
+    """HttpOptions that route a genai.Client through the shared transport."""
+    from google.genai import types
+
+    limits = timeout()
+    return types.HttpOptions(
+        # genai sends this per request, as a single timeout in milliseconds
+        timeout=int(limits.read * 1000),
+        client_args={"transport": shared_transport()},
+    )
+
+
+def openai_http_client():
+    """httpx client for openai.OpenAI that uses the shared transport."""
+    import openai
+
+    return openai.DefaultHttpxClient(transport=shared_transport(), timeout=timeout())
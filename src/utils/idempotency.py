@@ -0,0 +1,393 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.usage import tenant_of
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    expires_at REAL,
+    status_code INTEGER,
+    headers TEXT,
+    body BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires_at);
+"""
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+# Request bodies are buffered in memory up to this size, then on disk
+SPOOL_BYTES = 1024 * 1024
+
+# Outcomes of IdempotencyStore.begin
+RUN, REPLAY, WAIT, CONFLICT = "run", "replay", "wait", "conflict"
+
+
+class StoredResponse:
+    __slots__ = ("status_code", "headers", "body")
+
+    def __init__(self, status_code: int, headers: List[List[str]], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+class IdempotencyStore:
+    """
+    Idempotency keys and the responses they produced, in a local SQLite file
+    shared by all worker processes.
+
+    A key is claimed by the request that runs first. The claim is a lease
+    the owner renews while it works, so a key held by a crashed worker can
+    be taken over once the lease runs out. The finished response is kept
+    for ``ttl`` seconds.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 24 * 3600):
+        self.path = path or os.getenv("IDEMPOTENCY_DB_PATH", "idempotency.db")
+        self.ttl = ttl
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def begin(
+        self, key: str, fingerprint: str, owner: str, lease: float
+    ) -> Tuple[str, Optional[StoredResponse]]:
+        """
+        Claim key for owner unless it is already taken.
+
+        Returns:
+            (RUN, None) if owner now holds the key,
+            (REPLAY, response) if a response is stored for it,
+            (WAIT, None) if another request holding it is still running,
+            (CONFLICT, None) if it was used for a different request
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM idempotency WHERE expires_at < ?", (now,))
+            row = conn.execute(
+                "SELECT fingerprint, lease_until, status_code, headers, body "
+                "FROM idempotency WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is not None and row[0] != fingerprint:
+                outcome = CONFLICT, None
+            elif row is not None and row[2] is not None:
+                outcome = REPLAY, StoredResponse(row[2], json.loads(row[3]), row[4])
+            elif row is not None and row[1] >= now:
+                outcome = WAIT, None
+            else:
+                # New key, or its owner stopped renewing the lease
+                conn.execute(
+                    "INSERT OR REPLACE INTO idempotency "
+                    "(key, fingerprint, owner, lease_until) VALUES (?, ?, ?, ?)",
+                    (key, fingerprint, owner, now + lease),
+                )
+                outcome = RUN, None
+            conn.execute("COMMIT")
+            return outcome
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def renew(self, key: str, owner: str, lease: float):
+        self._connection().execute(
+            "UPDATE idempotency SET lease_until = ? "
+            "WHERE key = ? AND owner = ? AND status_code IS NULL",
+            (time.time() + lease, key, owner),
+        )
+
+    def complete(self, key: str, owner: str, response: StoredResponse):
+        """Store the response of a finished request for ``ttl`` seconds."""
+        self._connection().execute(
+            "UPDATE idempotency SET status_code = ?, headers = ?, body = ?, "
+            "expires_at = ?, lease_until = NULL WHERE key = ? AND owner = ?",
+            (
+                response.status_code,
+                json.dumps(response.headers),
+                response.body,
+                time.time() + self.ttl,
+                key,
+                owner,
+            ),
+        )
+
+    def release(self, key: str, owner: str):
+        """Drop an unfinished claim so the next request with the key runs."""
+        self._connection().execute(
+            "DELETE FROM idempotency "
+            "WHERE key = ? AND owner = ? AND status_code IS NULL",
+            (key, owner),
+        )
+
+
+class IdempotencyMiddleware:
+    """
+    Honour an ``Idempotency-Key`` header on POSTs to ``paths``.
+
+    The first request with a key runs normally and its response is stored.
+    A retry with the same key while that request is still running waits for
+    it (in this worker or another) and gets the same response, as does any
+    retry within ``ttl`` seconds after. Responses are replayed byte for byte
+    with an ``Idempotent-Replayed: true`` header. Server errors (5xx) are
+    not stored, so a retry after one runs again.
+
+    Keys are scoped to the tenant (see usage.tenant_of) and the endpoint.
+    Reusing a key with a different query string or body gets 422. The
+    multipart boundary is left out of the comparison, since it changes
+    between attempts even when the files do not. The body is read in full
+    before the request runs, so it can be fingerprinted.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str],
+        path: Optional[str] = None,
+        ttl: float = 24 * 3600,
+        lease: float = 30.0,
+        poll_interval: float = 0.25,
+        max_response_bytes: int = 20 * 1024 * 1024,
+    ):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_response_bytes = max_response_bytes
+        self._store: Optional[IdempotencyStore] = None
+        # Requests running in this worker, so retries wait without polling
+        self._running: Dict[str, asyncio.Event] = {}
+
+    @property
+    def store(self) -> IdempotencyStore:
+        # Created on the first keyed request, not when the app is imported
+        if self._store is None:
+            self._store = IdempotencyStore(self.path, self.ttl)
+        return self._store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_error(
+                send,
+                400,
+                f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters",
+            )
+            return
+
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        try:
+            digest = hashlib.sha256(
+                scope["path"].encode() + b"?" + scope.get("query_string", b"")
+            )
+            if not await _read_body(receive, body, digest, _boundary(headers)):
+                return  # client disconnected
+            key = f"{tenant_of(headers)}:{scope['path']}:{key}"
+            fingerprint = digest.hexdigest()
+            owner = uuid.uuid4().hex
+            loop = asyncio.get_running_loop()
+
+            while True:
+                outcome, stored = await loop.run_in_executor(
+                    None, self.store.begin, key, fingerprint, owner, self.lease
+                )
+                if outcome == RUN:
+                    break
+                if outcome == REPLAY:
+                    await _replay(send, stored)
+                    return
+                if outcome == CONFLICT:
+                    detail = "Idempotency-Key was already used for a "
+                    await _send_error(send, 422, detail + "different request")
+                    return
+                running = self._running.get(key)
+                if running is not None:
+                    await running.wait()
+                else:
+                    await asyncio.sleep(self.poll_interval)
+
+            body.seek(0)
+            replay = _replay_body(body, receive)
+            await self._run(scope, replay, send, key, owner)
+        finally:
+            body.close()
+
+    async def _run(self, scope: Scope, receive: Receive, send: Send, key, owner):
+        loop = asyncio.get_running_loop()
+        done = self._running[key] = asyncio.Event()
+        renewing = asyncio.ensure_future(self._renew(key, owner))
+        start: Dict = {}
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture(message: Message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body" and size >= 0:
+                body = message.get("body", b"")
+                size += len(body)
+                if size > self.max_response_bytes:
+                    size = -1  # too large to keep
+                    chunks.clear()
+                else:
+                    chunks.append(body)
+            await send(message)
+
+        stored = None
+        try:
+            await self.app(scope, receive, capture)
+            if start and start["status"] < 500 and size >= 0:
+                stored = StoredResponse(
+                    start["status"],
+                    [
+                        [name.decode("latin-1"), value.decode("latin-1")]
+                        for name, value in start.get("headers", [])
+                    ],
+                    b"".join(chunks),
+                )
+        finally:
+            renewing.cancel()
+            if stored is not None:
+                await loop.run_in_executor(
+                    None, self.store.complete, key, owner, stored
+                )
+            else:
+                await loop.run_in_executor(None, self.store.release, key, owner)
+            self._running.pop(key, None)
+            done.set()
+
+    async def _renew(self, key: str, owner: str):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await loop.run_in_executor(None, self.store.renew, key, owner, self.lease)
+
+
+def _boundary(headers: Headers) -> bytes:
+    """The multipart boundary of a request, b"" if it has none."""
+    content_type = headers.get("content-type", "")
+    if not content_type.lower().startswith("multipart/"):
+        return b""
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary":
+            return value.strip('"').encode("latin-1")
+    return b""
+
+
+async def _read_body(receive: Receive, body, digest, boundary: bytes) -> bool:
+    """
+    Copy the request body into body and add it to digest, leaving out every
+    occurrence of boundary. False if the client disconnected first.
+    """
+    pending = b""
+    # Bytes that may be the start of a boundary split across two chunks
+    held = max(len(boundary) - 1, 0)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return False
+        chunk = message.get("body", b"")
+        body.write(chunk)
+        pending += chunk
+        if boundary:
+            pending = pending.replace(boundary, b"")
+        more = message.get("more_body", False)
+        cut = len(pending) - held if more else len(pending)
+        if cut > 0:
+            digest.update(pending[:cut])
+            pending = pending[cut:]
+        if not more:
+            return True
+
+
+def _replay_body(body, receive: Receive) -> Receive:
+    """A receive callable that hands out the buffered body, then defers."""
+    done = False
+
+    async def replay() -> Message:
+        nonlocal done
+        if done:
+            return await receive()
+        chunk = body.read(SPOOL_BYTES)
+        done = len(chunk) < SPOOL_BYTES
+        return {"type": "http.request", "body": chunk, "more_body": not done}
+
+    return replay
+
+
+async def _replay(send: Send, stored: StoredResponse):
+    headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in stored.headers
+    ]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send(
+        {
+            "type": "http.response.start",
+            "status": stored.status_code,
+            "headers": headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": stored.body})
+
+
+async def _send_error(send: Send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
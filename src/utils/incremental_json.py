@@ -0,0 +1,164 @@
+import json
+from typing import Any, Collection, List, Optional, Tuple
+
+Event = Tuple  # ("member", key, value) or ("item", key, index, value)
+
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON object while its text is still arriving.
+
+    ``feed`` takes the next chunk of text and returns what became complete
+    in it:
+
+        ("member", key, value)        a top-level member, once its whole
+                                      value has arrived
+        ("item", key, index, value)   an element of a top-level array, as
+                                      soon as the element is complete,
+                                      before the array itself is
+
+    Array elements are reported for the keys in ``item_keys`` (every array
+    when None). Text before the opening brace, such as a code fence, is
+    skipped, as is anything after the closing one. ``text`` holds everything
+    fed so far; ``document`` is the object's own text, for parsing the
+    finished object as a whole.
+    """
+
+    def __init__(self, item_keys: Optional[Collection[str]] = None):
+        self.item_keys = item_keys
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        self._begin: Optional[int] = None
+        self._end: Optional[int] = None
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        # Start offset and kind ("string", "container", "scalar") of the
+        # value open at depth 1 (a member) and depth 2 (an array element),
+        # indexed by depth
+        self._starts: List[Optional[Tuple[int, str]]] = [None, None, None]
+        self._index = 0
+
+    @property
+    def document(self) -> str:
+        """The object's text, from its opening brace to its close if seen."""
+        if self._begin is None:
+            return ""
+        begin, end = self._begin, self._end
+        return self.text[begin:end]
+
+    def feed(self, chunk: str) -> List[Event]:
+        events: List[Event] = []
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self._done:
+                break
+            self._step(text, i, text[i], events)
+        self._pos = len(text)
+        return events
+
+    def _step(self, text: str, i: int, c: str, events: List[Event]):
+        depth = len(self._stack)
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                self._end_string(text, i, depth, events)
+            return
+
+        if depth == 0:
+            if c == "{":
+                self._begin = i
+                self._stack.append(c)
+                self._expect_key = True
+            return  # anything before the object is ignored
+
+        if c == '"':
+            self._in_string = True
+            if not (depth == 1 and self._expect_key):
+                self._start(depth, i, "string")
+            else:
+                self._key_start = i
+        elif c in "{[":
+            self._start(depth, i, "container")
+            self._stack.append(c)
+        elif c in "}]":
+            self._end_scalar(text, i, depth, events)
+            self._stack.pop()
+            if not self._stack:
+                self._done = True
+                self._end = i + 1
+                return
+            self._end_container(text, i, depth - 1, events)
+        elif c == ",":
+            self._end_scalar(text, i, depth, events)
+            if depth == 1:
+                self._expect_key = True
+        elif c == ":":
+            if depth == 1:
+                self._expect_key = False
+        elif c in WHITESPACE:
+            self._end_scalar(text, i, depth, events)
+        else:
+            self._start(depth, i, "scalar")
+
+    def _tracked(self, depth: int) -> bool:
+        if depth == 1:
+            return True
+        return (
+            depth == 2
+            and self._stack[1] == "["
+            and (self.item_keys is None or self._key in self.item_keys)
+        )
+
+    def _start(self, depth: int, i: int, kind: str):
+        if depth <= 2 and self._starts[depth] is None and self._tracked(depth):
+            self._starts[depth] = (i, kind)
+            if depth == 1 and kind == "container":
+                self._index = 0
+
+    def _end_string(self, text: str, i: int, depth: int, events: List[Event]):
+        if depth == 1 and self._key_start is not None:
+            start, end = self._key_start, i + 1
+            self._key = json.loads(text[start:end])
+            self._key_start = None
+        elif depth <= 2 and self._kind(depth) == "string":
+            self._complete(depth, text, i + 1, events)
+
+    def _end_container(
+        self,
+        text: str,
+        i: int,
+        depth: int,
+        events: List[Event],
+    ):
+        if depth <= 2 and self._kind(depth) == "container":
+            self._complete(depth, text, i + 1, events)
+
+    def _end_scalar(self, text: str, i: int, depth: int, events: List[Event]):
+        if depth <= 2 and self._kind(depth) == "scalar":
+            self._complete(depth, text, i, events)
+
+    def _kind(self, depth: int) -> Optional[str]:
+        start = self._starts[depth]
+        return start[1] if start else None
+
+    def _complete(self, depth: int, text: str, end: int, events: List[Event]):
+        start = self._starts[depth][0]
+        value: Any = json.loads(text[start:end])
+        self._starts[depth] = None
+        if depth == 1:
+            events.append(("member", self._key, value))
+        else:
+            events.append(("item", self._key, self._index, value))
+            self._index += 1
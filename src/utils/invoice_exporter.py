@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator
+
+from src.utils.sqlite_storage import INVOICE_COLUMNS, LINE_COLUMNS
+
+EXPORT_COLUMNS = (
+    ["invoice_id", "extraction_date"] + INVOICE_COLUMNS + ["line_no"] + LINE_COLUMNS
+)
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class InvoiceExporter:
+    """
+    Streams flattened invoice rows (one per invoice line) in bulk formats.
+
+    Every format is produced incrementally from an iterator of rows:
+    NDJSON and CSV are encoded chunk by chunk, Parquet is written in
+    row-group batches and XLSX uses openpyxl's write-only workbook. Parquet
+    and XLSX need a seekable file, so they are written to a temporary file
+    that is streamed back and deleted. Memory use is bounded by the batch
+    size, not by the number of rows.
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def content_type(fmt: str) -> str:
+        return EXPORT_FORMATS[fmt][0]
+
+    @staticmethod
+    def extension(fmt: str) -> str:
+        return EXPORT_FORMATS[fmt][1]
+
+    def stream(self, rows: Iterable[Dict], fmt: str) -> Iterator[bytes]:
+        """
+        Encode rows in the requested format.
+
+        Args:
+            rows: Flattened rows, e.g. from ``SQLiteInvoiceStorage.iter_rows``
+            fmt: One of "ndjson", "csv", "parquet", "xlsx"
+
+        Returns:
+            Iterator of encoded byte chunks
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(
+                f"Unknown export format: {fmt}. Available: {list(EXPORT_FORMATS)}"
+            )
+        if fmt == "parquet":
+            self._require("pyarrow")
+        elif fmt == "xlsx":
+            self._require("openpyxl")
+        return getattr(self, f"_stream_{fmt}")(rows)
+
+    @staticmethod
+    def _require(module: str):
+        try:
+            __import__(module)
+        except ImportError:
+            raise ValueError(f"Export format requires the '{module}' package")
+
+    def _batches(self, rows: Iterable[Dict]) -> Iterator[list]:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _stream_ndjson(self, rows: Iterable[Dict]) -> Iterator[bytes]:
+        for batch in self._batches(rows):
+            yield "".join(
+                json.dumps(row, ensure_ascii=False) + "\n" for row in batch
+            ).encode("utf-8")
+
+    def _stream_csv(self, rows: Iterable[Dict]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for batch in self._batches(rows):
+            writer.writerows(batch)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _stream_file(self, write, rows: Iterable[Dict], suffix: str):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            write(rows, path)
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+
+    def write_parquet(self, rows: Iterable[Dict], path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema(
+            [
+                (c, pa.int64() if c in ("invoice_id", "line_no") else pa.string())
+                for c in EXPORT_COLUMNS
+            ]
+        )
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in self._batches(rows):
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+    def write_xlsx(self, rows: Iterable[Dict], path: str):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("invoices")
+        sheet.append(EXPORT_COLUMNS)
+        for row in rows:
+            sheet.append([row.get(c) for c in EXPORT_COLUMNS])
+        workbook.save(path)
+
+    def _stream_parquet(self, rows: Iterable[Dict]) -> Iterator[bytes]:
+        return self._stream_file(self.write_parquet, rows, ".parquet")
+
+    def _stream_xlsx(self, rows: Iterable[Dict]) -> Iterator[bytes]:
+        return self._stream_file(self.write_xlsx, rows, ".xlsx")
+
+    def export(self, rows: Iterable[Dict], fmt: str, path: str):
+        """Write rows to ``path`` in the requested format."""
+        if fmt == "parquet":
+            self._require("pyarrow")
+            self.write_parquet(rows, path)
+        elif fmt == "xlsx":
+            self._require("openpyxl")
+            self.write_xlsx(rows, path)
+        else:
+            with open(path, "wb") as f:
+                for chunk in self.stream(rows, fmt):
+                    f.write(chunk)
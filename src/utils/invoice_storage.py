@@ -2,11 +2,13 @@ import json
 import logging
 import os
 from datetime import datetime
-
-import pandas as pd
+from typing import TYPE_CHECKING
 
 from models import InvoiceData
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class InvoiceStorage:
     def __init__(self, file_path: str):
@@ -27,16 +29,22 @@ class InvoiceStorage:
         ]
 
     def _create_empty_file(self):
+        import pandas as pd
+
         df = pd.DataFrame(columns=self.columns)
         df.to_excel(self.file_path, index=False, engine="openpyxl")
 
-    def load(self) -> pd.DataFrame:
+    def load(self) -> "pd.DataFrame":
+        import pandas as pd
+
         if not os.path.exists(self.file_path):
             self._create_empty_file()
         df = pd.read_excel(self.file_path, engine="openpyxl")
         return df
 
     def save(self, invoice: InvoiceData) -> bool:
+        import pandas as pd
+
         df = self.load()
         if invoice.invoice_no in df["invoice_no"].values:
             return False
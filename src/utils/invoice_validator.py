@@ -0,0 +1,103 @@
+import re
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Union
+
+from pydantic import BaseModel
+
+from src.utils.vat_calculator import VATCalculator
+
+VAT_NUMBER_PATTERN = re.compile(r"\d{15}")
+CR_NUMBER_PATTERN = re.compile(r"[A-Za-z0-9]{10}")
+
+# Allowed difference between quantity × unit_price and the extracted gross price
+LINE_TOLERANCE = Decimal("0.01")
+
+
+class InvoiceValidator:
+    """
+    Local consistency checks for extracted invoice data.
+
+    Empty values count as "not present on the document" and pass; only
+    values that are present but malformed fail. This keeps receipts without
+    a VAT or CR number from being flagged on every extraction.
+    """
+
+    @staticmethod
+    def _present(value) -> bool:
+        return isinstance(value, str) and value.strip() != ""
+
+    @classmethod
+    def valid_vat_number(cls, value: str) -> bool:
+        """The VAT registration number must be exactly 15 digits."""
+        return not cls._present(value) or bool(
+            VAT_NUMBER_PATTERN.fullmatch(value.strip())
+        )
+
+    @classmethod
+    def valid_cr_number(cls, value: str) -> bool:
+        """The commercial registration number must be 10 alphanumeric characters."""
+        return not cls._present(value) or bool(
+            CR_NUMBER_PATTERN.fullmatch(value.strip())
+        )
+
+    @classmethod
+    def valid_date(cls, value: str, date_format: str = "%Y-%m-%d") -> bool:
+        """The date must parse in the expected format (ISO by default)."""
+        if not cls._present(value):
+            return True
+        try:
+            datetime.strptime(value.strip(), date_format)
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def valid_line(line: Dict) -> bool:
+        """quantity × unit_price must match the gross price when one is given."""
+        gross = VATCalculator.clean_numeric_value(line.get("gross_price") or "")
+        if not gross:
+            return True
+        qty = VATCalculator.clean_numeric_value(line.get("quantity") or "")
+        price = VATCalculator.clean_numeric_value(line.get("unit_price") or "")
+        if qty is None or price is None:
+            return False
+        difference = abs(qty * price - gross)
+        return difference <= max(LINE_TOLERANCE, abs(gross) * Decimal("0.01"))
+
+    @classmethod
+    def invalid_fields(
+        cls, data: Union[BaseModel, Dict], date_format: str = "%Y-%m-%d"
+    ) -> List[str]:
+        """
+        Return the names of fields that fail their check.
+
+        Only fields present in ``data`` are checked, so the same validator
+        works for full invoices and for custom field sets. Inconsistent
+        invoice lines are reported as ``invoice_lines[<index>]``.
+
+        Args:
+            data: Extracted invoice (model or dict)
+            date_format: Expected format of invoice_bill_date
+
+        Returns:
+            Names of invalid fields, empty if everything passes
+        """
+        if isinstance(data, BaseModel):
+            data = data.dict()
+
+        invalid = []
+        if "vat_number" in data and not cls.valid_vat_number(data["vat_number"]):
+            invalid.append("vat_number")
+        if "cr_number" in data and not cls.valid_cr_number(data["cr_number"]):
+            invalid.append("cr_number")
+        if "invoice_bill_date" in data and not cls.valid_date(
+            data["invoice_bill_date"], date_format
+        ):
+            invalid.append("invoice_bill_date")
+
+        for i, line in enumerate(data.get("invoice_lines") or []):
+            if isinstance(line, dict) and not cls.valid_line(line):
+                invalid.append(f"invoice_lines[{i}]")
+
+        return invalid
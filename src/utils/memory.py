@@ -0,0 +1,30 @@
+import resource
+import sys
+from typing import Optional
+
+
+def _status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (None where unavailable)."""
+    kb = _status_kb("VmRSS")
+    return round(kb / 1024, 1) if kb is not None else None
+
+
+def peak_rss_mb() -> float:
+    """Highest resident set size of this process so far, in MB."""
+    kb = _status_kb("VmHWM")
+    if kb is None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        kb = maxrss / 1024 if sys.platform == "darwin" else maxrss
+    return round(kb / 1024, 1)
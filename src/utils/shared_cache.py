@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at);
+"""
+
+# Cache files created before the byte budget have no size column
+ADD_SIZE = """
+ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0;
+UPDATE cache SET size = length(value);
+"""
+
+# Drop the least recently used entries beyond max_entries or max_bytes
+EVICT = """
+DELETE FROM cache WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid,
+               ROW_NUMBER() OVER recent AS position,
+               SUM(size) OVER recent AS kept
+        FROM cache
+        WINDOW recent AS (ORDER BY accessed_at DESC)
+    )
+    WHERE position > ? OR kept > ?
+)
+"""
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SharedCache:
+    """
+    Key/value cache in a local SQLite file shared by all worker processes.
+
+    Entries live in namespaces (e.g. "pages", "results") and expire after
+    ``ttl`` seconds. When the cache holds more than ``max_entries`` entries
+    or ``max_bytes`` of values (SHARED_CACHE_MAX_BYTES, default 1 GB), the
+    least recently used entries are evicted. Page images make up most of
+    the bytes, so the byte budget is usually the one that applies.
+    Connections are opened per thread and never carried across a fork, so
+    the cache can be created in a pre-fork master and used from every
+    worker.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = 24 * 3600,
+        max_entries: int = 10000,
+        max_bytes: Optional[int] = None,
+    ):
+        self.path = path or os.getenv("SHARED_CACHE_PATH", "cache.db")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes or int(
+            os.getenv("SHARED_CACHE_MAX_BYTES", str(1024**3))
+        )
+        self._local = threading.local()
+        self._writes = 0
+        self._written = 0  # bytes set since the last eviction check
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(cache)")]
+        if "size" not in columns:
+            conn.executescript(ADD_SIZE)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < now:
+            self.delete(namespace, key)
+            return None
+        conn.execute(
+            "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, namespace, key),
+        )
+        return value
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: bytes,
+        ttl: Optional[float] = None,
+    ):
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache "
+            "(namespace, key, value, size, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, value, len(value), expires_at, now),
+        )
+        self._writes += 1
+        self._written += len(value)
+        # Checked every 100 writes, and sooner when large values come in
+        if self._writes % 100 == 0 or self._written > self.max_bytes // 20:
+            self._written = 0
+            self._evict(conn)
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def _evict(self, conn: sqlite3.Connection):
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        conn.execute(EVICT, (self.max_entries, self.max_bytes))
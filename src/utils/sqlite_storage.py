@@ -0,0 +1,309 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from src.models.models import InvoiceData
+
+INVOICE_COLUMNS = [
+    "partner",
+    "vat_number",
+    "cr_number",
+    "street",
+    "street2",
+    "country",
+    "email",
+    "city",
+    "mobile",
+    "invoice_type",
+    "invoice_bill_date",
+    "reference",
+    "detected_language",
+    "discount",
+    "currency",
+    "filename",
+]
+
+# Unique key of an invoice. Empty values are stored as NULL so invoices
+# without a reference or VAT number never collide with each other.
+KEY_COLUMNS = ("reference", "vat_number")
+
+LINE_COLUMNS = [
+    "product",
+    "quantity",
+    "unit_price",
+    "taxes",
+    "gross_price",
+    "vat_amount",
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    extraction_date TEXT NOT NULL,
+    {", ".join(f"{c} TEXT" for c in INVOICE_COLUMNS)},
+    lines_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_reference_vat
+    ON invoices (reference, vat_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_bill_date ON invoices (invoice_bill_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_partner ON invoices (partner);
+CREATE TABLE IF NOT EXISTS invoice_lines (
+    invoice_id INTEGER NOT NULL REFERENCES invoices (id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    {", ".join(f"{c} TEXT" for c in LINE_COLUMNS)},
+    PRIMARY KEY (invoice_id, line_no)
+);
+"""
+
+
+class SQLiteInvoiceStorage:
+    """
+    Indexed SQLite store for ``src.models.models.InvoiceData``.
+
+    Inserts are O(log n): duplicates are rejected by the unique index on
+    (reference, vat_number) instead of scanning the table. The database runs
+    in WAL mode with a busy timeout and every write takes the write lock up
+    front (BEGIN IMMEDIATE), so several threads or worker processes can write
+    to the same file concurrently.
+
+    ``save`` writes synchronously. ``enqueue`` hands the invoice to a
+    background writer that commits queued invoices in batches of up to
+    ``batch_size`` or every ``flush_interval`` seconds, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+    ):
+        self.db_path = db_path or os.getenv("INVOICE_DB_PATH", "invoices.db")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue: "queue.Queue[Optional[InvoiceData]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        # SQLite connections must not be used across a fork
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, invoice: InvoiceData, now: str) -> bool:
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO invoices (extraction_date, "
+            f"{', '.join(INVOICE_COLUMNS)}, lines_count) "
+            f"VALUES (?, {', '.join('?' for _ in INVOICE_COLUMNS)}, ?)",
+            [now]
+            + [
+                (
+                    (getattr(invoice, c) or "").strip() or None
+                    if c in KEY_COLUMNS
+                    else getattr(invoice, c)
+                )
+                for c in INVOICE_COLUMNS
+            ]
+            + [len(invoice.invoice_lines)],
+        )
+        if cursor.rowcount == 0:
+            return False
+
+        invoice_id = cursor.lastrowid
+        conn.executemany(
+            f"INSERT INTO invoice_lines (invoice_id, line_no, "
+            f"{', '.join(LINE_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in LINE_COLUMNS)})",
+            [
+                [invoice_id, line_no] + [getattr(line, c) for c in LINE_COLUMNS]
+                for line_no, line in enumerate(invoice.invoice_lines, 1)
+            ],
+        )
+        return True
+
+    def save_many(self, invoices: Iterable[InvoiceData]) -> List[bool]:
+        """
+        Insert invoices in a single transaction.
+
+        Returns:
+            One flag per invoice; False means it was a duplicate
+        """
+        conn = self._connection()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = [self._insert(conn, invoice, now) for invoice in invoices]
+            conn.execute("COMMIT")
+            return results
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def save(self, invoice: InvoiceData) -> bool:
+        """Insert one invoice; returns False if it is already stored."""
+        return self.save_many([invoice])[0]
+
+    def exists(self, reference: str, vat_number: str) -> bool:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT 1 FROM invoices WHERE reference = ? AND vat_number = ?",
+                (reference, vat_number),
+            )
+            .fetchone()
+        )
+        return row is not None
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+    def iter_rows(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        partner: Optional[str] = None,
+        fetch_size: int = 1000,
+    ) -> Iterator[Dict]:
+        """
+        Stream stored invoices flattened to one row per invoice line.
+
+        Filters are applied in SQL: ``date_from``/``date_to`` are inclusive
+        YYYY-MM-DD bounds on ``invoice_bill_date`` and ``partner`` is an exact
+        match. Rows are fetched ``fetch_size`` at a time, so memory stays
+        constant regardless of how many rows match. Invoices without lines
+        yield a single row with empty line fields.
+        """
+        where = []
+        params = []
+        if date_from:
+            where.append("i.invoice_bill_date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("i.invoice_bill_date <= ?")
+            params.append(date_to)
+        if partner:
+            where.append("i.partner = ?")
+            params.append(partner)
+
+        query = (
+            f"SELECT i.id AS invoice_id, i.extraction_date, "
+            f"{', '.join('i.' + c for c in INVOICE_COLUMNS)}, l.line_no, "
+            f"{', '.join('l.' + c for c in LINE_COLUMNS)} "
+            f"FROM invoices i LEFT JOIN invoice_lines l ON l.invoice_id = i.id "
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY i.id, l.line_no"
+        )
+
+        # A dedicated connection: streaming consumers may resume the
+        # generator from a different thread than the one that started it.
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            columns = [d[0] for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            conn.close()
+
+    def enqueue(self, invoice: InvoiceData):
+        """Queue an invoice for the background batch writer."""
+        self._ensure_writer()
+        self._queue.put(invoice)
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._write_behind, name="invoice-writer", daemon=True
+                )
+                self._writer.start()
+
+    def _write_behind(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Collect more invoices until the batch is full or the window closes
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                remaining = deadline - time.monotonic()
+                if stop or len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write_batch(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+
+    def _write_batch(self, batch: List[InvoiceData]):
+        try:
+            self.save_many(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logging.error(
+                    f"Write-behind of invoice {batch[0].reference} failed: {e}"
+                )
+                return
+        # The batch was rolled back: write its invoices one at a time, so only
+        # the ones that fail again are dropped
+        for invoice in batch:
+            try:
+                self.save(invoice)
+            except Exception as e:
+                logging.error(
+                    f"Write-behind of invoice {invoice.reference} failed: {e}"
+                )
+
+    def flush(self):
+        """Block until every queued invoice has been written."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        """Flush pending writes and stop the background writer."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,559 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cluster_workers (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    registered_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    stolen INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cluster_jobs (
+    id TEXT PRIMARY KEY,
+    pdf_path TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cluster_tasks (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    started INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cluster_tasks_status
+    ON cluster_tasks (status, worker_id);
+CREATE INDEX IF NOT EXISTS idx_cluster_tasks_job ON cluster_tasks (job_id);
+"""
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class TaskQueue:
+    """
+    Page tasks shared between a coordinator and the workers that pull them.
+
+    The coordinator ``submit``s one task per page of a document and reads
+    the outcomes back with ``results``. Workers ``register``, send a
+    ``heartbeat`` every few seconds, ``lease`` tasks (up to the number they
+    can hold), claim each one with ``start`` just before working on it, and
+    post the outcome with ``complete``.
+
+    A worker with nothing left to lease steals half of the leased but not
+    yet started tasks of the worker holding the most; ``start`` tells the
+    original holder that a task was taken, so no page is extracted twice.
+    Tasks of a worker that misses its heartbeats, or that run past the task
+    timeout, go back to the queue, up to ``max_attempts`` dispatches.
+
+    State is kept in SQLite, so every API worker process on the coordinator
+    host sees the same queue.
+
+    Configuration (environment):
+        CLUSTER_DB_PATH             queue database, default cluster.db
+        CLUSTER_HEARTBEAT_INTERVAL  seconds between worker heartbeats,
+                                    default 2
+        CLUSTER_HEARTBEAT_TIMEOUT   seconds without a heartbeat before a
+                                    worker is considered lost, default 10
+        CLUSTER_TASK_TIMEOUT        seconds a task may stay with a worker,
+                                    default 300
+        CLUSTER_MAX_ATTEMPTS        dispatches of a task before it fails,
+                                    default 3
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        heartbeat_interval: Optional[float] = None,
+        heartbeat_timeout: Optional[float] = None,
+        task_timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        poll_interval: float = 0.2,
+    ):
+        self.db_path = db_path or os.getenv("CLUSTER_DB_PATH", "cluster.db")
+        self.heartbeat_interval = heartbeat_interval or _env_float(
+            "CLUSTER_HEARTBEAT_INTERVAL", 2.0
+        )
+        self.heartbeat_timeout = heartbeat_timeout or _env_float(
+            "CLUSTER_HEARTBEAT_TIMEOUT", 10.0
+        )
+        self.task_timeout = task_timeout or _env_float(
+            "CLUSTER_TASK_TIMEOUT",
+            300.0,
+        )
+        attempts = os.getenv("CLUSTER_MAX_ATTEMPTS", "3")
+        self.max_attempts = max_attempts or int(attempts)
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # SQLite connections must not be used across a fork
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, work):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn, time.time())
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Workers
+
+    def register(self, name: str, capacity: int) -> str:
+        """Add a worker; returns its id."""
+        worker_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO cluster_workers "
+            "(id, name, capacity, registered_at, last_seen) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (worker_id, name, max(1, capacity), now, now),
+        )
+        logging.info(f"Worker {name} ({worker_id}) registered")
+        return worker_id
+
+    def heartbeat(self, worker_id: str) -> bool:
+        """
+        Mark a worker alive; False if it is unknown (lost) and must register.
+        """
+        cursor = self._connection().execute(
+            "UPDATE cluster_workers SET last_seen = ? WHERE id = ?",
+            (time.time(), worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def lease(self, worker_id: str, max_tasks: int) -> Optional[List[Dict]]:
+        """
+        Hand up to max_tasks tasks to a worker: queued ones first, then
+        tasks stolen from the busiest worker.
+
+        Returns:
+            The tasks ({"task_id", "job_id", "page", "options"}), or None if
+            the worker is unknown
+        """
+
+        def lease(conn: sqlite3.Connection, now: float):
+            self._reap(conn, now)
+            if not conn.execute(
+                "UPDATE cluster_workers SET last_seen = ? WHERE id = ?",
+                (now, worker_id),
+            ).rowcount:
+                return None
+
+            rows = conn.execute(
+                "SELECT id FROM cluster_tasks WHERE status = 'pending' "
+                "ORDER BY id LIMIT ?",
+                (max_tasks,),
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            if ids:
+                conn.execute(
+                    f"UPDATE cluster_tasks SET status = 'leased', "
+                    f"worker_id = ?, started = 0, lease_until = ?, "
+                    f"attempts = attempts + 1 "
+                    f"WHERE id IN ({self._placeholders(ids)})",
+                    [worker_id, now + self.task_timeout] + ids,
+                )
+
+            wanted = max_tasks - len(ids)
+            if wanted > 0:
+                stolen = self._steal(conn, now, worker_id, wanted)
+                ids += stolen
+
+            if not ids:
+                return []
+            return [
+                {
+                    "task_id": task_id,
+                    "job_id": job_id,
+                    "page": page,
+                    "options": json.loads(options),
+                }
+                for task_id, job_id, page, options in conn.execute(
+                    f"SELECT id, job_id, page, options FROM cluster_tasks "
+                    f"WHERE id IN ({self._placeholders(ids)}) ORDER BY id",
+                    ids,
+                )
+            ]
+
+        return self._transaction(lease)
+
+    def _steal(
+        self, conn: sqlite3.Connection, now: float, worker_id: str, wanted: int
+    ) -> List[int]:
+        """
+        Move half the unstarted tasks of the most loaded worker to this one,
+        if it has none waiting itself (otherwise two busy workers would keep
+        taking tasks back from each other).
+        """
+        waiting_here = conn.execute(
+            "SELECT COUNT(*) FROM cluster_tasks "
+            "WHERE status = 'leased' AND started = 0 AND worker_id = ?",
+            (worker_id,),
+        ).fetchone()[0]
+        if waiting_here:
+            return []
+        victim = conn.execute(
+            "SELECT worker_id, COUNT(*) FROM cluster_tasks "
+            "WHERE status = 'leased' AND started = 0 AND worker_id != ? "
+            "GROUP BY worker_id ORDER BY COUNT(*) DESC LIMIT 1",
+            (worker_id,),
+        ).fetchone()
+        if victim is None:
+            return []
+        victim_id, waiting = victim
+        # Take from the back of its queue, which it would reach last
+        ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM cluster_tasks "
+                "WHERE status = 'leased' AND started = 0 AND worker_id = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (victim_id, min(wanted, (waiting + 1) // 2)),
+            )
+        ]
+        conn.execute(
+            f"UPDATE cluster_tasks SET worker_id = ?, lease_until = ? "
+            f"WHERE id IN ({self._placeholders(ids)})",
+            [worker_id, now + self.task_timeout] + ids,
+        )
+        conn.execute(
+            "UPDATE cluster_workers SET stolen = stolen + ? WHERE id = ?",
+            (len(ids), worker_id),
+        )
+        return ids
+
+    def start(self, worker_id: str, task_id: int) -> bool:
+        """
+        Claim a leased task before working on it.
+
+        Returns:
+            False if the task is no longer this worker's (stolen, re-queued
+            or done), in which case it must be dropped
+        """
+        cursor = self._connection().execute(
+            "UPDATE cluster_tasks SET started = 1 "
+            "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+            (task_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete(
+        self,
+        worker_id: str,
+        task_id: int,
+        outcome: Optional[Dict] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        """
+        Store the outcome of a task. The first outcome wins: a task re-queued
+        after its worker was presumed lost may still be completed by it.
+
+        Returns:
+            False if the task was already done (or no longer exists)
+        """
+
+        def complete(conn: sqlite3.Connection, now: float):
+            cursor = conn.execute(
+                "UPDATE cluster_tasks SET status = 'done', worker_id = ?, "
+                "outcome = ?, error = ?, lease_until = NULL "
+                "WHERE id = ? AND status != 'done'",
+                (
+                    worker_id,
+                    json.dumps(outcome) if outcome is not None else None,
+                    error,
+                    task_id,
+                ),
+            )
+            conn.execute(
+                "UPDATE cluster_workers "
+                "SET completed = completed + ?, last_seen = ? WHERE id = ?",
+                (cursor.rowcount, now, worker_id),
+            )
+            return cursor.rowcount > 0
+
+        return self._transaction(complete)
+
+    def release(self, worker_id: str, task_ids: Iterable[int]):
+        """
+        Put tasks a worker will not run (it is shutting down) back in the
+        queue.
+        """
+        ids = list(task_ids)
+        if not ids:
+            return
+        self._connection().execute(
+            f"UPDATE cluster_tasks SET status = 'pending', "
+            f"worker_id = NULL, lease_until = NULL, "
+            f"attempts = MAX(attempts - 1, 0) "
+            f"WHERE worker_id = ? AND status = 'leased' AND started = 0 "
+            f"AND id IN ({self._placeholders(ids)})",
+            [worker_id] + ids,
+        )
+
+    def deregister(self, worker_id: str):
+        """
+        Remove a worker that is shutting down; its unfinished tasks are
+        re-queued.
+        """
+        self._transaction(
+            lambda conn, now: self._requeue(
+                conn,
+                "worker_id = ? AND status = 'leased'",
+                (worker_id,),
+                "worker stopped",
+            )
+        )
+        self._connection().execute(
+            "DELETE FROM cluster_workers WHERE id = ?", (worker_id,)
+        )
+
+    def _reap(self, conn: sqlite3.Connection, now: float):
+        """
+        Re-queue the tasks of lost workers and of tasks past their timeout.
+        """
+        lost = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM cluster_workers WHERE last_seen < ?",
+                (now - self.heartbeat_timeout,),
+            )
+        ]
+        if lost:
+            logging.warning(
+                f"Lost {len(lost)} cluster worker(s), re-queueing their tasks"
+            )
+            placeholders = self._placeholders(lost)
+            self._requeue(
+                conn,
+                f"status = 'leased' AND worker_id IN ({placeholders})",
+                lost,
+                "worker lost",
+            )
+            conn.execute(
+                f"DELETE FROM cluster_workers WHERE id IN ({placeholders})",
+                lost,
+            )
+        self._requeue(
+            conn,
+            "status = 'leased' AND lease_until < ?",
+            (now,),
+            "task timed out",
+        )
+
+    def _requeue(
+        self,
+        conn: sqlite3.Connection,
+        where: str,
+        params,
+        error: str,
+    ):
+        conn.execute(
+            f"UPDATE cluster_tasks SET status = 'done', error = ?, "
+            f"lease_until = NULL WHERE {where} AND attempts >= ?",
+            [error] + list(params) + [self.max_attempts],
+        )
+        conn.execute(
+            f"UPDATE cluster_tasks SET status = 'pending', "
+            f"worker_id = NULL, started = 0, lease_until = NULL "
+            f"WHERE {where}",
+            list(params),
+        )
+
+    # Coordinator
+
+    def submit(
+        self,
+        pdf_path: str,
+        pages: Iterable[int],
+        options: Dict,
+    ) -> str:
+        """Queue one task per page of a PDF; returns the job id."""
+        job_id = uuid.uuid4().hex
+        encoded = json.dumps(options)
+
+        def submit(conn: sqlite3.Connection, now: float):
+            conn.execute(
+                "INSERT INTO cluster_jobs (id, pdf_path, created_at) "
+                "VALUES (?, ?, ?)",
+                (job_id, os.path.abspath(pdf_path), now),
+            )
+            conn.executemany(
+                "INSERT INTO cluster_tasks (job_id, page, options, status) "
+                "VALUES (?, ?, ?, 'pending')",
+                [(job_id, page, encoded) for page in pages],
+            )
+
+        self._transaction(submit)
+        return job_id
+
+    def job_pdf(self, job_id: str) -> Optional[str]:
+        """Path of the PDF of a job still in the queue, for workers to get."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT pdf_path FROM cluster_jobs WHERE id = ?",
+                (job_id,),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def task_options(self, task_id: int) -> Optional[Dict]:
+        """Options a task was submitted with; None once its job is finished."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT options FROM cluster_tasks WHERE id = ?",
+                (task_id,),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def results(
+        self,
+        job_id: str,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Dict]:
+        """
+        Wait for the tasks of a job.
+
+        Yields:
+            {"page", "worker", "error", **outcome} for each task as it is
+            done, in completion order. Tasks still unfinished after timeout
+            seconds are given up with error "timed out".
+        """
+        deadline = time.time() + timeout if timeout else None
+        reported = set()
+        conn = self._connection()
+        while True:
+            self._transaction(self._reap)
+            rows = conn.execute(
+                "SELECT t.id, t.page, t.status, w.name, t.outcome, t.error "
+                "FROM cluster_tasks t "
+                "LEFT JOIN cluster_workers w ON w.id = t.worker_id "
+                "WHERE t.job_id = ?",
+                (job_id,),
+            ).fetchall()
+            waiting = False
+            for task_id, page, status, worker, outcome, error in rows:
+                if status != "done":
+                    waiting = True
+                elif task_id not in reported:
+                    reported.add(task_id)
+                    yield {
+                        "page": page,
+                        "worker": worker,
+                        "error": error,
+                        **(json.loads(outcome) if outcome else {}),
+                    }
+            if not waiting:
+                return
+            if deadline is not None and time.time() > deadline:
+                conn.execute(
+                    "UPDATE cluster_tasks "
+                    "SET status = 'done', error = 'timed out' "
+                    "WHERE job_id = ? AND status != 'done'",
+                    (job_id,),
+                )
+                continue
+            time.sleep(self.poll_interval)
+
+    def finish(self, job_id: str):
+        """Forget a job once its results have been read (or abandoned)."""
+
+        def finish(conn: sqlite3.Connection, now: float):
+            conn.execute(
+                "DELETE FROM cluster_tasks WHERE job_id = ?",
+                (job_id,),
+            )
+            conn.execute("DELETE FROM cluster_jobs WHERE id = ?", (job_id,))
+
+        self._transaction(finish)
+
+    def stats(self) -> Dict:
+        """Live workers with their load, and tasks by status."""
+        self._transaction(self._reap)
+        conn = self._connection()
+        now = time.time()
+        load = {
+            (worker_id, started): count
+            for worker_id, started, count in conn.execute(
+                "SELECT worker_id, started, COUNT(*) FROM cluster_tasks "
+                "WHERE status = 'leased' GROUP BY worker_id, started"
+            )
+        }
+        workers = [
+            {
+                "id": worker_id,
+                "name": name,
+                "capacity": capacity,
+                "last_seen_seconds": round(now - last_seen, 1),
+                "running": load.get((worker_id, 1), 0),
+                "queued": load.get((worker_id, 0), 0),
+                "completed": completed,
+                "stolen": stolen,
+            }
+            for (
+                worker_id,
+                name,
+                capacity,
+                last_seen,
+                completed,
+                stolen,
+            ) in conn.execute(
+                "SELECT id, name, capacity, last_seen, completed, stolen "
+                "FROM cluster_workers ORDER BY registered_at"
+            )
+        ]
+        tasks = dict(
+            conn.execute(
+                "SELECT status, COUNT(*) FROM cluster_tasks GROUP BY status"
+            ).fetchall()
+        )
+        jobs = conn.execute("SELECT COUNT(*) FROM cluster_jobs").fetchone()
+        statuses = ("pending", "leased", "done")
+        return {
+            "workers": workers,
+            "tasks": {status: tasks.get(status, 0) for status in statuses},
+            "jobs": jobs[0],
+        }
+
+    def _placeholders(self, ids: List) -> str:
+        return ", ".join("?" for _ in ids)
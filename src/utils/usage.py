@@ -0,0 +1,419 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    model TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, tenant, endpoint, model)
+);
+"""
+
+COUNTERS = ("calls", "images", "prompt_tokens", "completion_tokens", "cost")
+BUDGET_LIMITS = ("soft_tokens", "hard_tokens", "soft_cost", "hard_cost")
+
+
+class UsageScope:
+    """Who a model call is made for: the tenant and the endpoint it came in on."""
+
+    __slots__ = ("tenant", "endpoint")
+
+    def __init__(self, tenant: str, endpoint: str):
+        self.tenant = tenant
+        self.endpoint = endpoint
+
+
+# Set per request by UsageMiddleware; pools that should see it must copy the
+# context (see ContextThreadPoolExecutor)
+current_scope: ContextVar[Optional[UsageScope]] = ContextVar(
+    "usage_scope", default=None
+)
+
+# Set by cluster workers around a task: its model calls are collected here
+# and sent back with the outcome, for the coordinator to record
+collected_usage: ContextVar[Optional[List[Dict]]] = ContextVar(
+    "collected_usage", default=None
+)
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def api_key_of(headers: Headers) -> Optional[str]:
+    """The API key of a request: X-API-Key, else a bearer token."""
+    key = headers.get("x-api-key")
+    authorization = headers.get("authorization", "")
+    if not key and authorization.lower().startswith("bearer "):
+        key = authorization[7:].strip()
+    return key or None
+
+
+def tenant_keys() -> Dict[str, str]:
+    """
+    Tenants by API key, from the USAGE_TENANT_KEYS JSON setting, e.g.
+    {"<api key>": "team-a"}.
+    """
+    try:
+        return json.loads(os.getenv("USAGE_TENANT_KEYS", "{}"))
+    except ValueError:
+        logging.error("USAGE_TENANT_KEYS is not valid JSON; keys are hashed")
+        return {}
+
+
+def trusted_keys() -> List[str]:
+    """
+    API keys allowed to name the tenant with X-Tenant-ID, from the
+    comma-separated USAGE_TRUSTED_KEYS setting.
+    """
+    keys = os.getenv("USAGE_TRUSTED_KEYS", "").split(",")
+    return [key.strip() for key in keys if key.strip()]
+
+
+def tenant_of(headers: Headers) -> str:
+    """
+    Tenant a request is billed to, derived from its API key: the tenant
+    USAGE_TENANT_KEYS maps the key to, else a hash of the key, else
+    "anonymous". The X-Tenant-ID header is only honoured from callers whose
+    key is in USAGE_TRUSTED_KEYS, such as a gateway billing its own users.
+    """
+    key = api_key_of(headers)
+    if not key:
+        return "anonymous"
+    tenant = headers.get("x-tenant-id")
+    if tenant and any(
+        hmac.compare_digest(key.encode(), trusted.encode())
+        for trusted in trusted_keys()
+    ):
+        return tenant.strip()[:64]
+    mapped = tenant_keys().get(key)
+    if mapped:
+        return mapped
+    return "key-" + hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+def model_prices() -> Dict[str, List[float]]:
+    """
+    Prices per million tokens, [input, output], by model, from the
+    MODEL_PRICES JSON setting, e.g. {"gemini-2.5-pro": [1.25, 10.0]}.
+    """
+    try:
+        return json.loads(os.getenv("MODEL_PRICES", "{}"))
+    except ValueError:
+        logging.error("MODEL_PRICES is not valid JSON; costs are not tracked")
+        return {}
+
+
+def budget_for(tenant: str) -> Dict[str, Optional[float]]:
+    """
+    Daily limits of a tenant. USAGE_BUDGETS is a JSON object of per-tenant
+    limits ("*" applies to tenants not listed), e.g.
+    {"team-a": {"hard_cost": 50}, "*": {"soft_tokens": 2000000}}.
+    Limits not set there fall back to USAGE_SOFT_TOKENS, USAGE_HARD_TOKENS,
+    USAGE_SOFT_COST and USAGE_HARD_COST. Unset limits are None.
+    """
+    try:
+        budgets = json.loads(os.getenv("USAGE_BUDGETS", "{}"))
+    except ValueError:
+        logging.error("USAGE_BUDGETS is not valid JSON; using the defaults")
+        budgets = {}
+    configured = budgets.get(tenant, budgets.get("*", {}))
+    budget = {}
+    for limit in BUDGET_LIMITS:
+        value = configured.get(limit, os.getenv(f"USAGE_{limit.upper()}"))
+        budget[limit] = float(value) if value not in (None, "") else None
+    return budget
+
+
+def budget_status(totals: Dict[str, float], budget: Dict[str, Optional[float]]):
+    """ "hard" or "soft" if a limit of that kind is reached, else "ok"."""
+    tokens = totals.get("prompt_tokens", 0) + totals.get("completion_tokens", 0)
+    cost = totals.get("cost", 0)
+    for level in ("hard", "soft"):
+        token_limit = budget[f"{level}_tokens"]
+        cost_limit = budget[f"{level}_cost"]
+        if (token_limit is not None and tokens >= token_limit) or (
+            cost_limit is not None and cost >= cost_limit
+        ):
+            return level
+    return "ok"
+
+
+class UsageMeter:
+    """
+    Daily model usage per tenant, endpoint and model, in a local SQLite file
+    shared by all worker processes, so budgets hold across workers.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("USAGE_DB_PATH", "usage.db")
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(
+        self,
+        scope: UsageScope,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        images: int = 1,
+    ):
+        price = model_prices().get(model)
+        cost = (
+            (prompt_tokens * price[0] + completion_tokens * price[1]) / 1e6
+            if price
+            else 0.0
+        )
+        self._connection().execute(
+            "INSERT INTO usage (day, tenant, endpoint, model, calls, images, "
+            "prompt_tokens, completion_tokens, cost) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?) "
+            "ON CONFLICT (day, tenant, endpoint, model) DO UPDATE SET "
+            "calls = calls + 1, images = images + excluded.images, "
+            "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+            "completion_tokens = completion_tokens + excluded.completion_tokens, "
+            "cost = cost + excluded.cost",
+            (
+                today(),
+                scope.tenant,
+                scope.endpoint,
+                model,
+                images,
+                prompt_tokens,
+                completion_tokens,
+                cost,
+            ),
+        )
+
+    def totals(self, tenant: str, day: Optional[str] = None) -> Dict[str, float]:
+        """Usage of a tenant summed over endpoints and models for one day."""
+        row = (
+            self._connection()
+            .execute(
+                f"SELECT {', '.join(f'COALESCE(SUM({c}), 0)' for c in COUNTERS)} "
+                "FROM usage WHERE day = ? AND tenant = ?",
+                (day or today(), tenant),
+            )
+            .fetchone()
+        )
+        return dict(zip(COUNTERS, row))
+
+    def status(self, tenant: str) -> str:
+        """Budget status of a tenant today: "ok", "soft" or "hard"."""
+        return budget_status(self.totals(tenant), budget_for(tenant))
+
+    def report(self, day: Optional[str] = None, tenant: Optional[str] = None) -> Dict:
+        """
+        Usage for one day (default today): per tenant, the totals, budget
+        and status, broken down by endpoint and by model.
+        """
+        day = day or today()
+        query = f"SELECT tenant, endpoint, model, {', '.join(COUNTERS)} FROM usage WHERE day = ?"
+        params = [day]
+        if tenant:
+            query += " AND tenant = ?"
+            params.append(tenant)
+
+        tenants: Dict[str, Dict] = {}
+        for row in self._connection().execute(query, params):
+            name, endpoint, model = row[:3]
+            counts = dict(zip(COUNTERS, row[3:]))
+            entry = tenants.setdefault(
+                name,
+                {
+                    "totals": dict.fromkeys(COUNTERS, 0),
+                    "endpoints": {},
+                    "models": {},
+                },
+            )
+            for group, key in (("endpoints", endpoint), ("models", model)):
+                bucket = entry[group].setdefault(key, dict.fromkeys(COUNTERS, 0))
+                for counter, value in counts.items():
+                    bucket[counter] += value
+            for counter, value in counts.items():
+                entry["totals"][counter] += value
+
+        for name, entry in tenants.items():
+            entry["budget"] = budget_for(name)
+            entry["status"] = budget_status(entry["totals"], entry["budget"])
+        return {"day": day, "tenants": tenants}
+
+
+_meter: Optional[UsageMeter] = None
+_meter_path: Optional[str] = None
+_meter_lock = threading.Lock()
+
+
+def configure_meter(path: Optional[str]):
+    """Set the database of the process-wide meter (default USAGE_DB_PATH)."""
+    global _meter, _meter_path
+    with _meter_lock:
+        _meter_path = path
+        _meter = None
+
+
+def get_meter() -> UsageMeter:
+    """The process-wide meter, created on first use."""
+    global _meter
+    with _meter_lock:
+        if _meter is None:
+            _meter = UsageMeter(_meter_path)
+        return _meter
+
+
+def record_usage(model: str, prompt_tokens: int, completion_tokens: int, images=1):
+    """
+    Record one model call for the current request. Calls made outside a
+    request (CLI runs, warm-up) are not metered.
+    """
+    calls = collected_usage.get()
+    if calls is not None:
+        calls.append(
+            {
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "images": images,
+            }
+        )
+        return
+    scope = current_scope.get()
+    if scope is None:
+        return
+    try:
+        get_meter().record(scope, model, prompt_tokens, completion_tokens, images)
+    except Exception as e:
+        logging.error(f"Recording usage failed: {e}")
+
+
+def record_calls(tenant: str, endpoint: str, calls: List[Dict]):
+    """Record model calls a cluster worker made for a request of a tenant."""
+    scope = UsageScope(tenant, endpoint)
+    try:
+        meter = get_meter()
+        for call in calls:
+            meter.record(
+                scope,
+                call["model"],
+                call["prompt_tokens"],
+                call["completion_tokens"],
+                call["images"],
+            )
+    except Exception as e:
+        logging.error(f"Recording usage failed: {e}")
+
+
+def record_gemini_usage(model: str, response, images: int = 1):
+    """Record the usage_metadata of a Gemini generate_content response."""
+    meta = getattr(response, "usage_metadata", None)
+    if meta is None:
+        return
+    # Thinking tokens are billed as output
+    completion = (getattr(meta, "candidates_token_count", None) or 0) + (
+        getattr(meta, "thoughts_token_count", None) or 0
+    )
+    record_usage(
+        model, getattr(meta, "prompt_token_count", None) or 0, completion, images
+    )
+
+
+def record_openai_usage(model: str, response, images: int = 1):
+    """Record the usage of an OpenAI chat completion."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    record_usage(model, usage.prompt_tokens or 0, usage.completion_tokens or 0, images)
+
+
+class UsageMiddleware:
+    """
+    Attribute model calls made for requests to ``paths`` to the caller's
+    tenant (see ``tenant_of``) and enforce its daily budget.
+
+    Requests from a tenant over a hard limit are refused with 429 before any
+    work starts. A request that starts under the limit runs to completion,
+    so usage can end up slightly above it. Over a soft limit, requests run
+    and the response carries an ``X-Usage-Warning`` header.
+
+    Usage is kept at ``path`` (see UsageMeter), created on the first
+    metered request.
+    """
+
+    def __init__(self, app: ASGIApp, paths, path: Optional[str] = None):
+        self.app = app
+        self.paths = frozenset(paths)
+        configure_meter(path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        tenant = tenant_of(Headers(scope=scope))
+        status = await asyncio.get_running_loop().run_in_executor(
+            None, get_meter().status, tenant
+        )
+        if status == "hard":
+            body = json.dumps(
+                {"detail": f"Daily usage budget of tenant {tenant} is exhausted"}
+            ).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_warning(message: Message):
+            if message["type"] == "http.response.start" and status == "soft":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-usage-warning", b"daily soft budget reached")
+                ]
+            await send(message)
+
+        token = current_scope.set(UsageScope(tenant, scope["path"]))
+        try:
+            await self.app(scope, receive, send_with_warning)
+        finally:
+            current_scope.reset(token)
@@ -1,12 +1,12 @@
 import re
 from decimal import Decimal, InvalidOperation
-from typing import Union
+from typing import Optional, Union
 
 
 class VATCalculator:
     """Utility class for calculating VAT amounts."""
 
-    VAT_RATE = 0.15  # 15% VAT rate
+    VAT_RATE = Decimal("0.15")  # 15% VAT rate, exact
 
     @staticmethod
     def clean_numeric_value(value: str) -> Union[Decimal, None]:
@@ -35,6 +35,29 @@ class VATCalculator:
         except (InvalidOperation, ValueError):
             return None
 
+    @classmethod
+    def parse_amount(cls, value: Optional[str]) -> Optional[Decimal]:
+        """
+        Like ``clean_numeric_value``, but values that are already plain numbers
+        go straight through ``Decimal``; only values carrying currency symbols
+        or separators fall back to the regex cleaning.
+        """
+        if not value:
+            return None
+        try:
+            parsed = Decimal(value)
+        except (InvalidOperation, ValueError, TypeError):
+            return cls.clean_numeric_value(value)
+        # Decimal accepts "NaN", "Infinity" and surrounding spaces
+        return parsed if parsed.is_finite() else cls.clean_numeric_value(value)
+
+    @classmethod
+    def vat_for(cls, net: Optional[Decimal]) -> Optional[Decimal]:
+        """VAT on a net amount, rounded to 2 places (None if net is None)."""
+        if net is None:
+            return None
+        return round(net * cls.VAT_RATE, 2)
+
     @classmethod
     def calculate_vat_amount(cls, quantity: str, unit_price: str) -> str:
         """
@@ -49,15 +72,15 @@ class VATCalculator:
         """
         try:
             # Clean and convert values
-            qty_decimal = cls.clean_numeric_value(quantity)
-            price_decimal = cls.clean_numeric_value(unit_price)
+            qty_decimal = cls.parse_amount(quantity)
+            price_decimal = cls.parse_amount(unit_price)
 
             # Check if both values are valid
             if qty_decimal is None or price_decimal is None:
                 return ""
 
             # Calculate VAT: quantity × unit_price × 15%
-            vat_amount = qty_decimal * price_decimal * Decimal(cls.VAT_RATE)
+            vat_amount = qty_decimal * price_decimal * cls.VAT_RATE
 
             # Round to 2 decimal places and return as string
             return str(round(vat_amount, 2))
@@ -79,8 +102,8 @@ class VATCalculator:
         """
         try:
             # Clean and convert values
-            qty_decimal = cls.clean_numeric_value(quantity)
-            price_decimal = cls.clean_numeric_value(unit_price)
+            qty_decimal = cls.parse_amount(quantity)
+            price_decimal = cls.parse_amount(unit_price)
 
             if qty_decimal is None or price_decimal is None:
                 return ""
@@ -89,7 +112,7 @@ class VATCalculator:
             subtotal = qty_decimal * price_decimal
 
             # Calculate VAT
-            vat_amount = subtotal * Decimal(cls.VAT_RATE)
+            vat_amount = subtotal * cls.VAT_RATE
 
             # Calculate total
             total = subtotal + vat_amount
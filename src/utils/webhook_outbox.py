@@ -0,0 +1,372 @@
+import hashlib
+import hmac
+import ipaddress
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from src.utils.fast_json import dumps
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due
+    ON webhook_outbox (status, url, next_attempt_at);
+"""
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+DELIVERY_HEADER = "X-Webhook-Delivery"
+
+
+def sign(secret: str, body: bytes, timestamp: Optional[int] = None) -> str:
+    """
+    Signature header value for a delivery body: ``t=<unix time>,v1=<hex>``,
+    where hex is HMAC-SHA256 over ``"<t>." + body`` with the shared secret.
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    mac = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256)
+    return f"t={timestamp},v1={mac.hexdigest()}"
+
+
+def verify(secret: str, body: bytes, header: str, tolerance: int = 300) -> bool:
+    """Check a signature header; rejects signatures older than ``tolerance`` s."""
+    try:
+        parts = dict(item.split("=", 1) for item in header.split(","))
+        timestamp = int(parts["t"])
+    except (ValueError, KeyError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    expected = sign(secret, body, timestamp).split("v1=", 1)[1]
+    return hmac.compare_digest(expected, parts.get("v1", ""))
+
+
+def validate_callback_url(url: str):
+    """
+    Raise ValueError unless url is http(s) and points at a public address.
+
+    When WEBHOOK_ALLOWED_HOSTS is set (comma separated), the host must be
+    one of those instead; listed hosts may be private. Otherwise the host is
+    resolved and every address must be globally routable, so a callback
+    cannot reach loopback, private, link-local or reserved networks.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parsed.hostname
+    allowed = [
+        h.strip()
+        for h in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",")
+        if h.strip()
+    ]
+    if allowed:
+        if host not in allowed:
+            raise ValueError(f"callback_url host is not allowed: {host}")
+        return
+    try:
+        addresses = socket.getaddrinfo(
+            host, parsed.port or 443, proto=socket.IPPROTO_TCP
+        )
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"callback_url host not found: {host}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split("%")[0])
+        ip = getattr(ip, "ipv4_mapped", None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"callback_url host is not public: {host}")
+
+
+class WebhookOutbox:
+    """
+    Durable, batched webhook delivery.
+
+    ``enqueue`` writes an event to an SQLite outbox and returns at once. A
+    background sender coalesces pending events for the same URL into one
+    POST of up to ``batch_size`` events, sent once the batch is full or its
+    oldest event has waited ``max_latency`` seconds. Bodies are signed with
+    HMAC-SHA256 (see ``sign``). Failed deliveries are retried with
+    exponential backoff and jitter; after ``max_attempts`` the events are
+    kept with status 'failed'.
+
+    Events survive restarts, and several worker processes can share one
+    outbox file: a batch is leased to one sender while it is in flight, and
+    a lease left behind by a crashed worker expires and is picked up again.
+    Delivery is at least once, so every event carries an ``event_id`` for
+    receivers to deduplicate.
+
+    Configuration (environment):
+        WEBHOOK_SECRET        HMAC key shared with receivers (required)
+        WEBHOOK_DB_PATH       outbox database, default webhooks.db
+        WEBHOOK_BATCH_SIZE    events per POST, default 50
+        WEBHOOK_MAX_LATENCY   seconds an event may wait for a batch, default 2
+        WEBHOOK_MAX_ATTEMPTS  delivery attempts before giving up, default 8
+    """
+
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        db_path: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_latency: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        timeout: float = 10.0,
+    ):
+        self.secret = secret or os.getenv("WEBHOOK_SECRET")
+        if not self.secret:
+            raise ValueError("WEBHOOK_SECRET is required to sign webhooks")
+        self.db_path = db_path or os.getenv("WEBHOOK_DB_PATH", "webhooks.db")
+        self.batch_size = batch_size or int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+        self.max_latency = (
+            max_latency
+            if max_latency is not None
+            else float(os.getenv("WEBHOOK_MAX_LATENCY", "2"))
+        )
+        self.max_attempts = max_attempts or int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._sender: Optional[threading.Thread] = None
+        self._sender_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # SQLite connections must not be used across a fork
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, url: str, event: Dict) -> str:
+        """
+        Store an event for delivery to url.
+
+        Returns:
+            The event_id added to the event
+        """
+        event = {"event_id": uuid.uuid4().hex, **event}
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO webhook_outbox (url, payload, created_at, next_attempt_at) "
+            "VALUES (?, ?, ?, ?)",
+            (url, dumps(event), now, now),
+        )
+        self._ensure_sender()
+        self._wake.set()
+        return event["event_id"]
+
+    def resume(self) -> int:
+        """
+        Start the sender if events were left pending, e.g. by a restart.
+
+        Returns:
+            The number of pending events
+        """
+        pending = self.stats()["pending"]
+        if pending:
+            self._ensure_sender()
+        return pending
+
+    def _ensure_sender(self):
+        with self._sender_lock:
+            if self._sender is None or not self._sender.is_alive():
+                self._stop.clear()
+                self._sender = threading.Thread(
+                    target=self._run, name="webhook-sender", daemon=True
+                )
+                self._sender.start()
+
+    def _run(self):
+        import httpx
+
+        with httpx.Client(timeout=self.timeout) as client:
+            while not self._stop.is_set():
+                try:
+                    delivered = self.deliver_due(client)
+                except Exception as e:
+                    logging.error(f"Webhook delivery failed: {e}")
+                    delivered = False
+                if not delivered:
+                    # Nothing ready: sleep until an event arrives or a batch
+                    # window may have closed
+                    self._wake.wait(min(self.max_latency, 1.0) or 0.1)
+                    self._wake.clear()
+
+    def _claim(self) -> Optional[tuple]:
+        """Lease the next ready batch; returns (url, ids, payloads) or None."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE webhook_outbox SET lease_until = NULL "
+                "WHERE lease_until IS NOT NULL AND lease_until < ?",
+                (now,),
+            )
+            ready = conn.execute(
+                "SELECT url FROM webhook_outbox "
+                "WHERE status = 'pending' AND lease_until IS NULL "
+                "AND next_attempt_at <= ? GROUP BY url "
+                "HAVING COUNT(*) >= ? OR MIN(created_at) <= ? OR MAX(attempts) > 0 "
+                "LIMIT 1",
+                (now, self.batch_size, now - self.max_latency),
+            ).fetchone()
+            if ready is None:
+                conn.execute("COMMIT")
+                return None
+
+            rows = conn.execute(
+                "SELECT id, payload FROM webhook_outbox "
+                "WHERE url = ? AND status = 'pending' AND lease_until IS NULL "
+                "AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (ready[0], now, self.batch_size),
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            conn.execute(
+                f"UPDATE webhook_outbox SET lease_until = ? "
+                f"WHERE id IN ({', '.join('?' for _ in ids)})",
+                [now + self.timeout * 2] + ids,
+            )
+            conn.execute("COMMIT")
+            return ready[0], ids, [row[1] for row in rows]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def deliver_due(self, client) -> bool:
+        """
+        Send one ready batch, if any.
+
+        Returns:
+            True if a batch was attempted
+        """
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        url, ids, payloads = claimed
+
+        delivery_id = uuid.uuid4().hex
+        body = (
+            b'{"delivery_id":"'
+            + delivery_id.encode()
+            + b'","events":['
+            + b",".join(payloads)
+            + b"]}"
+        )
+        error = None
+        try:
+            # Checked again: the host may resolve elsewhere by now
+            validate_callback_url(url)
+            response = client.post(
+                url,
+                content=body,
+                headers={
+                    "Content-Type": "application/json",
+                    SIGNATURE_HEADER: sign(self.secret, body),
+                    DELIVERY_HEADER: delivery_id,
+                },
+            )
+            if not 200 <= response.status_code < 300:
+                error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        if error is None:
+            self._delivered(ids)
+        else:
+            logging.warning(
+                f"Webhook delivery of {len(ids)} events to {url} failed: {error}"
+            )
+            self._failed(ids, error)
+        return True
+
+    def _placeholders(self, ids: List[int]) -> str:
+        return ", ".join("?" for _ in ids)
+
+    def _delivered(self, ids: List[int]):
+        self._connection().execute(
+            f"DELETE FROM webhook_outbox WHERE id IN ({self._placeholders(ids)})", ids
+        )
+
+    def _failed(self, ids: List[int], error: str):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT id, attempts FROM webhook_outbox "
+                f"WHERE id IN ({self._placeholders(ids)})",
+                ids,
+            ).fetchall()
+            # One jitter for the whole batch keeps its events together
+            jitter = random.uniform(0.8, 1.2)
+            for event_id, attempts in rows:
+                attempts += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                delay *= jitter
+                conn.execute(
+                    "UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ?, "
+                    "lease_until = NULL, last_error = ?, status = ? WHERE id = ?",
+                    (
+                        attempts,
+                        now + delay,
+                        error,
+                        "failed" if attempts >= self.max_attempts else "pending",
+                        event_id,
+                    ),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Number of events waiting to be delivered and given up on."""
+        counts = dict(
+            self._connection()
+            .execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status")
+            .fetchall()
+        )
+        return {"pending": counts.get("pending", 0), "failed": counts.get("failed", 0)}
+
+    def close(self):
+        """Stop the sender; undelivered events stay in the outbox."""
+        self._stop.set()
+        self._wake.set()
+        if self._sender is not None:
+            self._sender.join(timeout=self.timeout + 1)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
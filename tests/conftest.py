@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the databases the app creates on demand out of the working tree
+DATA_DIR = tempfile.mkdtemp(prefix="invoice-tests-")
+for name in ("USAGE_DB_PATH", "IDEMPOTENCY_DB_PATH", "WEBHOOK_DB_PATH"):
+    os.environ.setdefault(name, os.path.join(DATA_DIR, name.lower() + ".db"))
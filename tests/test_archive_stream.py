@@ -0,0 +1,75 @@
+import asyncio
+import io
+import json
+import tarfile
+
+import main
+
+
+def _tar(*members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_records_stream_before_upload_ends(monkeypatch):
+    def process(path, name, pipeline):
+        return {"status": "success", "filename": name, "data": {}}
+
+    monkeypatch.setattr(main, "process_single_invoice", process)
+    pdf = b"%PDF-1.4\n" + b"0" * 64 * 1024
+    archive = _tar(("a.pdf", pdf), ("b.pdf", pdf), ("c.pdf", pdf))
+    # The first chunk holds a.pdf and b.pdf; c.pdf is only complete with the
+    # last. A result is sent once the next member has been read.
+    split = len(archive) - 32 * 1024
+    chunks = [archive[:split], archive[split:]]
+
+    async def run():
+        first_record = asyncio.Event()
+        held_back = []
+        sent = []
+
+        async def receive():
+            if not chunks:
+                await asyncio.Event().wait()
+            if len(chunks) == 1:
+                # Hold the last chunk until a record has been sent
+                await first_record.wait()
+                held_back.append(bool(sent))
+            chunk = chunks.pop(0)
+            more = bool(chunks)
+            return {"type": "http.request", "body": chunk, "more_body": more}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                sent.append(message["body"])
+                first_record.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/extract-archive",
+            "raw_path": b"/extract-archive",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/x-tar")],
+            "client": ("127.0.0.1", 1234),
+            "server": ("testserver", 80),
+        }
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=10)
+        return held_back, sent
+
+    held_back, sent = asyncio.run(run())
+    assert held_back == [True]
+    lines = b"".join(sent).splitlines()
+    records = [json.loads(line) for line in lines]
+    names = [r["filename"] for r in records if r["type"] == "result"]
+    assert sorted(names) == ["a.pdf", "b.pdf", "c.pdf"]
+    assert records[-1]["type"] == "complete"
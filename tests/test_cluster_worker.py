@@ -0,0 +1,115 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from src.core.cluster_worker import ClusterWorker
+from src.core.invoice_pipeline import DocumentJob, InvoicePipeline
+from src.utils.task_queue import TaskQueue
+from src.utils.usage import get_meter, record_usage
+
+
+def test_a_coordinator_requires_a_token(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLUSTER_MODE", "coordinator")
+    monkeypatch.setenv("CLUSTER_DB_PATH", str(tmp_path / "cluster.db"))
+    monkeypatch.delenv("CLUSTER_TOKEN", raising=False)
+    with pytest.raises(ValueError):
+        InvoicePipeline(str(tmp_path / "pages"))
+
+    monkeypatch.setenv("CLUSTER_TOKEN", "s3cret")
+    assert InvoicePipeline(str(tmp_path / "pages")).cluster is not None
+
+
+def test_a_lost_remote_document_fails_alone(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLUSTER_MODE", "coordinator")
+    monkeypatch.setenv("CLUSTER_DB_PATH", str(tmp_path / "cluster.db"))
+    monkeypatch.setenv("CLUSTER_TOKEN", "s3cret")
+    pipeline = InvoicePipeline(str(tmp_path / "pages"))
+
+    def prepare(pdf_path, preprocess):
+        job = DocumentJob(pdf_path)
+        job.remote = pdf_path
+        return job
+
+    def remote_extracted(job):
+        if job.remote == "lost.pdf":
+            raise RuntimeError("database is locked")
+        return ["page"]
+
+    monkeypatch.setattr(pipeline, "_prepare", prepare)
+    monkeypatch.setattr(pipeline, "_remote_extracted", remote_extracted)
+    monkeypatch.setattr(pipeline, "_finish", lambda job, pages: pages)
+    results = pipeline._process_scheduled(
+        [(0, "lost.pdf"), (1, "ok.pdf")], preprocess=False
+    )
+    assert results == {0: None, 1: ["page"]}
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    monkeypatch.delenv("CLUSTER_MODE", raising=False)
+    worker = ClusterWorker("http://coordinator.test", work_dir=str(tmp_path))
+    yield worker
+    worker.client.close()
+
+
+def test_pdfs_of_jobs_with_tasks_left_are_kept(worker, tmp_path):
+    for n in range(20):
+        path = tmp_path / f"job-{n}.pdf"
+        path.write_bytes(b"%PDF")
+        worker._pdfs[f"job-{n}"] = str(path)
+    # Old jobs still have pages queued or running here
+    worker._job_tasks.update({"job-0": 2, "job-1": 1})
+
+    with worker._lock:
+        worker._evict_pdfs(keep=16)
+    assert "job-0" in worker._pdfs and "job-1" in worker._pdfs
+    assert "job-2" not in worker._pdfs and "job-3" not in worker._pdfs
+    assert not (tmp_path / "job-2.pdf").exists()
+    assert len(worker._pdfs) == 18
+
+    with worker._lock:
+        worker._task_done("job-1")
+        worker._task_done("job-0")
+        worker._evict_pdfs(keep=16)
+    assert "job-0" in worker._pdfs and "job-1" not in worker._pdfs
+
+
+def test_coordinator_records_worker_usage(worker, tmp_path, monkeypatch):
+    monkeypatch.setenv("CLUSTER_TOKEN", "s3cret")
+    queue = TaskQueue(str(tmp_path / "cluster.db"))
+    monkeypatch.setattr(main.pipeline, "cluster", queue)
+    worker.client.close()
+    worker.client = TestClient(main.app, headers={"X-Cluster-Token": "s3cret"})
+    options = {"dpi": 200, "tenant": "team-remote", "endpoint": "/extract"}
+    queue.submit(str(tmp_path / "doc.pdf"), [1], options)
+
+    def process(task):
+        record_usage("gemini-2.5-flash", 1000, 200, images=1)
+        return {"lines": 2}
+
+    monkeypatch.setattr(worker, "process", process)
+    posted = {}
+    post = worker._post
+
+    def capture(path, **body):
+        posted[path.rsplit("/", 1)[-1]] = body
+        return post(path, **body)
+
+    monkeypatch.setattr(worker, "_post", capture)
+    worker.register()
+    worker._run_task(queue.lease(worker.worker_id, 1)[0])
+
+    # Sent with the outcome rather than recorded on the worker's host
+    assert posted["result"]["usage"] == [
+        {
+            "model": "gemini-2.5-flash",
+            "prompt_tokens": 1000,
+            "completion_tokens": 200,
+            "images": 1,
+        }
+    ]
+
+    totals = get_meter().totals("team-remote")
+    assert totals["calls"] == 1
+    assert totals["prompt_tokens"] == 1000
+    assert totals["completion_tokens"] == 200
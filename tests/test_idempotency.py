@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from src.utils import idempotency
+from src.utils.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IdempotencyStore(str(tmp_path / "idempotency.db"))
+
+
+def test_store_claims_a_key_once(store):
+    stored = idempotency.StoredResponse(200, [["x-a", "1"]], b"{}")
+
+    assert store.begin("k", "f", "a", lease=30) == (idempotency.RUN, None)
+    assert store.begin("k", "f", "b", lease=30) == (idempotency.WAIT, None)
+    assert store.begin("k", "other", "b", lease=30)[0] == idempotency.CONFLICT
+
+    store.complete("k", "a", stored)
+    outcome, replayed = store.begin("k", "f", "b", lease=30)
+    assert outcome == idempotency.REPLAY
+    assert (replayed.status_code, replayed.body) == (200, b"{}")
+    assert replayed.headers == [["x-a", "1"]]
+
+
+def test_store_takes_over_an_expired_lease(store):
+    assert store.begin("k", "f", "crashed", lease=-1)[0] == idempotency.RUN
+    assert store.begin("k", "f", "b", lease=30)[0] == idempotency.RUN
+    # The first owner can no longer complete the key
+    store.complete("k", "crashed", idempotency.StoredResponse(200, [], b""))
+    assert store.begin("k", "f", "c", lease=30)[0] == idempotency.WAIT
+
+
+def test_store_release_lets_the_next_request_run(store):
+    store.begin("k", "f", "a", lease=30)
+    store.release("k", "a")
+    assert store.begin("k", "f", "b", lease=30)[0] == idempotency.RUN
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/extract")
+    async def extract(pdf: UploadFile = File(...), fail: bool = False):
+        app.state.calls += 1
+        if fail:
+            raise HTTPException(status_code=500, detail="boom")
+        return {"call": app.state.calls, "size": len(await pdf.read())}
+
+    app.add_middleware(
+        IdempotencyMiddleware,
+        paths=["/extract"],
+        path=str(tmp_path / "idempotency.db"),
+    )
+    client = TestClient(app)
+    client.calls = lambda: app.state.calls
+    return client
+
+
+def post(client, data, key="key-1", params=None, **headers):
+    return client.post(
+        "/extract",
+        params=params,
+        files={"pdf": ("a.pdf", data)},
+        headers={"Idempotency-Key": key, **headers},
+    )
+
+
+def test_retry_is_replayed(client):
+    # Each attempt is sent with a new multipart boundary
+    upload = b"%PDF" * 100_000
+    first = post(client, upload)
+    retry = post(client, upload)
+
+    assert first.json() == {"call": 1, "size": len(upload)}
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert client.calls() == 1
+
+
+def test_key_reused_for_a_different_upload_is_refused(client):
+    post(client, b"first")
+    response = post(client, b"second")
+    assert response.status_code == 422
+    assert client.calls() == 1
+
+
+def test_key_reused_with_different_query_is_refused(client):
+    post(client, b"same")
+    response = post(client, b"same", params={"fail": "false"})
+    assert response.status_code == 422
+
+
+def test_keys_are_scoped_by_tenant(client):
+    post(client, b"a", **{"X-API-Key": "tenant-a"})
+    response = post(client, b"b", **{"X-API-Key": "tenant-b"})
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+    assert client.calls() == 2
+
+
+def test_server_errors_are_not_stored(client):
+    post(client, b"x", params={"fail": "true"})
+    post(client, b"x", params={"fail": "true"})
+    assert client.calls() == 2
+
+
+def test_requests_without_a_key_always_run(client):
+    for _ in range(2):
+        client.post("/extract", files={"pdf": ("a.pdf", b"x")})
+    assert client.calls() == 2
+
+
+def test_overlong_key_is_rejected(client):
+    response = post(client, b"x", key="k" * 256)
+    assert response.status_code == 400
+    assert client.calls() == 0
+
+
+def body_digest(chunks, boundary):
+    request = {"type": "http.request", "more_body": True}
+    messages = [dict(request, body=chunk) for chunk in chunks]
+    messages.append(dict(request, body=b"", more_body=False))
+
+    async def receive():
+        return messages.pop(0)
+
+    digest = hashlib.sha256()
+    body = io.BytesIO()
+    read = idempotency._read_body(receive, body, digest, boundary)
+    assert asyncio.run(read) is True
+    return digest.hexdigest(), body.getvalue()
+
+
+def test_fingerprint_ignores_the_boundary_and_chunking():
+    def multipart(boundary):
+        return b"--%s\r\nfile\r\n--%s--\r\n" % (boundary, boundary)
+
+    one = multipart(b"aaaa1111")
+    two = multipart(b"bbbb2222")
+    digest, body = body_digest([one], b"aaaa1111")
+    # Three bytes at a time, so the boundary is split across chunks
+    starts = range(0, len(two), 3)
+    split = [two[start:][:3] for start in starts]
+
+    assert body == one
+    assert body_digest(split, b"bbbb2222")[0] == digest
+    assert body_digest([two], b"")[0] != digest
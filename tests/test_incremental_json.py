@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from src.utils.incremental_json import IncrementalJSONParser
+
+DOCUMENT = {
+    "partner": 'ACME "Trading" {Co}',
+    "discount": 0,
+    "paid": True,
+    "notes": None,
+    "invoice_lines": [
+        {"product": "Paper, A4", "quantity": "2", "unit_price": "10.5"},
+        {"product": "Ink [black]", "quantity": "1", "unit_price": "25"},
+    ],
+    "tags": ["a", 2, False],
+    "address": {"city": "Riyadh", "lines": ["x"]},
+    "currency": "SAR",
+}
+
+
+def parse(text, chunk_size, item_keys=None):
+    parser = IncrementalJSONParser(item_keys)
+    events = []
+    for start in range(0, len(text), chunk_size):
+        events += parser.feed(text[start:][:chunk_size])
+    return parser, events
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1000])
+def test_members_and_items_regardless_of_chunking(chunk_size):
+    text = json.dumps(DOCUMENT, indent=2)
+    parser, events = parse(text, chunk_size)
+
+    members = [e[1:] for e in events if e[0] == "member"]
+    assert members == list(DOCUMENT.items())
+    items = [e[1:] for e in events if e[0] == "item"]
+    assert items == [
+        ("invoice_lines", 0, DOCUMENT["invoice_lines"][0]),
+        ("invoice_lines", 1, DOCUMENT["invoice_lines"][1]),
+        ("tags", 0, "a"),
+        ("tags", 1, 2),
+        ("tags", 2, False),
+    ]
+    assert json.loads(parser.document) == DOCUMENT
+
+
+def test_items_arrive_before_their_array_is_closed():
+    parser = IncrementalJSONParser(["invoice_lines"])
+    assert parser.feed('{"invoice_lines": [{"product": "A"}, ') == [
+        ("item", "invoice_lines", 0, {"product": "A"})
+    ]
+    assert parser.feed('{"product": "B"}') == [
+        ("item", "invoice_lines", 1, {"product": "B"})
+    ]
+    events = parser.feed("]}")
+    assert events == [
+        (
+            "member",
+            "invoice_lines",
+            [{"product": "A"}, {"product": "B"}],
+        )
+    ]
+
+
+def test_only_the_requested_arrays_report_items():
+    _, events = parse(json.dumps(DOCUMENT), 5, item_keys=["tags"])
+    assert {e[1] for e in events if e[0] == "item"} == {"tags"}
+
+
+def test_text_around_the_object_is_ignored():
+    text = '```json\n{"a": 1, "b": [1, 2]}\n```'
+    parser, events = parse(text, 3)
+    assert [e for e in events if e[0] == "member"] == [
+        ("member", "a", 1),
+        ("member", "b", [1, 2]),
+    ]
+    assert parser.document == '{"a": 1, "b": [1, 2]}'
+    assert parser.text == text
+
+
+def test_a_scalar_is_reported_when_it_ends():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"total": 12') == []
+    assert parser.feed("5") == []
+    assert parser.feed("}") == [("member", "total", 125)]
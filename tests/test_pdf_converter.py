@@ -0,0 +1,35 @@
+from PIL import Image
+
+from src.core.pdf_converter import PDFConverter
+from src.utils.shared_cache import SharedCache
+
+
+def converter(tmp_path, cache, dpi, rendered):
+    converter = PDFConverter(str(tmp_path / "pages"), cache=cache, dpi=dpi)
+    # A 2-page A4 document; rendering records the resolution asked for
+    converter.page_info = lambda pdf_path: (2, (595.0, 842.0))
+
+    def render(pdf_path, first_page, last_page, dpi):
+        rendered.append(dpi)
+        size = (int(8.27 * dpi), int(11.69 * dpi))
+        pages = range(first_page, last_page + 1)
+        return [Image.new("RGB", size) for _ in pages]
+
+    converter.render = render
+    return converter
+
+
+def test_cached_pages_are_reused_at_the_same_dpi_only(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"))
+    pdf = tmp_path / "invoice.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    rendered = []
+
+    for dpi in (100, 150, 100):
+        document = converter(tmp_path, cache, dpi, rendered).open(str(pdf))
+        with Image.open(list(document)[0]) as page:
+            assert page.width == int(8.27 * dpi)
+        assert document.dpi == dpi
+        document.close()
+    # One window each at 100 and 150 dpi; the last document is cached
+    assert rendered == [100, 150]
@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        main, "readiness", {"ready": False, "warmup": {}, "error": None}
+    )
+    # No provider credentials here: only time the warm-up, build nothing
+    monkeypatch.setattr(main.pipeline, "warm_up", lambda: {"imaging": 0.0})
+    return TestClient(main.app)
+
+
+def test_not_ready_before_warm_up(client):
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+
+def test_ready_after_warm_up(client):
+    main.warm_up_pipeline()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] is True
+    assert body["warmup"]["field_sets"] > 0
+
+
+def test_not_ready_when_warm_up_fails(client, monkeypatch):
+    def fail():
+        raise RuntimeError("no API key")
+
+    monkeypatch.setattr(main.pipeline, "warm_up", fail)
+    main.warm_up_pipeline()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["error"] == "no API key"
@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+from src.models.models import InvoiceData, InvoiceLine
+from src.utils.sqlite_storage import SQLiteInvoiceStorage
+
+
+def make_invoice(reference="INV-1", vat_number="300000000000003", **fields):
+    values = dict(
+        partner="ACME",
+        vat_number=vat_number,
+        cr_number="",
+        street="",
+        street2="",
+        country="",
+        email="",
+        city="",
+        mobile="",
+        invoice_type="Tax Invoice",
+        invoice_bill_date="2024-01-25",
+        reference=reference,
+        invoice_lines=[
+            InvoiceLine(product="Paper", quantity="2", unit_price="10"),
+            InvoiceLine(product="Ink", quantity="1", unit_price="25"),
+        ],
+        detected_language="English",
+    )
+    values.update(fields)
+    return InvoiceData(**values)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteInvoiceStorage(str(tmp_path / "invoices.db"))
+    yield storage
+    storage.close()
+
+
+def test_save_rejects_duplicates(storage):
+    assert storage.save(make_invoice()) is True
+    assert storage.save(make_invoice()) is False
+    assert storage.save(make_invoice(reference="INV-2")) is True
+    assert storage.count() == 2
+    assert storage.exists("INV-1", "300000000000003")
+    assert not storage.exists("INV-3", "300000000000003")
+
+
+def test_invoices_without_a_key_never_collide(storage):
+    results = storage.save_many(
+        [make_invoice(reference="", vat_number="") for _ in range(3)]
+    )
+    assert results == [True, True, True]
+    assert storage.count() == 3
+
+
+def test_iter_rows_flattens_lines_and_filters(storage):
+    storage.save(make_invoice())
+    storage.save(
+        make_invoice(
+            reference="INV-2",
+            partner="Globex",
+            invoice_bill_date="2024-03-01",
+            invoice_lines=[],
+        )
+    )
+
+    rows = list(storage.iter_rows(fetch_size=1))
+    assert [(row["reference"], row["product"]) for row in rows] == [
+        ("INV-1", "Paper"),
+        ("INV-1", "Ink"),
+        ("INV-2", None),
+    ]
+    globex = storage.iter_rows(partner="Globex")
+    assert [row["reference"] for row in globex] == ["INV-2"]
+    march = storage.iter_rows(date_from="2024-02-01", date_to="2024-03-31")
+    assert [row["reference"] for row in march] == ["INV-2"]
+
+
+def test_enqueue_writes_in_the_background(storage):
+    for i in range(5):
+        storage.enqueue(make_invoice(reference=f"INV-{i}"))
+    storage.flush()
+    assert storage.count() == 5
+
+
+def test_a_failing_invoice_does_not_drop_its_batch(storage, monkeypatch):
+    insert = storage._insert
+
+    def fail_on_bad(conn, invoice, now):
+        if invoice.reference == "BAD":
+            raise ValueError("unsupported value")
+        return insert(conn, invoice, now)
+
+    monkeypatch.setattr(storage, "_insert", fail_on_bad)
+    for reference in ("INV-1", "BAD", "INV-2"):
+        storage.enqueue(make_invoice(reference=reference))
+    storage.flush()
+    assert storage.count() == 2
+    assert not storage.exists("BAD", "300000000000003")
+
+
+def test_concurrent_writers_store_each_invoice_once(storage):
+    def write(offset):
+        for i in range(20):
+            storage.save(make_invoice(reference=f"INV-{(offset + i) % 30}"))
+
+    # Overlapping ranges of references, 0 to 29 in all
+    offsets = (0, 10, 20, 30)
+    threads = [threading.Thread(target=write, args=(n,)) for n in offsets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert storage.count() == 30
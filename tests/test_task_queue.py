@@ -0,0 +1,154 @@
+import time
+
+import pytest
+
+from src.utils.task_queue import TaskQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return TaskQueue(
+        str(tmp_path / "cluster.db"),
+        heartbeat_timeout=60,
+        task_timeout=60,
+        max_attempts=2,
+        poll_interval=0.01,
+    )
+
+
+def submit(queue, pages=4):
+    return queue.submit("doc.pdf", range(1, pages + 1), {"dpi": 200})
+
+
+def pages(tasks):
+    return [task["page"] for task in tasks]
+
+
+def test_lease_hands_out_queued_tasks_in_order(queue):
+    job_id = submit(queue)
+    worker = queue.register("w1", capacity=2)
+
+    first = queue.lease(worker, 3)
+    assert pages(first) == [1, 2, 3]
+    assert first[0]["job_id"] == job_id
+    assert first[0]["options"] == {"dpi": 200}
+    assert pages(queue.lease(worker, 3)) == [4]
+    assert queue.lease(worker, 3) == []
+
+
+def test_unknown_workers_must_register_again(queue):
+    assert queue.lease("gone", 1) is None
+    assert queue.heartbeat("gone") is False
+    assert queue.heartbeat(queue.register("w1", capacity=1)) is True
+
+
+def test_results_are_collected_and_the_job_finished(queue):
+    job_id = submit(queue, pages=2)
+    worker = queue.register("w1", capacity=2)
+    for task in queue.lease(worker, 2):
+        assert queue.start(worker, task["task_id"])
+        error = "render failed" if task["page"] == 2 else None
+        outcome = None if error else {"lines": 3}
+        assert queue.complete(worker, task["task_id"], outcome, error)
+
+    results = sorted(queue.results(job_id), key=lambda r: r["page"])
+    assert results == [
+        {"page": 1, "worker": "w1", "error": None, "lines": 3},
+        {"page": 2, "worker": "w1", "error": "render failed"},
+    ]
+    queue.finish(job_id)
+    assert queue.job_pdf(job_id) is None
+    assert queue.stats()["jobs"] == 0
+
+
+def test_the_first_outcome_wins(queue):
+    submit(queue, pages=1)
+    worker = queue.register("w1", capacity=1)
+    task_id = queue.lease(worker, 1)[0]["task_id"]
+    assert queue.complete(worker, task_id, {"lines": 1})
+    assert not queue.complete(worker, task_id, {"lines": 2})
+
+
+def test_idle_worker_steals_half_of_the_unstarted_tasks(queue):
+    submit(queue, pages=4)
+    busy = queue.register("busy", capacity=1)
+    leased = queue.lease(busy, 4)
+    assert queue.start(busy, leased[0]["task_id"])
+
+    idle = queue.register("idle", capacity=2)
+    stolen = queue.lease(idle, 2)
+    # From the back of the busy worker's queue: it would reach them last
+    assert pages(stolen) == [3, 4]
+    assert not queue.start(busy, stolen[0]["task_id"])
+    assert queue.start(idle, stolen[0]["task_id"])
+
+    workers = {w["name"]: w for w in queue.stats()["workers"]}
+    assert (workers["busy"]["running"], workers["busy"]["queued"]) == (1, 1)
+    assert workers["idle"]["stolen"] == 2
+
+
+def test_workers_with_tasks_waiting_do_not_steal(queue):
+    submit(queue, pages=4)
+    first = queue.register("w1", capacity=1)
+    second = queue.register("w2", capacity=1)
+    queue.lease(first, 3)
+    assert pages(queue.lease(second, 1)) == [4]
+    assert queue.lease(second, 1) == []
+
+
+def test_tasks_of_a_lost_worker_are_requeued(queue):
+    job_id = submit(queue, pages=2)
+    lost = queue.register("lost", capacity=2)
+    queue.lease(lost, 2)
+    queue.heartbeat_timeout = 0.05
+    time.sleep(0.1)
+
+    survivor = queue.register("survivor", capacity=2)
+    assert pages(queue.lease(survivor, 2)) == [1, 2]
+    assert queue.heartbeat(lost) is False
+    assert [w["name"] for w in queue.stats()["workers"]] == ["survivor"]
+
+    # Lost again: the tasks have now been dispatched max_attempts times
+    time.sleep(0.1)
+    results = list(queue.results(job_id))
+    assert {r["error"] for r in results} == {"worker lost"}
+
+
+def test_tasks_past_their_timeout_are_requeued(queue):
+    submit(queue, pages=1)
+    worker = queue.register("w1", capacity=1)
+    queue.task_timeout = 0.05
+    queue.lease(worker, 1)
+    time.sleep(0.1)
+    queue.task_timeout = 60
+    assert pages(queue.lease(worker, 1)) == [1]
+
+
+def test_released_tasks_are_not_counted_as_attempts(queue):
+    job_id = submit(queue, pages=1)
+    first = queue.register("w1", capacity=1)
+    for _ in range(3):
+        task = queue.lease(first, 1)[0]
+        queue.release(first, [task["task_id"]])
+
+    second = queue.register("w2", capacity=1)
+    task = queue.lease(second, 1)[0]
+    queue.start(second, task["task_id"])
+    queue.complete(second, task["task_id"], {"lines": 1})
+    assert list(queue.results(job_id))[0]["error"] is None
+
+
+def test_deregistering_requeues_unfinished_tasks(queue):
+    submit(queue, pages=2)
+    leaving = queue.register("leaving", capacity=2)
+    queue.lease(leaving, 2)
+    queue.deregister(leaving)
+
+    assert queue.stats()["tasks"]["pending"] == 2
+    assert pages(queue.lease(queue.register("w2", capacity=2), 2)) == [1, 2]
+
+
+def test_results_give_up_after_the_timeout(queue):
+    job_id = submit(queue, pages=1)
+    results = list(queue.results(job_id, timeout=0.05))
+    assert results == [{"page": 1, "worker": None, "error": "timed out"}]
@@ -0,0 +1,31 @@
+import pytest
+from starlette.datastructures import Headers
+
+from src.utils.usage import tenant_of
+
+
+@pytest.fixture(autouse=True)
+def tenants(monkeypatch):
+    monkeypatch.setenv("USAGE_TENANT_KEYS", '{"key-a": "team-a"}')
+    monkeypatch.setenv("USAGE_TRUSTED_KEYS", "gateway-key")
+
+
+def tenant(**headers):
+    names = {name: name.replace("_", "-") for name in headers}
+    return tenant_of(Headers({names[k]: v for k, v in headers.items()}))
+
+
+def test_tenant_comes_from_the_api_key():
+    assert tenant(x_api_key="key-a") == "team-a"
+    assert tenant(authorization="Bearer key-a") == "team-a"
+    assert tenant(x_api_key="unmapped").startswith("key-")
+    assert tenant() == "anonymous"
+
+
+def test_tenant_header_is_ignored_from_untrusted_callers():
+    assert tenant(x_tenant_id="team-b") == "anonymous"
+    assert tenant(x_api_key="key-a", x_tenant_id="team-b") == "team-a"
+
+
+def test_trusted_callers_may_name_the_tenant():
+    assert tenant(x_api_key="gateway-key", x_tenant_id="team-b") == "team-b"
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from src.utils import webhook_outbox
+from src.utils.webhook_outbox import WebhookOutbox, validate_callback_url
+
+URL = "http://hooks.example.test/events"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeClient:
+    """Records posted bodies and answers with the given status codes."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.bodies = []
+
+    def post(self, url, content, headers):
+        self.bodies.append((content, headers))
+        return FakeResponse(self.statuses.pop(0) if self.statuses else 200)
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "hooks.example.test")
+    outbox = WebhookOutbox(
+        secret="s3cret",
+        db_path=str(tmp_path / "webhooks.db"),
+        batch_size=3,
+        max_latency=60,
+        max_attempts=2,
+        backoff_base=0,
+    )
+    # Deliveries are driven by the tests, not a background sender
+    outbox._ensure_sender = lambda: None
+    yield outbox
+    outbox.close()
+
+
+def test_signatures_verify():
+    body = b'{"events":[]}'
+    header = webhook_outbox.sign("s3cret", body)
+    assert webhook_outbox.verify("s3cret", body, header)
+    assert not webhook_outbox.verify("other", body, header)
+    assert not webhook_outbox.verify("s3cret", body + b" ", header)
+    old = webhook_outbox.sign("s3cret", body, int(time.time()) - 3600)
+    assert not webhook_outbox.verify("s3cret", body, old)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "ftp://hooks.example.test/",
+        "http://localhost:9000/",
+        "http://127.0.0.1/",
+        "http://10.1.2.3/",
+        "http://192.168.0.10/",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/",
+        "http://[::ffff:127.0.0.1]/",
+        "http://224.0.0.1/",
+    ],
+)
+def test_callbacks_to_private_addresses_are_refused(url, monkeypatch):
+    monkeypatch.delenv("WEBHOOK_ALLOWED_HOSTS", raising=False)
+    with pytest.raises(ValueError):
+        validate_callback_url(url)
+
+
+def test_public_addresses_are_accepted(monkeypatch):
+    monkeypatch.delenv("WEBHOOK_ALLOWED_HOSTS", raising=False)
+    validate_callback_url("https://8.8.8.8/hook")
+
+
+def test_allowed_hosts_replace_the_address_check(monkeypatch):
+    monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "localhost, hooks.internal")
+    validate_callback_url("http://localhost:9000/")
+    with pytest.raises(ValueError):
+        validate_callback_url("https://8.8.8.8/hook")
+
+
+def test_a_full_batch_is_sent_in_one_signed_post(outbox):
+    client = FakeClient()
+    assert not outbox.deliver_due(client)  # nothing queued yet
+
+    ids = [outbox.enqueue(URL, {"type": "invoice", "n": n}) for n in range(3)]
+    assert outbox.deliver_due(client)
+
+    body, headers = client.bodies[0]
+    assert [event["event_id"] for event in json.loads(body)["events"]] == ids
+    assert webhook_outbox.verify(
+        "s3cret", body, headers[webhook_outbox.SIGNATURE_HEADER]
+    )
+    assert outbox.stats() == {"pending": 0, "failed": 0}
+
+
+def test_a_partial_batch_waits_for_max_latency(outbox):
+    outbox.enqueue(URL, {"type": "invoice"})
+    assert not outbox.deliver_due(FakeClient())
+    outbox.max_latency = 0
+    assert outbox.deliver_due(FakeClient())
+
+
+def test_failed_deliveries_are_retried_then_given_up(outbox):
+    outbox.max_latency = 0
+    outbox.enqueue(URL, {"type": "invoice"})
+    client = FakeClient(503, 503)
+
+    assert outbox.deliver_due(client)
+    assert outbox.stats() == {"pending": 1, "failed": 0}
+    assert outbox.deliver_due(client)
+    assert outbox.stats() == {"pending": 0, "failed": 1}
+    assert len(client.bodies) == 2
+
+
+def test_pending_events_are_delivered_after_a_restart(tmp_path, monkeypatch):
+    received = []
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_port}/"
+    db_path = str(tmp_path / "webhooks.db")
+
+    # Queued by a process that stopped before sending it
+    crashed = WebhookOutbox(secret="s3cret", db_path=db_path)
+    crashed._ensure_sender = lambda: None
+    crashed.enqueue(url, {"type": "batch.completed"})
+    crashed.close()
+
+    outbox = WebhookOutbox(secret="s3cret", db_path=db_path, max_latency=0)
+    try:
+        assert outbox.resume() == 1
+        deadline = time.time() + 10
+        while not received and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        outbox.close()
+        server.shutdown()
+    assert received[0]["events"][0]["type"] == "batch.completed"